@@ -1,13 +1,13 @@
 from pathlib import Path
-from typing import Dict, Any
+from typing import Dict, Any, Mapping
 
 import numpy as np
-import srsly
 from mlflow.entities import Run
 
 from ale.bias.data_distribution import DataDistribution
 from ale.bias.utils import normalize_counts
 from ale.config import NLPTask
+from ale.corpus.corpus_store import open_store
 from ale.metrics.accuracy import Accuracy
 from ale.trainer.prediction_result import PredictionResult
 
@@ -16,13 +16,8 @@ class BiasDetector:
     def __init__(self, nlp_task: NLPTask, label_column: str, file_raw: Path, ids=None):
         self.data_distribution = DataDistribution(nlp_task, label_column, file_raw)
 
-        def filter_func(entry):
-            if ids:
-                return entry["id"] in ids
-            else:
-                return True
-
-        self.corpus_by_id: Dict[int, Any] = {e["id"]: e for e in srsly.read_jsonl(file_raw) if filter_func(e)}
+        store = open_store(file_raw)
+        self.corpus_by_id: Mapping[int, Any] = store.view(ids=[idx for idx in ids if idx in store] if ids else None)
         self.ids = ids
         self.accuracy = Accuracy(nlp_task)
 
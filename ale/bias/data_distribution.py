@@ -7,6 +7,7 @@ from mlflow.entities import Run
 
 import ale.mlflowutils.mlflow_utils as utils
 from ale.config import NLPTask
+from ale.corpus.corpus_store import open_store
 
 
 class DataDistribution:
@@ -21,10 +22,10 @@ class DataDistribution:
 
     def get_data_distribution_by_label_for_ids(self, train_ids: List[int]) -> Dict[str, int]:
         labels: Dict[str, int] = defaultdict(lambda: 0)
-        for entry in srsly.read_jsonl(self.train_file_raw):
-            idx = entry["id"]
-            if idx in train_ids:
-                self.count_func(labels, entry[self.label_column])
+        store = open_store(self.train_file_raw)
+        for idx in set(train_ids):
+            if idx in store:
+                self.count_func(labels, store.get_column(idx, self.label_column))
 
         return labels
 
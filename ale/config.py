@@ -34,6 +34,43 @@ class TrainerConfig(BaseModel):
     accumulate_grad_batches: Optional[int] = None
     check_val_every_n_epoch: Optional[int] = None
     freeze_layers: Optional[List[str]] = None
+    prediction_token_budget: Optional[int] = None
+    """
+    Max. number of (padded) tokens per prediction batch. Pool documents are batched by length.
+    None uses batch_size documents per batch in input order.
+    """
+    inference_threads: Optional[int] = None
+    """
+    Number of torch intra-op threads for predictions. None keeps the torch default.
+    """
+    inference_compile_mode: Optional[str] = None
+    """
+    torch.compile mode (e.g. default, reduce-overhead) for the encoder during predictions. None disables compiling.
+    """
+    inference_processes: Optional[int] = None
+    """
+    Number of worker processes for pool predictions on CPU, each with its own copy of the model and
+    inference_threads threads (default: available cores / processes). None predicts in the main process.
+    """
+    inference_quantization: bool = False
+    """
+    Predict the pool for the teacher with a dynamically int8 quantized copy of the model (CPU only).
+    Training, evaluation and hook predictions keep using fp32.
+    """
+    quantization_diagnostic_sample: Optional[int] = None
+    """
+    Number of pool documents predicted with the fp32 and the quantized model after each training to report the rank
+    correlation of their uncertainty scores. None disables the diagnostic.
+    """
+    tokenization_cache_dir: Optional[str] = None
+    """
+    Directory of the on-disk tokenization cache, shared by all seeds and runs with the same data files, tokenizer
+    and labels. None tokenizes the data files in every run.
+    """
+    preprocessing_processes: Optional[int] = None
+    """
+    Number of processes which tokenize large data files in parallel. None tokenizes in the main process.
+    """
 
 
 class AggregationMethod(str, Enum):
@@ -44,10 +81,38 @@ class AggregationMethod(str, Enum):
     SUM = "SUM"
 
 
+class CoreSetEmbeddings(str, Enum):
+    TFIDF = "tfidf"
+    SENTENCE_TRANSFORMER = "sentence-transformer"
+    MODEL = "model"
+
+
 class TeacherConfig(BaseModel):
     strategy: str
     sampling_budget: int
     aggregation_method: Optional[AggregationMethod] = None
+    embedding_cache_dir: Optional[str] = None
+    """
+    Directory of the persistent sentence embedding store, shared by all seeds, teachers and runs.
+    None encodes the corpus whenever a teacher needs embeddings.
+    """
+    embedding_cache_max_gb: Optional[float] = None
+    """
+    Size limit of the embedding store, least recently used shards are deleted beyond it. None: no limit.
+    """
+    embedding_cache_dtype: str = "float32"
+    """
+    Data type of the stored embeddings (float32 or float16), embeddings are returned as float32.
+    """
+    similarity_block_mb: int = 256
+    """
+    Max. size of a block of cosine similarities computed at once by similarity based teachers.
+    """
+    core_set_embeddings: CoreSetEmbeddings = CoreSetEmbeddings.TFIDF
+    """
+    Document embeddings of the core-set teacher: tfidf, sentence-transformer (all-mpnet-base-v2, stored in the
+    embedding store) or model (mean pooled encoder output of the trained model, computed in every cycle).
+    """
 
 
 class Experiment(BaseModel):
@@ -0,0 +1,75 @@
+from typing import Dict, Iterable, List, Sequence
+
+import numpy as np
+
+
+class AnnotationState:
+    """
+    Annotated flags of all corpus documents as a boolean mask over dense rows (the position of the id in ``ids``).
+    Membership tests are O(1), increments O(k) and the number of (not) annotated documents is kept up to date.
+    The annotated ids are additionally kept in annotation order. ``version`` is incremented whenever the annotated
+    ids are replaced instead of extended.
+    """
+
+    def __init__(self, ids: Sequence[int]):
+        self.ids = np.asarray(ids, dtype=np.int64)
+        self.rows: Dict[int, int] = {int(idx): row for row, idx in enumerate(self.ids)}
+        self.annotated = np.zeros(len(self.ids), dtype=bool)
+        self.annotated_ids: List[int] = []
+        self.version = 0
+
+    def __contains__(self, idx: int) -> bool:
+        row = self.rows.get(idx)
+        return row is not None and bool(self.annotated[row])
+
+    def __len__(self) -> int:
+        return len(self.annotated_ids)
+
+    @property
+    def num_not_annotated(self) -> int:
+        return len(self.ids) - len(self.annotated_ids)
+
+    def get_rows(self, ids: Iterable[int]) -> np.ndarray:
+        try:
+            return np.fromiter((self.rows[idx] for idx in ids), dtype=np.int64)
+        except KeyError as e:
+            raise ValueError(f"Trying to add ids to corpus, which are not part of it: {e.args[0]}")
+
+    def check_new_ids(self, ids: List[int], annotated: np.ndarray) -> np.ndarray:
+        """
+        Rows of the ids, raises a ValueError for unknown, duplicate or (according to ``annotated``) annotated ids.
+        """
+        rows = self.get_rows(ids)
+        already_annotated = self.ids[rows[annotated[rows]]]
+        if len(already_annotated) > 0 or len(np.unique(rows)) < len(rows):
+            same_ids = set(already_annotated.tolist()) | {idx for idx in ids if ids.count(idx) > 1}
+            raise ValueError(f"Trying to add ids to corpus, which are already part of it: {same_ids}")
+        return rows
+
+    def add(self, ids: List[int]):
+        rows = self.check_new_ids(ids, self.annotated)
+        self.annotated[rows] = True
+        self.annotated_ids.extend(ids)
+
+    def reset(self, ids: List[int]):
+        """
+        Replaces the annotated ids. Invalid ids raise before anything is changed.
+        """
+        annotated = np.zeros_like(self.annotated)
+        annotated[self.check_new_ids(ids, annotated)] = True
+        self.annotated = annotated
+        self.annotated_ids = list(ids)
+        self.version += 1
+
+    def covers_not_annotated(self, ids: Sequence[int]) -> bool:
+        """
+        True if the ids are exactly the not annotated ids (in any order).
+        """
+        rows = self.get_rows(ids)
+        return not self.annotated[rows].any() and len(np.unique(rows)) == self.num_not_annotated
+
+    def get_not_annotated_ids(self) -> List[int]:
+        """
+        Not annotated ids in corpus order.
+        """
+        return self.ids[~self.annotated].tolist()
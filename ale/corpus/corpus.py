@@ -1,6 +1,6 @@
 from abc import ABC, abstractmethod
 from pathlib import Path
-from typing import List, Union, Any, Dict
+from typing import List, Union, Any, Dict, Optional
 
 import srsly
 from mlflow.artifacts import download_artifacts
@@ -8,6 +8,7 @@ from mlflow.entities import Run
 
 import ale.mlflowutils.mlflow_utils as mlflow_utils
 from ale.config import AppConfig
+from ale.corpus.annotation_state import AnnotationState
 
 
 class Corpus(ABC):
@@ -17,31 +18,53 @@ class Corpus(ABC):
     def __init__(self, cfg: AppConfig, data_dir: Union[str, Path]):
         self.cfg = cfg
         self.data_dir = data_dir
-        self.relevant_ids: List[int] = []
+        self._annotation_state: Optional[AnnotationState] = None
+
+    @property
+    def annotation_state(self) -> AnnotationState:
+        """
+        Annotation state over all documents, created with the first access (the corpus has to be indexed).
+        """
+        if self._annotation_state is None:
+            self._annotation_state = AnnotationState(list(self.get_all_texts_with_ids().keys()))
+        return self._annotation_state
+
+    @property
+    def relevant_ids(self) -> List[int]:
+        """
+        Annotated ids in annotation order.
+        """
+        return self.annotation_state.annotated_ids
+
+    @relevant_ids.setter
+    def relevant_ids(self, ids: List[int]):
+        self.annotation_state.reset(ids)
+        self.on_relevant_ids_replaced()
+
+    def on_relevant_ids_replaced(self):
+        """
+        Called after the annotated ids were replaced (e.g. restored), subclasses resync derived state.
+        """
+        pass
 
     def get_relevant_ids(self) -> List[int]:
         return self.relevant_ids
 
     def add_increment(self, ids: List[int]):
-        same_ids = set(ids).intersection(set(self.relevant_ids))
-        if len(same_ids) > 0:
-            raise ValueError(f"Trying to add ids to corpus, which are already part of it: {same_ids}")
-
-        self.relevant_ids.extend(ids)
+        self.annotation_state.add(ids)
 
     @abstractmethod
     def get_trainable_corpus(self) -> Any:
         pass
 
-    @abstractmethod
     def get_not_annotated_data_points_ids(self) -> List[int]:
-        pass
+        return self.annotation_state.get_not_annotated_ids()
 
     def __len__(self):
         """
         :return: the length of the current corpus (measured by relevant_ids, not the whole corpus)
         """
-        return len(self.relevant_ids)
+        return len(self.annotation_state)
 
     def store_to_artifacts(self, run: Run):
         mlflow_utils.log_dict_as_artifact(run, {"relevant_ids": self.relevant_ids}, self.ARTIFACT_FILE)
@@ -52,7 +75,7 @@ class Corpus(ABC):
         self.relevant_ids = json["relevant_ids"]
 
     def do_i_have_to_annotate(self):
-        return len(self.get_not_annotated_data_points_ids()) > 0
+        return self.annotation_state.num_not_annotated > 0
 
     @abstractmethod
     def get_all_texts_with_ids(self) -> Dict[int, str]:
@@ -0,0 +1,116 @@
+import functools
+import logging
+import mmap
+from collections.abc import Mapping
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Union
+
+import numpy as np
+import srsly
+
+logger = logging.getLogger(__name__)
+
+
+class CorpusStore:
+    """
+    Random access to the entries of a jsonl file by id. A single pass builds an index of the byte range of each
+    entry, entries are parsed from the memory-mapped file on access. Only the index (three int64 arrays) is kept in
+    memory, not the entries.
+    """
+
+    def __init__(self, path: Union[str, Path]):
+        self.path = Path(path)
+        ids, starts, ends = [], [], []
+        position = 0
+        with open(self.path, "rb") as f:
+            for line in f:
+                if line.strip():
+                    ids.append(srsly.json_loads(line)["id"])
+                    starts.append(position)
+                    ends.append(position + len(line))
+                position += len(line)
+
+        self.ids = np.asarray(ids, dtype=np.int64)
+        self.starts = np.asarray(starts, dtype=np.int64)
+        self.ends = np.asarray(ends, dtype=np.int64)
+        self.order = np.argsort(self.ids, kind="stable")
+        self.sorted_ids = self.ids[self.order]
+        with open(self.path, "rb") as f:
+            self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if position > 0 else b""
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __contains__(self, idx: int) -> bool:
+        position = np.searchsorted(self.sorted_ids, idx)
+        return position < len(self.sorted_ids) and self.sorted_ids[position] == idx
+
+    def get_row(self, idx: int) -> int:
+        """
+        Position of the entry in the file.
+        """
+        position = np.searchsorted(self.sorted_ids, idx)
+        if position == len(self.sorted_ids) or self.sorted_ids[position] != idx:
+            raise KeyError(idx)
+        return int(self.order[position])
+
+    def get_entry_by_row(self, row: int) -> Dict[str, Any]:
+        return srsly.json_loads(self.data[self.starts[row]:self.ends[row]])
+
+    def __getitem__(self, idx: int) -> Dict[str, Any]:
+        return self.get_entry_by_row(self.get_row(idx))
+
+    def get_column(self, idx: int, column: str) -> Any:
+        return self[idx][column]
+
+    def get_ids(self) -> List[int]:
+        """
+        Ids in file order.
+        """
+        return self.ids.tolist()
+
+    def view(self, column: Optional[str] = None, ids: Optional[Sequence[int]] = None) -> "CorpusStoreView":
+        return CorpusStoreView(self, column, ids)
+
+
+class CorpusStoreView(Mapping):
+    """
+    Read only mapping from id to the entry (or one column of it) of a ``CorpusStore``, restricted to ``ids`` if
+    given. Values are parsed on access.
+    """
+
+    def __init__(self, store: CorpusStore, column: Optional[str] = None, ids: Optional[Sequence[int]] = None):
+        self.store = store
+        self.column = column
+        self.ids = store.get_ids() if ids is None else list(ids)
+        self.id_set = None if ids is None else set(self.ids)
+
+    def __getitem__(self, idx: int) -> Any:
+        if self.id_set is not None and idx not in self.id_set:
+            raise KeyError(idx)
+        entry = self.store[idx]
+        return entry if self.column is None else entry[self.column]
+
+    def __contains__(self, idx: object) -> bool:
+        return idx in self.store if self.id_set is None else idx in self.id_set
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(self.ids)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+
+@functools.lru_cache(maxsize=8)
+def _open_store(path: str, modified: int, size: int) -> CorpusStore:
+    logger.info(f"Index corpus file {path}")
+    return CorpusStore(path)
+
+
+def open_store(path: Union[str, Path]) -> CorpusStore:
+    """
+    Returns the store of the file, shared by all callers (e.g. seed runs) as long as the file is not changed.
+    """
+    resolved = Path(path).resolve()
+    stat = resolved.stat()
+    return _open_store(str(resolved), stat.st_mtime_ns, stat.st_size)
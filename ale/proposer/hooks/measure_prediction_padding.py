@@ -0,0 +1,42 @@
+import logging
+
+from mlflow import MlflowClient
+from typing_extensions import override
+
+from ale.config import AppConfig
+from ale.corpus.corpus import Corpus
+from ale.proposer.hooks.abstract_hook import ProposeHook
+
+logger = logging.getLogger(__name__)
+
+
+class MeasurePredictionPadding(ProposeHook):
+    """
+    Logs the share of padding in the pool predictions of the teacher per AL cycle, and how much of it the token budget
+    batching saved compared to fixed size batches in input order.
+    """
+
+    def __init__(self, cfg: AppConfig, parent_run_id: str, corpus: Corpus, **kwargs):
+        super().__init__(cfg, parent_run_id, corpus, "", **kwargs)
+        self.trainer = kwargs["trainer"]
+
+    @override
+    def before_proposing(self) -> None:
+        # Drop the counts of predictions outside the proposing step
+        self.trainer.pop_prediction_padding_statistics()
+
+    @override
+    def after_proposing(self) -> None:
+        statistics = self.trainer.pop_prediction_padding_statistics()
+        if statistics.get("padded_tokens", 0) == 0:
+            return
+
+        padding_ratio = 1 - statistics["tokens"] / statistics["padded_tokens"]
+        padding_ratio_fixed_batches = 1 - statistics["tokens"] / statistics["padded_tokens_fixed_batches"]
+        logger.info(f"Prediction padding ratio: {padding_ratio:.4f} (fixed batches: {padding_ratio_fixed_batches:.4f})")
+
+        client = MlflowClient()
+        client.log_metric(self.parent_run_id, key="prediction_padding_ratio", value=padding_ratio,
+                          step=len(self.corpus))
+        client.log_metric(self.parent_run_id, key="prediction_padding_ratio_saved",
+                          value=padding_ratio_fixed_batches - padding_ratio, step=len(self.corpus))
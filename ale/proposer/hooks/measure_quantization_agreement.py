@@ -0,0 +1,30 @@
+import logging
+
+import numpy as np
+from mlflow import MlflowClient
+from typing_extensions import override
+
+from ale.config import AppConfig
+from ale.corpus.corpus import Corpus
+from ale.proposer.hooks.abstract_hook import ProposeHook
+
+logger = logging.getLogger(__name__)
+
+
+class MeasureQuantizationAgreement(ProposeHook):
+    """
+    Logs the rank correlation of the uncertainty scores of the fp32 and the int8 quantized model per AL cycle.
+    """
+
+    def __init__(self, cfg: AppConfig, parent_run_id: str, corpus: Corpus, **kwargs):
+        super().__init__(cfg, parent_run_id, corpus, "", **kwargs)
+        self.trainer = kwargs["trainer"]
+
+    @override
+    def after_proposing(self) -> None:
+        correlations = self.trainer.pop_quantization_correlations()
+        if len(correlations) == 0:
+            return
+
+        MlflowClient().log_metric(self.parent_run_id, key="quantization_rank_correlation",
+                                  value=float(np.mean(correlations)), step=len(self.corpus))
@@ -8,7 +8,6 @@ import torch
 from mlflow import MlflowClient
 from mlflow.entities import RunStatus, Run
 from mlflow.utils import mlflow_tags
-from torch.utils.data import DataLoader
 
 import ale.mlflowutils.mlflow_utils as utils
 from ale.config import AppConfig
@@ -17,6 +16,8 @@ from ale.proposer.hooks.abstract_hook import ProposeHook
 from ale.proposer.hooks.assess_bias_hook import AssessBiasHook
 from ale.proposer.hooks.assess_confidence_hook import AssessConfidenceHook
 from ale.proposer.hooks.early_stopping import EarlyStopping
+from ale.proposer.hooks.measure_prediction_padding import MeasurePredictionPadding
+from ale.proposer.hooks.measure_quantization_agreement import MeasureQuantizationAgreement
 from ale.proposer.hooks.measure_times import MeasureTimes
 from ale.proposer.hooks.stop_after_n_al_cycles import StopAfterNAlCycles
 from ale.registry.registerable_corpus import CorpusRegistry
@@ -24,6 +25,7 @@ from ale.registry.registerable_teacher import TeacherRegistry
 from ale.registry.registerable_trainer import TrainerRegistry
 from ale.teacher.base_teacher import BaseTeacher
 from ale.trainer.base_trainer import MetricsType
+from ale.trainer.prediction_session import PredictionSession
 from ale.trainer.prediction_trainer import PredictionTrainer
 
 logger = logging.getLogger(__name__)
@@ -108,6 +110,13 @@ class AleBartenderPerSeed:
         :param seed: Seed to run the experiment with.
         :return None
         """
+        try:
+            self.simulate_seed()
+        finally:
+            # Inference processes and temporary checkpoints of the trainer are not needed after the seed
+            self.trainer.close()
+
+    def simulate_seed(self) -> None:
         logger.info(f"Start seed: {self.seed}")
 
         all_ids = self.corpus.get_not_annotated_data_points_ids()
@@ -147,6 +156,10 @@ class AleBartenderPerSeed:
                                         trainer=self.trainer))
         if self.cfg.experiment.assess_overconfidence:
             hooks.append(AssessConfidenceHook(self.cfg, self.parent_run_id, self.corpus, trainer=self.trainer))
+        if self.cfg.trainer.prediction_token_budget is not None:
+            hooks.append(MeasurePredictionPadding(self.cfg, self.parent_run_id, self.corpus, trainer=self.trainer))
+        if self.cfg.trainer.inference_quantization and self.cfg.trainer.quantization_diagnostic_sample is not None:
+            hooks.append(MeasureQuantizationAgreement(self.cfg, self.parent_run_id, self.corpus, trainer=self.trainer))
 
         while self.corpus.do_i_have_to_annotate():
             [h.on_iter_start() for h in hooks]
@@ -170,14 +183,20 @@ class AleBartenderPerSeed:
             [h.after_training(new_run, evaluation_metrics, test_metrics) for h in hooks]
 
             [h.before_prediction() for h in hooks]
-            preds_train = None
-            preds_dev = None
+            session = self.trainer.open_prediction_session()
             if any([h.needs_train_predictions() for h in hooks]):
                 logger.info(f"Perform predictions on training data")
-                preds_train = self.perform_predictions(self.corpus.data_module.train_dataloader())
+                session.request_labeled("train", self.corpus.data_module.train_dataloader())
             if any([h.needs_dev_predictions() for h in hooks]):
                 logger.info(f"Perform predictions on dev data")
-                preds_dev = self.perform_predictions(self.corpus.data_module.val_dataloader())
+                session.request_labeled("dev", self.corpus.data_module.val_dataloader())
+            if session.has_requests() and self.corpus.do_i_have_to_annotate() \
+                    and len(self.corpus) < annotation_budget:
+                # Predict the candidates of the next proposal along with the hook predictions, the model is the same
+                self.request_next_candidates(session, self.corpus)
+            session.run()
+            preds_train = session.get_labeled_predictions("train")
+            preds_dev = session.get_labeled_predictions("dev")
 
             [h.after_prediction(new_run, preds_train, preds_dev) for h in hooks]
 
@@ -283,13 +302,25 @@ class AleBartenderPerSeed:
                 else:
                     logger.warning(
                         f"Too few datapoints selected: {detected_step_size}/{step_size}! Adding random ones.")
-                    remaining_pot_ids = [idx for idx in potential_ids if idx not in new_data_points]
+                    selected = set(new_data_points)
+                    remaining_pot_ids = [idx for idx in potential_ids if idx not in selected]
                     number_of_data_points_needed = step_size - detected_step_size
                     additional_data_points = random.sample(remaining_pot_ids, number_of_data_points_needed)
                     new_data_points.extend(additional_data_points)
 
         corpus.add_increment(new_data_points)
 
+    def request_next_candidates(self, session: PredictionSession, corpus: Corpus) -> None:
+        """
+        Requests the pool documents the teacher will predict in the next propose call.
+        """
+        potential_ids = corpus.get_not_annotated_data_points_ids()
+        sampling_budget, step_size = self.determine_step_size(len(corpus), potential_ids)
+        candidates = self.teacher.prediction_candidates(potential_ids, step_size, sampling_budget)
+        if candidates is not None:
+            logger.info(f"Predict {len(candidates)} candidates of the next proposal in the shared session")
+            session.request_pool(candidates)
+
     def determine_step_size(self, current_corpus_size: int, potential_ids: List[int]):
         step_size = min(len(potential_ids), self.cfg.experiment.step_size)
         sampling_budget = self.cfg.teacher.sampling_budget
@@ -322,9 +353,6 @@ class AleBartenderPerSeed:
 
         return test_metrics
 
-    def perform_predictions(self, data_loader: DataLoader):
-        return self.trainer.predict_with_known_gold_labels(data_loader)
-
     def may_continue(self, hooks: List[ProposeHook]) -> bool:
         for hook in hooks:
             if hook.may_continue() is False:
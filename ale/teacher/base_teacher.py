@@ -2,7 +2,9 @@ import logging
 import os
 import pickle
 import tempfile
-from typing import List, Dict, Any, Callable, Optional
+from typing import List, Dict, Any, Callable, Optional, Mapping, Tuple
+
+import numpy as np
 
 from mlflow.entities import Run
 
@@ -10,6 +12,7 @@ from ale.config import NLPTask
 from ale.corpus.corpus import Corpus
 from ale.mlflowutils import mlflow_utils
 from ale.teacher.exploitation.aggregation_methods import AggregationMethod, Aggregation
+from ale.teacher.exploitation.scoring import TopKCollector
 from ale.trainer.prediction_result import PredictionResult
 from ale.trainer.predictor import Predictor
 
@@ -29,6 +32,7 @@ class BaseTeacher:
         self.predictor = predictor
         self.seed = seed
         self.nlp_task = nlp_task
+        self.candidate_cache: Optional[Tuple[Tuple[Tuple[int, ...], int], List[int]]] = None
 
         if aggregation_method is not None:  # For exploitation based approaches in Entity Recognition
             self.aggregation_method = aggregation_method
@@ -48,6 +52,24 @@ class BaseTeacher:
         """
         pass
 
+    def prediction_candidates(self, potential_ids: List[int], actual_step_size: int,
+                              actual_budget: int) -> Optional[List[int]]:
+        """
+        Returns the ids the teacher will predict in the next propose call with the same arguments, or None if it does
+        not predict pool documents. The proposer uses it to predict them together with the hook predictions.
+        """
+        return None
+
+    def draw_candidates(self, potential_ids: List[int], budget: int, draw: Callable[[], List[int]]) -> List[int]:
+        """
+        Draws the candidates for potential_ids and budget once. A later call with the same arguments (e.g. propose
+        after prediction_candidates) returns the same candidates without drawing again.
+        """
+        key = (tuple(potential_ids), budget)
+        if self.candidate_cache is None or self.candidate_cache[0] != key:
+            self.candidate_cache = (key, draw())
+        return self.candidate_cache[1]
+
     def compute_cls(self, predictions: Dict[int, PredictionResult], step_size: int) -> List[int]:
         """
         Computes the order in which the samples are proposed according to the teacher used.
@@ -68,6 +90,23 @@ class BaseTeacher:
         """
         pass
 
+    def propose_top_k(self, candidate_ids: List[int], step_size: int,
+                      score_function: Callable[[Mapping[int, PredictionResult]], Tuple[np.ndarray, np.ndarray]],
+                      largest: bool = False) -> List[int]:
+        """
+        Predicts the candidates batch by batch and keeps only the step_size lowest (or highest) scored documents, thus
+        at most one batch of predictions is held in memory.
+        Args:
+            - candidate_ids (List[int]): ids of the documents to score, ties are ranked in this order
+            - score_function: maps the predictions of a batch to (ids, scores)
+        Returns:
+            - List[int]: ordered list of indices of the documents
+        """
+        collector = TopKCollector(step_size, candidate_ids, largest=largest)
+        for predictions in self.predictor.predict_batches(candidate_ids):
+            collector.add(*score_function(predictions))
+        return collector.get_top_k()
+
     def after_train(self, metrics: Dict):
         """
         Will be called after every training, except the initial train
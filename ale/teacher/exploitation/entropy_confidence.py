@@ -1,14 +1,16 @@
 import random
 from abc import ABC
-from typing import List, Dict, Optional, Any
+from typing import List, Dict, Optional, Any, Mapping, Tuple
 import numpy as np
 from ale.config import NLPTask
 from ale.corpus.corpus import Corpus
 from ale.registry.registerable_teacher import TeacherRegistry
 from ale.teacher.base_teacher import BaseTeacher
 from ale.teacher.exploitation.aggregation_methods import AggregationMethod
+from ale.teacher.exploitation.scoring import as_token_predictions, aggregate_token_scores, token_entropy, \
+    select_top_k
 from ale.trainer.predictor import Predictor
-from ale.trainer.prediction_result import TokenConfidence, PredictionResult
+from ale.trainer.prediction_result import PredictionResult
 
 
 @TeacherRegistry.register("entropy-confidence")
@@ -89,14 +91,17 @@ class EntropyTeacher(BaseTeacher, ABC):
         )
         random.seed(self.seed)
 
-    def propose(self, potential_ids: List[int], step_size: int, budget: int) -> List[int]:
+    def prediction_candidates(self, potential_ids: List[int], step_size: int, budget: int) -> List[int]:
         if budget < len(potential_ids):
-            batch: List[int] = random.sample(potential_ids, budget)
-        else:
-            batch: List[int] = potential_ids
-        idx2text = self.corpus.get_text_by_ids(batch)
-        prediction_results: Dict[int, PredictionResult] = self.predictor.predict(
-            idx2text)
+            return self.draw_candidates(potential_ids, budget, lambda: random.sample(potential_ids, budget))
+        return potential_ids
+
+    def propose(self, potential_ids: List[int], step_size: int, budget: int) -> List[int]:
+        batch: List[int] = self.prediction_candidates(potential_ids, step_size, budget)
+        if self.nlp_task == NLPTask.NER:
+            return self.propose_top_k(batch, step_size, self.score_ner, largest=True)
+
+        prediction_results: Dict[int, PredictionResult] = self.predictor.predict(batch)
         out_ids: List[int] = self.compute_function(
             prediction_results, step_size)
 
@@ -106,22 +111,17 @@ class EntropyTeacher(BaseTeacher, ABC):
         """
         Entropy is calculated on token-level and aggregated on instance-level as configured.
         """
-        scores = dict()
-        for idx, prediction in predictions.items():
-            token_confidences: List[TokenConfidence] = prediction.ner_confidences_token
-            confidence_scores: List[float] = []
-            for token in token_confidences:
-                confidences: List[float] = [
-                    label_confidence.confidence for label_confidence in token.label_confidence]
-                entropy = -sum([pk * np.log(pk) for pk in confidences])
-                confidence_scores.append(entropy)
-            instance_margin = self.aggregate_function(confidence_scores)
-            scores[idx] = instance_margin
-        sorted_dict_by_score = sorted(
-            scores.items(), key=lambda x: x[1], reverse=True)
-        out_ids = [item[0] for item in sorted_dict_by_score[:step_size]]
+        ids, scores = self.score_ner(predictions)
+        return select_top_k(ids, scores, step_size, largest=True)
 
-        return out_ids
+    def score_ner(self, predictions: Mapping[int, PredictionResult]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Returns the ids and instance level scores of the given predictions.
+        """
+        token_predictions = as_token_predictions(predictions)
+        return aggregate_token_scores(token_predictions,
+                                      token_entropy(token_predictions.probabilities),
+                                      self.aggregation_method)
 
     def compute_cls(self, predictions: Dict[int, PredictionResult], step_size: int) -> List[int]:
         raise NotImplementedError(
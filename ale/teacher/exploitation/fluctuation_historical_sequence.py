@@ -14,7 +14,9 @@ from ale.mlflowutils import mlflow_utils
 from ale.registry.registerable_teacher import TeacherRegistry
 from ale.teacher.base_teacher import BaseTeacher
 from ale.teacher.exploitation.aggregation_methods import AggregationMethod
-from ale.trainer.prediction_result import TokenConfidence, PredictionResult
+from ale.teacher.exploitation.scoring import as_token_predictions, aggregate_token_scores, \
+    token_highest_confidence
+from ale.trainer.prediction_result import PredictionResult
 from ale.trainer.predictor import Predictor
 
 logger = logging.getLogger(__name__)
@@ -119,8 +121,7 @@ class FluctuationHistoricalSequenceTeacher(BaseTeacher, ABC):
 
     def propose(self, potential_ids: List[int], step_size: int, budget: int) -> List[int]:
         search_for_least_confidence = random.sample(potential_ids, budget)
-        idx2text = self.corpus.get_text_by_ids(search_for_least_confidence)
-        prediction_results: Dict[int, PredictionResult] = self.predictor.predict(idx2text)
+        prediction_results: Dict[int, PredictionResult] = self.predictor.predict(search_for_least_confidence)
         out_ids: List[int] = self.compute_function(prediction_results, step_size)
 
         return out_ids
@@ -169,17 +170,11 @@ class FluctuationHistoricalSequenceTeacher(BaseTeacher, ABC):
         return fluctuation
 
     def compute_least_confidence_instance_scores(self, predictions: Dict[int, PredictionResult]) -> Dict[int, float]:
-        scores = dict()
-        for idx, prediction in predictions.items():
-            token_confidences: List[TokenConfidence] = prediction.ner_confidences_token
-            highest_confidences: List[float] = []
-            for token in token_confidences:
-                # LC on token-level, reversed to take max
-                confidence_score: float = 1 - token.get_highest_confidence().confidence
-                highest_confidences.append(confidence_score)
-            instance_score = self.aggregate_function(highest_confidences)
-            scores[idx] = instance_score
-        return scores
+        token_predictions = as_token_predictions(predictions)
+        # LC on token-level, reversed to take max
+        token_scores = 1 - token_highest_confidence(token_predictions.probabilities)
+        ids, scores = aggregate_token_scores(token_predictions, token_scores, self.aggregation_method)
+        return dict(zip(ids.tolist(), scores.tolist()))
 
     def is_first_call(self) -> bool:
         return self.historical_sequence is None
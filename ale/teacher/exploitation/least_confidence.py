@@ -1,13 +1,16 @@
 import random
 from abc import ABC
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Mapping, Tuple
+import numpy as np
 from ale.config import NLPTask
 from ale.corpus.corpus import Corpus
 from ale.registry.registerable_teacher import TeacherRegistry
 from ale.teacher.base_teacher import BaseTeacher
 from ale.teacher.exploitation.aggregation_methods import AggregationMethod
+from ale.teacher.exploitation.scoring import as_token_predictions, aggregate_token_scores, \
+    token_highest_confidence, select_top_k
 from ale.trainer.predictor import Predictor
-from ale.trainer.prediction_result import TokenConfidence, PredictionResult
+from ale.trainer.prediction_result import PredictionResult
 
 
 @TeacherRegistry.register("least-confidence")
@@ -65,11 +68,15 @@ class LeastConfidenceTeacher(BaseTeacher, ABC):
         )
         random.seed(self.seed)
 
+    def prediction_candidates(self, potential_ids: List[int], step_size: int, budget: int) -> List[int]:
+        return self.draw_candidates(potential_ids, budget, lambda: random.sample(potential_ids, budget))
+
     def propose(self, potential_ids: List[int], step_size: int, budget: int) -> List[int]:
-        search_for_least_confidence = random.sample(potential_ids, budget)
-        idx2text = self.corpus.get_text_by_ids(search_for_least_confidence)
-        prediction_results: Dict[int, PredictionResult] = self.predictor.predict(
-            idx2text)
+        search_for_least_confidence = self.prediction_candidates(potential_ids, step_size, budget)
+        if self.nlp_task == NLPTask.NER:
+            return self.propose_top_k(search_for_least_confidence, step_size, self.score_ner)
+
+        prediction_results: Dict[int, PredictionResult] = self.predictor.predict(search_for_least_confidence)
         out_ids: List[int] = self.compute_function(
             prediction_results, step_size)
 
@@ -79,19 +86,17 @@ class LeastConfidenceTeacher(BaseTeacher, ABC):
         """
         LC is calculated on token-level and aggregated on instance-level as configured.
         """
-        scores = dict()
-        for idx, prediction in predictions.items():
-            token_confidences: List[TokenConfidence] = prediction.ner_confidences_token
-            highest_confidences: List[float] = []
-            for token in token_confidences:
-                confidence_score: float = token.get_highest_confidence().confidence
-                highest_confidences.append(confidence_score)
-            instance_score = self.aggregate_function(highest_confidences)
-            scores[idx] = instance_score
-        sorted_dict_by_score = sorted(scores.items(), key=lambda x: x[1])
-        out_ids = [item[0] for item in sorted_dict_by_score[:step_size]]
+        ids, scores = self.score_ner(predictions)
+        return select_top_k(ids, scores, step_size)
 
-        return out_ids
+    def score_ner(self, predictions: Mapping[int, PredictionResult]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Returns the ids and instance level scores of the given predictions.
+        """
+        token_predictions = as_token_predictions(predictions)
+        return aggregate_token_scores(token_predictions,
+                                      token_highest_confidence(token_predictions.probabilities),
+                                      self.aggregation_method)
 
     def compute_cls(self, predictions: Dict[int, PredictionResult], step_size: int) -> List[int]:
         raise NotImplementedError(
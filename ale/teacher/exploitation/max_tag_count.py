@@ -1,14 +1,16 @@
 import random
 from abc import ABC
-from typing import List, Dict, Optional, Tuple
+from typing import List, Dict, Optional, Mapping, Tuple
+import numpy as np
 from ale.config import NLPTask
 from ale.corpus.corpus import Corpus
 from ale.registry.registerable_teacher import TeacherRegistry
 from ale.teacher.base_teacher import BaseTeacher
 from ale.teacher.exploitation.aggregation_methods import AggregationMethod
+from ale.teacher.exploitation.scoring import as_token_predictions, aggregate_token_scores, \
+    token_named_entity_indicator, select_top_k
 from ale.trainer.predictor import Predictor
-from ale.trainer.prediction_result import TokenConfidence, PredictionResult
-from ale.teacher.teacher_utils import is_named_entity
+from ale.trainer.prediction_result import PredictionResult
 
 
 @TeacherRegistry.register("max-tag-count")
@@ -43,13 +45,17 @@ class MaxTagCountTeacher(BaseTeacher, ABC):
         )
         random.seed(self.seed)
 
-    def propose(self, potential_ids: List[int], step_size: int, budget: int) -> List[int]:
+    def prediction_candidates(self, potential_ids: List[int], step_size: int, budget: int) -> List[int]:
         if budget < len(potential_ids):
-            batch: List[int] = random.sample(potential_ids, budget)
-        else:
-            batch: List[int] = potential_ids
-        idx2text = self.corpus.get_text_by_ids(batch)
-        prediction_results: Dict[int, PredictionResult] = self.predictor.predict(idx2text)
+            return self.draw_candidates(potential_ids, budget, lambda: random.sample(potential_ids, budget))
+        return potential_ids
+
+    def propose(self, potential_ids: List[int], step_size: int, budget: int) -> List[int]:
+        batch: List[int] = self.prediction_candidates(potential_ids, step_size, budget)
+        if self.nlp_task == NLPTask.NER:
+            return self.propose_top_k(batch, step_size, self.score_ner, largest=True)
+
+        prediction_results: Dict[int, PredictionResult] = self.predictor.predict(batch)
         out_ids: List[int] = self.compute_function(prediction_results, step_size)
 
         return out_ids
@@ -58,22 +64,17 @@ class MaxTagCountTeacher(BaseTeacher, ABC):
         """
         Max tag count is calculated on token-level and aggregated on instance-level as configured.
         """
-        scores = dict()
-        for idx, prediction in predictions.items():
-            token_confidences: List[TokenConfidence] = prediction.ner_confidences_token
-            count_token_nes: List[float] = []
-            for token in token_confidences:
-                probable_label: str = token.get_predicted_label()
-                if is_named_entity(probable_label):
-                    count_token_nes.append(1)
-                else:
-                    count_token_nes.append(0)
-            instance_score = self.aggregate_function(count_token_nes)
-            scores[idx] = instance_score
-        sorted_dict_by_score: List[Tuple[int, int]] = sorted(scores.items(), key=lambda x: x[1], reverse=True)
-        out_ids = [item[0] for item in sorted_dict_by_score[:step_size]]
+        ids, scores = self.score_ner(predictions)
+        return select_top_k(ids, scores, step_size, largest=True)
 
-        return out_ids
+    def score_ner(self, predictions: Mapping[int, PredictionResult]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Returns the ids and instance level scores of the given predictions.
+        """
+        token_predictions = as_token_predictions(predictions)
+        return aggregate_token_scores(token_predictions,
+                                      token_named_entity_indicator(token_predictions),
+                                      self.aggregation_method)
 
     def compute_cls(self, predictions: Dict[int, PredictionResult], step_size: int) -> List[int]:
         raise NotImplementedError(
@@ -63,8 +63,7 @@ class RoundRobinHighestConfidenceTeacher(BaseTeacher, ABC):
             batch: List[int] = random.sample(potential_ids, budget)
         else:
             batch: List[int] = potential_ids
-        idx2text = self.corpus.get_text_by_ids(batch)
-        prediction_results: Dict[int, PredictionResult] = self.predictor.predict(idx2text)
+        prediction_results: Dict[int, PredictionResult] = self.predictor.predict(batch)
         out_ids: List[int] = self.compute_function(prediction_results, step_size)
 
         return out_ids
@@ -0,0 +1,137 @@
+"""
+Vectorized scoring for exploitation teachers.
+
+Token level scores are computed on the (tokens x labels) probability matrix of a ``TokenPredictions`` container,
+reduced to document level with segment reductions over the document offsets and ranked with a partial sort.
+"""
+from typing import Dict, List, Mapping, Sequence, Tuple, Union
+
+import numpy as np
+
+from ale.config import AggregationMethod
+from ale.teacher.teacher_utils import is_named_entity
+from ale.trainer.prediction_result import PredictionResult, TokenPredictions, aggregate_segments
+
+
+def as_token_predictions(predictions: Mapping[int, PredictionResult]) -> TokenPredictions:
+    """
+    Returns the columnar view of the given predictions (no copy if they are already columnar).
+    """
+    return TokenPredictions.from_prediction_results(predictions)
+
+
+def token_highest_confidence(probabilities: np.ndarray) -> np.ndarray:
+    """
+    Confidence of the most probable label per token.
+    """
+    if probabilities.shape[0] == 0:
+        return np.zeros(0, dtype=probabilities.dtype)
+    return probabilities.max(axis=1)
+
+
+def token_margin(probabilities: np.ndarray) -> np.ndarray:
+    """
+    Difference between the two most probable labels per token.
+    """
+    if probabilities.shape[1] < 2:
+        raise ValueError("Get top k (2) labels by confidence exceeds number of labels!")
+    if probabilities.shape[0] == 0:
+        return np.zeros(0, dtype=probabilities.dtype)
+    top_two = np.partition(probabilities, probabilities.shape[1] - 2, axis=1)[:, -2:]
+    return np.abs(top_two[:, 1] - top_two[:, 0])
+
+
+def token_entropy(probabilities: np.ndarray) -> np.ndarray:
+    """
+    Shannon entropy per token. Labels with zero probability do not contribute.
+    """
+    log_probabilities = np.log(probabilities, out=np.zeros_like(probabilities), where=probabilities > 0)
+    return -np.einsum("ij,ij->i", probabilities, log_probabilities)
+
+
+def token_named_entity_indicator(predictions: TokenPredictions) -> np.ndarray:
+    """
+    1 for tokens whose predicted label is a named entity, 0 otherwise.
+    """
+    is_entity_label = np.array([is_named_entity(label) for label in predictions.labels], dtype=np.float64)
+    return is_entity_label[predictions.predicted_label_ids]
+
+
+def aggregate_token_scores(predictions: TokenPredictions,
+                           token_scores: np.ndarray,
+                           aggregation_method: AggregationMethod) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Aggregates token scores on instance level.
+
+    Returns:
+        - ids (ndarray): document ids in container order
+        - scores (ndarray): one score per document
+    """
+    return predictions.ids, aggregate_segments(token_scores, predictions.offsets, aggregation_method)
+
+
+def rank_top_k(keys: np.ndarray, positions: np.ndarray, k: int) -> np.ndarray:
+    """
+    Returns the indices of the k lowest keys in ranked order, ties are broken by position and NaN keys come last.
+    Uses a partial sort, so only the candidates of the top k are fully sorted.
+    """
+    keys = np.where(np.isnan(keys), np.inf, keys)
+    n = len(keys)
+    if k <= 0 or n == 0:
+        return np.zeros(0, dtype=np.int64)
+    if k < n:
+        kth_key = np.partition(keys, k - 1)[k - 1]
+        candidates = np.flatnonzero(keys <= kth_key)
+    else:
+        candidates = np.arange(n)
+
+    return candidates[np.lexsort((positions[candidates], keys[candidates]))][:k]
+
+
+def select_top_k(ids: Union[Sequence[int], np.ndarray], scores: Union[Sequence[float], np.ndarray], k: int,
+                 largest: bool = False) -> List[int]:
+    """
+    Returns the ids of the k lowest (or highest) scores in ranked order. Ties keep the order of ``ids``,
+    NaN scores are ranked last.
+    """
+    ids = np.asarray(ids)
+    keys = np.asarray(scores, dtype=np.float64)
+    if largest:
+        keys = -keys
+    return ids[rank_top_k(keys, np.arange(len(keys)), k)].tolist()
+
+
+class TopKCollector:
+    """
+    Keeps the k lowest (or highest) scored documents of a stream of scored batches.
+
+    Only the current top k and one batch are held at once. Ties are broken by the position of the document in the
+    candidate list, thus the result equals ``select_top_k`` over all candidates in that order.
+    """
+
+    def __init__(self, k: int, candidate_ids: Sequence[int], largest: bool = False):
+        self.k = k
+        self.largest = largest
+        self.position_by_id: Dict[int, int] = {int(idx): position for position, idx in enumerate(candidate_ids)}
+        self.ids = np.zeros(0, dtype=np.int64)
+        self.keys = np.zeros(0, dtype=np.float64)
+        self.positions = np.zeros(0, dtype=np.int64)
+
+    def add(self, ids: Union[Sequence[int], np.ndarray], scores: Union[Sequence[float], np.ndarray]):
+        keys = np.asarray(scores, dtype=np.float64)
+        if self.largest:
+            keys = -keys
+        positions = np.array([self.position_by_id[int(idx)] for idx in ids], dtype=np.int64)
+
+        self.ids = np.concatenate([self.ids, np.asarray(ids, dtype=np.int64)])
+        self.keys = np.concatenate([self.keys, keys])
+        self.positions = np.concatenate([self.positions, positions])
+
+        kept = rank_top_k(self.keys, self.positions, self.k)
+        self.ids, self.keys, self.positions = self.ids[kept], self.keys[kept], self.positions[kept]
+
+    def get_top_k(self) -> List[int]:
+        """
+        Ids of the collected documents in ranked order.
+        """
+        return self.ids.tolist()
@@ -0,0 +1,70 @@
+import random
+from typing import List, Dict, Optional, Mapping, Tuple
+
+import numpy as np
+
+from ale.config import NLPTask
+from ale.corpus.corpus import Corpus
+from ale.registry.registerable_teacher import TeacherRegistry
+from ale.teacher.exploitation.aggregation_methods import AggregationMethod
+from ale.teacher.exploitation.least_confidence import LeastConfidenceTeacher
+from ale.teacher.exploitation.scoring import TopKCollector, as_token_predictions, select_top_k
+from ale.trainer.predictor import Predictor
+from ale.trainer.prediction_result import PredictionResult
+
+
+@TeacherRegistry.register("sequence-least-confidence")
+class SequenceLeastConfidenceTeacher(LeastConfidenceTeacher):
+    """
+    Sequence Least Confidence teacher: chooses documents where the probability P(y*|x) of the most likely label
+    sequence is lowest. CRF models compute it as exp(viterbi_score - log Z) from a single forward recursion, without
+    token marginals. Documents are ranked by log P(y*|x), which orders like 1 - P(y*|x) but does not underflow.
+
+        Applied to ER task:
+            - Culotta, A., McCallum, A.: Reducing labeling effort for structured prediction tasks.
+            In: Proceedings of the 20th National Conference on Artificial Intelligence. vol. 2, pp. 746–751 (2005)
+    """
+
+    def __init__(
+        self,
+        corpus: Corpus,
+        predictor: Predictor,
+        seed: int,
+        labels: List[any],
+        nlp_task: NLPTask,
+        aggregation_method: Optional[AggregationMethod] = None
+    ):
+        super().__init__(
+            corpus=corpus,
+            predictor=predictor,
+            seed=seed,
+            labels=labels,
+            nlp_task=nlp_task,
+            aggregation_method=aggregation_method
+        )
+
+    def prediction_candidates(self, potential_ids: List[int], step_size: int, budget: int) -> Optional[List[int]]:
+        # Shared predictions contain token marginals, which this teacher does not need
+        return None
+
+    def propose(self, potential_ids: List[int], step_size: int, budget: int) -> List[int]:
+        if self.nlp_task != NLPTask.NER:
+            return super().propose(potential_ids, step_size, budget)
+
+        candidates = self.draw_candidates(potential_ids, budget, lambda: random.sample(potential_ids, budget))
+        collector = TopKCollector(step_size, candidates)
+        for ids, log_probabilities in self.predictor.predict_sequence_log_probabilities(candidates):
+            collector.add(ids, log_probabilities)
+        return collector.get_top_k()
+
+    def compute_ner(self, predictions: Dict[int, PredictionResult], step_size: int) -> List[int]:
+        ids, scores = self.score_ner(predictions)
+        return select_top_k(ids, scores, step_size)
+
+    def score_ner(self, predictions: Mapping[int, PredictionResult]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Approximates log P(y*|x) by the highest token confidences, see
+        ``TokenPredictions.get_sequence_log_probabilities``.
+        """
+        token_predictions = as_token_predictions(predictions)
+        return token_predictions.ids, token_predictions.get_sequence_log_probabilities()
@@ -0,0 +1,101 @@
+import functools
+import random
+from typing import List, Any, Optional, Tuple
+
+import numpy as np
+
+from ale.config import CoreSetEmbeddings, NLPTask
+from ale.corpus.corpus import Corpus
+from ale.registry.registerable_teacher import TeacherRegistry
+from ale.teacher.base_teacher import BaseTeacher
+from ale.teacher.exploration.utils.embedding_helper import EmbeddingHelper
+from ale.teacher.exploration.utils.embedding_store import create_embedding_store
+from ale.teacher.exploration.utils.similarity import CosineSimilarity, MaxSimilarityTracker, k_center_greedy
+from ale.teacher.teacher_utils import tfidf_vectorize, sentence_transformer_vectorize
+from ale.trainer.predictor import Predictor
+
+
+@TeacherRegistry.register("core-set")
+class CoreSetTeacher(BaseTeacher):
+    """
+    The core-set teacher proposes the samples selected by greedy k-center: each sample is the one farthest (cosine
+    distance) from the labeled and the already proposed samples.
+
+        - Sener, O., Savarese, S.: Active Learning for Convolutional Neural Networks: A Core-Set Approach.
+        In: International Conference on Learning Representations (2018). https://arxiv.org/abs/1708.00489
+
+    The distance of every candidate to its closest center is kept in one array and updated with the distances to
+    each proposed sample, no distance matrix is computed. The embeddings (``teacher.core_set_embeddings``) are TF-IDF
+    vectors, sentence transformer embeddings or the pooled encoder output of the trained model as in the paper.
+    """
+
+    def __init__(self, corpus: Corpus, predictor: Predictor, seed: int, labels: List[Any], nlp_task: NLPTask):
+        super().__init__(
+            corpus=corpus,
+            predictor=predictor,
+            seed=seed,
+            labels=labels,
+            nlp_task=nlp_task
+        )
+        teacher_cfg = corpus.cfg.teacher
+        self.embeddings = teacher_cfg.core_set_embeddings
+        self.max_block_bytes = teacher_cfg.similarity_block_mb * 2 ** 20
+        if self.embeddings == CoreSetEmbeddings.TFIDF:
+            self.embedding_helper = EmbeddingHelper(corpus, tfidf_vectorize)
+        elif self.embeddings == CoreSetEmbeddings.SENTENCE_TRANSFORMER:
+            model_name = "all-mpnet-base-v2"
+            self.embedding_helper = EmbeddingHelper(corpus,
+                                                    functools.partial(sentence_transformer_vectorize,
+                                                                      model_name=model_name),
+                                                    create_embedding_store(corpus.cfg, model_name))
+        else:
+            if not hasattr(predictor, "predict_embeddings"):
+                raise ValueError(f"Core-set model embeddings are not provided by {type(predictor).__name__}")
+            self.embedding_helper = None
+
+        if self.embedding_helper is not None:
+            self.cosine_similarities = CosineSimilarity(self.embedding_helper.get_embeddings(), self.max_block_bytes)
+            self.max_similarities = MaxSimilarityTracker(self.cosine_similarities, corpus, self.embedding_helper)
+
+    def propose(self, potential_ids: List[int], step_size: int, budget: int) -> List[int]:
+        # only documents of the batch will be evaluated and sought for proposal
+        if budget < len(potential_ids):
+            batch: List[int] = random.sample(potential_ids, budget)
+        else:
+            batch: List[int] = potential_ids
+        if len(batch) == 0:
+            return []
+
+        if self.embedding_helper is None:
+            similarities, rows, max_similarities = self.model_similarities(batch)
+        else:
+            similarities = self.cosine_similarities
+            rows = self.embedding_helper.get_embedding_indices_for_doc_ids(batch)
+            if len(self.corpus.get_annotated_data_points_ids()) > 0:
+                max_similarities = self.max_similarities.max_similarity_to_annotated(rows)
+            else:
+                max_similarities = np.full(len(rows), -np.inf, dtype=np.float32)
+
+        selected = k_center_greedy(similarities, rows, max_similarities, step_size)
+        return [batch[position] for position in selected]
+
+    def model_similarities(self, batch: List[int]) -> Tuple[CosineSimilarity, List[int], np.ndarray]:
+        """
+        Similarities of the embeddings of the trained model of the annotated documents and the batch. The model
+        changes every cycle, thus they are computed for the current proposal only.
+        """
+        annotated_ids: List[int] = self.corpus.get_annotated_data_points_ids()
+        embeddings: Optional[np.ndarray] = None
+        row_by_id = {doc_id: row for row, doc_id in enumerate(annotated_ids + batch)}
+        for ids, batch_embeddings in self.predictor.predict_embeddings(annotated_ids + batch):
+            if embeddings is None:
+                embeddings = np.empty((len(row_by_id), batch_embeddings.shape[1]), dtype=np.float32)
+            embeddings[[row_by_id[doc_id] for doc_id in ids.tolist()]] = batch_embeddings
+
+        similarities = CosineSimilarity(embeddings, self.max_block_bytes)
+        rows = list(range(len(annotated_ids), len(annotated_ids) + len(batch)))
+        if len(annotated_ids) > 0:
+            max_similarities = similarities.reduce(rows, range(len(annotated_ids)), "max")
+        else:
+            max_similarities = np.full(len(rows), -np.inf, dtype=np.float32)
+        return similarities, rows, max_similarities
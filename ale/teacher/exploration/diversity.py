@@ -2,13 +2,13 @@ import random
 from typing import List, Any, Dict
 
 import numpy as np
-from sklearn.metrics.pairwise import cosine_similarity
 
 from ale.config import NLPTask
 from ale.corpus.corpus import Corpus
 from ale.registry.registerable_teacher import TeacherRegistry
 from ale.teacher.base_teacher import BaseTeacher
 from ale.teacher.exploration.utils.embedding_helper import EmbeddingHelper
+from ale.teacher.exploration.utils.similarity import CosineSimilarity, MaxSimilarityTracker
 from ale.teacher.teacher_utils import tfidf_vectorize
 from ale.trainer.predictor import Predictor
 
@@ -36,7 +36,9 @@ class DiversityTeacher(BaseTeacher):
             nlp_task=nlp_task
         )
         self.embedding_helper = EmbeddingHelper(corpus, tfidf_vectorize)
-        self.cosine_similarities: np.ndarray = cosine_similarity(self.embedding_helper.get_embeddings())
+        self.cosine_similarities = CosineSimilarity(self.embedding_helper.get_embeddings(),
+                                                    corpus.cfg.teacher.similarity_block_mb * 2 ** 20)
+        self.max_similarities = MaxSimilarityTracker(self.cosine_similarities, corpus, self.embedding_helper)
 
     def propose(self, potential_ids: List[int], step_size: int, budget: int) -> List[int]:
         # only documents of the batch will be evaluated and sought for proposal
@@ -56,18 +58,9 @@ class DiversityTeacher(BaseTeacher):
         out_ids = [item[0] for item in sorted_dict_by_score[:step_size]]
         return out_ids
 
-    def compute_similarity_scores_for_docs(self, annotated_ids: List[int], batch: List[int]):
-        scores: Dict[int, float] = {}
-        labeled_data_embedding_indices: List[int] = (self.embedding_helper.
-                                                     get_embedding_indices_for_doc_ids(annotated_ids))
-        # get the similarity for each doc of the batch to all already labeled documents
-        for doc_id in batch:
-            scores[doc_id] = self.compute_similarity_score_for_single_doc(doc_id, labeled_data_embedding_indices)
-
-        return scores
-
-    def compute_similarity_score_for_single_doc(self, doc_id: int, labeled_indices: List[int]) -> float:
-        embedding_idx = self.embedding_helper.get_embedding_index_for_doc_id(doc_id)
-        similarity_scores: np.ndarray = self.cosine_similarities[embedding_idx][labeled_indices]
-        # get similarity score for doc with labeled corpus, use complete linkage: max cosine-similarity
-        return similarity_scores.max()
+    def compute_similarity_scores_for_docs(self, annotated_ids: List[int], batch: List[int]) -> Dict[int, float]:
+        batch_indices: List[int] = self.embedding_helper.get_embedding_indices_for_doc_ids(batch)
+        # get the similarity for each doc of the batch to all already labeled documents,
+        # use complete linkage: max cosine-similarity (tracked while the labeled documents grow)
+        similarity_scores: np.ndarray = self.max_similarities.max_similarity_to_annotated(batch_indices)
+        return dict(zip(batch, similarity_scores.tolist()))
@@ -1,3 +1,4 @@
+import functools
 import logging
 from typing import List, Any
 
@@ -6,6 +7,8 @@ from ale.corpus.corpus import Corpus
 from ale.registry.registerable_teacher import TeacherRegistry
 from ale.teacher.base_teacher import BaseTeacher
 from ale.teacher.exploration.utils.cluster_helper import ClusterHelper
+from ale.teacher.exploration.utils.embedding_helper import EmbeddingHelper
+from ale.teacher.exploration.utils.embedding_store import create_embedding_store
 from ale.teacher.teacher_utils import tfidf_vectorize, sentence_transformer_vectorize
 from ale.trainer.predictor import Predictor
 
@@ -86,8 +89,11 @@ class KMeansClusterBasedBERTTeacher(BaseTeacher):
         )
         self.num_labels = len(self.labels)
         # all-mpnet-base-v2: currently (07-2024) the SOTA sentence transformer
-        all_texts = list(corpus.get_all_texts_with_ids().values())
-        embeddings = sentence_transformer_vectorize(all_texts, model_name="all-mpnet-base-v2")
+        model_name = "all-mpnet-base-v2"
+        embedding_helper = EmbeddingHelper(corpus,
+                                           functools.partial(sentence_transformer_vectorize, model_name=model_name),
+                                           create_embedding_store(corpus.cfg, model_name))
+        embeddings = embedding_helper.get_embeddings()
         self.cluster_helper = ClusterHelper(embeddings)
         self.cluster_helper.adaptive_cluster(corpus=corpus,
                                              num_labels=self.num_labels,
@@ -2,13 +2,13 @@ import random
 from typing import List, Any, Dict
 
 import numpy as np
-from sklearn.metrics.pairwise import cosine_similarity
 
 from ale.config import NLPTask
 from ale.corpus.corpus import Corpus
 from ale.registry.registerable_teacher import TeacherRegistry
 from ale.teacher.base_teacher import BaseTeacher
 from ale.teacher.exploration.utils.embedding_helper import EmbeddingHelper
+from ale.teacher.exploration.utils.similarity import CentroidSimilarity, CosineSimilarity
 from ale.teacher.teacher_utils import tfidf_vectorize
 from ale.trainer.predictor import Predictor
 
@@ -42,7 +42,9 @@ class RepresentativeDiversityTeacher(BaseTeacher):
             nlp_task=nlp_task
         )
         self.embedding_helper = EmbeddingHelper(corpus, tfidf_vectorize)
-        self.cosine_similarities: np.ndarray = cosine_similarity(self.embedding_helper.get_embeddings())
+        self.cosine_similarities = CosineSimilarity(self.embedding_helper.get_embeddings(),
+                                                    corpus.cfg.teacher.similarity_block_mb * 2 ** 20)
+        self.centroid_similarities = CentroidSimilarity(self.cosine_similarities, corpus, self.embedding_helper)
 
     def propose(self, potential_ids: List[int], step_size: int, budget: int) -> List[int]:
         if budget < len(potential_ids):
@@ -64,25 +66,13 @@ class RepresentativeDiversityTeacher(BaseTeacher):
         return out_ids
 
     def compute_scores(self, annotated_ids: List[int], batch: List[int]) -> Dict[int, float]:
-        labeled_embedding_indices: List[int] = self.embedding_helper.get_embedding_indices_for_doc_ids(annotated_ids)
-        unlabeled_embedding_indices: List[int] = self.embedding_helper.get_embedding_indices_for_doc_ids(
-            self.corpus.get_not_annotated_data_points_ids())
-        scores: Dict[int, float] = {}
-        # get the similarity for each doc of the batch to all already labeled documents
-        for doc_id in batch:
-            scores[doc_id] = self.compute_single_score(doc_id, labeled_embedding_indices, unlabeled_embedding_indices)
-        return scores
-
-    def compute_single_score(self,
-                             doc_id: int,
-                             labeled_embedding_indices: List[int],
-                             unlabeled_embedding_indices: List[int]) -> float:
-        doc_idx = self.embedding_helper.get_embedding_index_for_doc_id(doc_id)
+        batch_indices: List[int] = self.embedding_helper.get_embedding_indices_for_doc_ids(batch)
         # calculate representativeness score for doc with unlabeled docs,
         # use average of all unlabeled docs: avg cosine-similarity (see formula 5)
-        representative_scores: np.ndarray = self.cosine_similarities[doc_idx][unlabeled_embedding_indices]
+        representative_scores: np.ndarray = self.centroid_similarities.mean_similarity_to_not_annotated(batch_indices)
         # get similarity score for doc with labeled corpus,
         # use average of all labeled docs: avg cosine-similarity (see formula 8)
-        diversity_scores: np.ndarray = self.cosine_similarities[doc_idx][labeled_embedding_indices]
+        diversity_scores: np.ndarray = self.centroid_similarities.mean_similarity_to_annotated(batch_indices)
         # use max_sim as overall similarity score of the current doc to labeled dataset (see formula 10)
-        return np.mean(representative_scores) * (1 - np.mean(diversity_scores))
+        scores: np.ndarray = representative_scores * (1 - diversity_scores)
+        return dict(zip(batch, scores.tolist()))
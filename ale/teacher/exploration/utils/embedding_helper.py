@@ -1,19 +1,27 @@
-from typing import Dict, List, Callable
+from typing import Dict, List, Callable, Optional
 
 import numpy as np
 
 from ale.corpus.corpus import Corpus
+from ale.teacher.exploration.utils.embedding_store import EmbeddingStore
 
 
 class EmbeddingHelper:
-    def __init__(self, corpus: Corpus, embedding_function: Callable[[List[str]], np.ndarray]):
+    def __init__(self, corpus: Corpus, embedding_function: Callable[[List[str]], np.ndarray],
+                 embedding_store: Optional[EmbeddingStore] = None):
+        """
+        With an ``embedding_store`` only texts without stored embeddings are passed to the embedding function.
+        """
         self.doc_id2embedding_index: Dict[int, int] = {}
         texts: List[str] = []
         for i, (doc_id, text) in enumerate(corpus.get_all_texts_with_ids().items()):
             self.doc_id2embedding_index[doc_id] = i
             texts.append(text)
 
-        self.embeddings = embedding_function(texts)
+        if embedding_store is not None:
+            self.embeddings = embedding_store.encode(texts, embedding_function)
+        else:
+            self.embeddings = embedding_function(texts)
 
     def get_embeddings(self) -> np.ndarray:
         return self.embeddings
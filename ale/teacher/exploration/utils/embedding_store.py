@@ -0,0 +1,158 @@
+import hashlib
+import json
+import logging
+import os
+import time
+import uuid
+from pathlib import Path
+from typing import Callable, List, Optional, Set, Union
+
+import numpy as np
+
+from ale.config import AppConfig
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_STORE_VERSION = 1
+
+
+def text_keys(texts: List[str]) -> np.ndarray:
+    """
+    64 bit content hashes of the texts.
+    """
+    return np.fromiter((int.from_bytes(hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest(), "little")
+                        for text in texts), dtype=np.uint64, count=len(texts))
+
+
+class EmbeddingStore:
+    """
+    Persistent cache of text embeddings, keyed by the content hash of the text, the model name and the
+    normalization. Thus all seeds, teachers and resumed runs using the same model encode every text only once.
+
+    Embeddings are stored in shards (one per encoding call with new texts): a ``.npy`` file of vectors sorted by
+    key, memory-mapped on lookup, and a ``.keys.npy`` file of the sorted keys. A shard is complete once its keys file
+    exists. If the shards exceed ``max_size_bytes``, the least recently used ones are deleted.
+    """
+
+    def __init__(self, cache_dir: Union[str, Path], model_name: str, normalize: bool = False,
+                 dtype: str = "float32", max_size_bytes: Optional[int] = None):
+        settings = {"version": EMBEDDING_STORE_VERSION, "model": model_name, "normalize": normalize, "dtype": dtype}
+        namespace = hashlib.sha256(json.dumps(settings, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+        self.directory = Path(cache_dir) / namespace
+        self.normalize = normalize
+        self.dtype = np.dtype(dtype)
+        self.max_size_bytes = max_size_bytes
+
+    def get_shards(self) -> List[str]:
+        if not self.directory.exists():
+            return []
+        return sorted(path.name[:-len(".keys.npy")] for path in self.directory.glob("*.keys.npy"))
+
+    def keys_path(self, shard: str) -> Path:
+        return self.directory / f"{shard}.keys.npy"
+
+    def vectors_path(self, shard: str) -> Path:
+        return self.directory / f"{shard}.npy"
+
+    def encode(self, texts: List[str], embedding_function: Callable[[List[str]], np.ndarray]) -> np.ndarray:
+        """
+        Returns the embeddings of the texts (float32), only texts not stored yet are passed to the embedding function.
+        """
+        if len(texts) == 0:
+            return np.asarray(embedding_function(texts), dtype=np.float32)
+
+        keys = text_keys(texts)
+        found = np.zeros(len(texts), dtype=bool)
+        result: Optional[np.ndarray] = None
+        used_shards: Set[str] = set()
+        for shard in self.get_shards():
+            try:
+                shard_keys = np.load(self.keys_path(shard))
+                positions = np.minimum(np.searchsorted(shard_keys, keys), len(shard_keys) - 1)
+                hits = ~found & (shard_keys[positions] == keys)
+                if not hits.any():
+                    continue
+                vectors = np.load(self.vectors_path(shard), mmap_mode="r")
+            except FileNotFoundError:
+                # Evicted by another run
+                continue
+            if result is None:
+                result = np.empty((len(texts), vectors.shape[1]), dtype=np.float32)
+            result[hits] = vectors[positions[hits]]
+            found |= hits
+            used_shards.add(shard)
+
+        missing = np.flatnonzero(~found)
+        logger.info(f"Embedding store: {len(texts) - len(missing)} of {len(texts)} embeddings found")
+        if len(missing) > 0:
+            missing_keys, first, inverse = np.unique(keys[missing], return_index=True, return_inverse=True)
+            vectors = np.asarray(embedding_function([texts[missing[i]] for i in first]), dtype=np.float32)
+            if self.normalize:
+                vectors = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+            vectors = vectors.astype(self.dtype)
+            if result is None:
+                result = np.empty((len(texts), vectors.shape[1]), dtype=np.float32)
+            result[missing] = vectors[inverse.reshape(-1)]
+            used_shards.add(self.write_shard(missing_keys, vectors))
+
+        self.touch(used_shards)
+        self.evict(used_shards)
+        return result
+
+    def write_shard(self, keys: np.ndarray, vectors: np.ndarray) -> str:
+        """
+        Writes the vectors of the (sorted, unique) keys as a new shard. Files are renamed into place, the keys file
+        last.
+        """
+        self.directory.mkdir(parents=True, exist_ok=True)
+        shard = f"{time.time_ns()}-{uuid.uuid4().hex[:8]}"
+        for path, array in [(self.vectors_path(shard), vectors), (self.keys_path(shard), keys)]:
+            temp_path = path.with_name(f".{path.name}.tmp")
+            with open(temp_path, "wb") as f:
+                np.save(f, array)
+            os.replace(temp_path, path)
+        return shard
+
+    def touch(self, shards: Set[str]):
+        for shard in shards:
+            try:
+                os.utime(self.keys_path(shard))
+            except FileNotFoundError:
+                pass
+
+    def evict(self, keep: Set[str]):
+        if self.max_size_bytes is None:
+            return
+
+        sizes, last_used = {}, {}
+        for shard in self.get_shards():
+            try:
+                sizes[shard] = self.keys_path(shard).stat().st_size + self.vectors_path(shard).stat().st_size
+                last_used[shard] = self.keys_path(shard).stat().st_mtime
+            except FileNotFoundError:
+                continue
+
+        total = sum(sizes.values())
+        for shard in sorted(sizes.keys(), key=lambda s: last_used[s]):
+            if total <= self.max_size_bytes:
+                break
+            if shard in keep:
+                continue
+            logger.info(f"Evict embedding shard {shard}")
+            # Keys file first, the shard is incomplete from then on
+            for path in [self.keys_path(shard), self.vectors_path(shard)]:
+                path.unlink(missing_ok=True)
+            total -= sizes[shard]
+
+
+def create_embedding_store(cfg: AppConfig, model_name: str, normalize: bool = False) -> Optional[EmbeddingStore]:
+    """
+    Embedding store of the configured cache directory, None if no directory is configured.
+    """
+    teacher_cfg = cfg.teacher
+    if teacher_cfg.embedding_cache_dir is None:
+        return None
+    max_size_bytes = int(teacher_cfg.embedding_cache_max_gb * 2 ** 30) \
+        if teacher_cfg.embedding_cache_max_gb is not None else None
+    return EmbeddingStore(teacher_cfg.embedding_cache_dir, model_name, normalize=normalize,
+                          dtype=teacher_cfg.embedding_cache_dtype, max_size_bytes=max_size_bytes)
@@ -0,0 +1,195 @@
+from abc import ABC, abstractmethod
+from typing import List, Optional, Sequence, Union
+
+import numpy as np
+import scipy.sparse as sp
+from sklearn.preprocessing import normalize
+
+from ale.corpus.corpus import Corpus
+from ale.teacher.exploration.utils.embedding_helper import EmbeddingHelper
+
+Embeddings = Union[np.ndarray, sp.spmatrix]
+
+DEFAULT_MAX_BLOCK_BYTES = 256 * 2 ** 20
+
+
+class CosineSimilarity:
+    """
+    Cosine similarities between documents, computed block-wise on demand instead of a dense N x N matrix.
+
+    The embeddings are L2 normalized once (sparse embeddings like TF-IDF stay sparse), a block of similarities is
+    the product of the row and column embeddings in float32. Reductions over many columns are computed in chunks
+    of at most ``max_block_bytes``.
+    """
+
+    def __init__(self, embeddings: Embeddings, max_block_bytes: int = DEFAULT_MAX_BLOCK_BYTES):
+        if sp.issparse(embeddings):
+            self.embeddings = normalize(sp.csr_matrix(embeddings, dtype=np.float32))
+        else:
+            self.embeddings = normalize(np.asarray(embeddings, dtype=np.float32))
+        self.max_block_bytes = max_block_bytes
+
+    def block(self, rows: Sequence[int], columns: Sequence[int]) -> np.ndarray:
+        """
+        Similarities of the row documents (embedding indices) to the column documents, shape (rows, columns).
+        """
+        similarities = self.embeddings[np.asarray(rows, dtype=np.int64)] @ \
+            self.embeddings[np.asarray(columns, dtype=np.int64)].T
+        return similarities.toarray() if sp.issparse(similarities) else np.asarray(similarities)
+
+    def reduce(self, rows: Sequence[int], columns: Sequence[int], reduction: str) -> np.ndarray:
+        """
+        Maximum (``max``) or mean (``mean``) similarity of each row document to the column documents.
+        """
+        if reduction not in ["max", "mean"]:
+            raise ValueError(f"Unknown reduction: {reduction}")
+        if len(columns) == 0:
+            raise ValueError("Cannot reduce similarities over no documents")
+
+        rows = np.asarray(rows, dtype=np.int64)
+        columns = np.asarray(columns, dtype=np.int64)
+        row_chunk = max(1, min(len(rows), self.max_block_bytes // (4 * len(columns))))
+        column_chunk = max(1, self.max_block_bytes // (4 * row_chunk))
+
+        result = np.empty(len(rows), dtype=np.float32)
+        for row_start in range(0, len(rows), row_chunk):
+            row_indices = rows[row_start:row_start + row_chunk]
+            reduced = np.full(len(row_indices), -np.inf if reduction == "max" else 0.0, dtype=np.float32)
+            for column_start in range(0, len(columns), column_chunk):
+                block = self.block(row_indices, columns[column_start:column_start + column_chunk])
+                if reduction == "max":
+                    np.maximum(reduced, block.max(axis=1), out=reduced)
+                else:
+                    reduced += block.sum(axis=1, dtype=np.float32)
+            result[row_start:row_start + len(row_indices)] = reduced if reduction == "max" else reduced / len(columns)
+        return result
+
+    def sum(self, rows: Sequence[int]) -> np.ndarray:
+        """
+        Sum of the normalized embeddings of the documents (float64).
+        """
+        summed = self.embeddings[np.asarray(rows, dtype=np.int64)].sum(axis=0, dtype=np.float64)
+        return np.asarray(summed).reshape(-1)
+
+    def dot(self, rows: Sequence[int], vector: np.ndarray) -> np.ndarray:
+        """
+        Products of the normalized embeddings of the documents with the vector.
+        """
+        return np.asarray(self.embeddings[np.asarray(rows, dtype=np.int64)] @ vector).reshape(-1)
+
+
+class AnnotationTracker(ABC):
+    """
+    Base class of statistics over the annotated documents of a corpus which are updated incrementally. The corpus
+    only appends annotated ids, thus each ``update`` passes the documents annotated since the last one to ``add``.
+    If the annotations were replaced (e.g. restored, see ``AnnotationState.version``), the statistics are ``reset``
+    and built again.
+    """
+
+    def __init__(self, similarities: CosineSimilarity, corpus: Corpus, embedding_helper: EmbeddingHelper):
+        self.similarities = similarities
+        self.corpus = corpus
+        self.embedding_helper = embedding_helper
+        self.num_documents = similarities.embeddings.shape[0]
+        self.version: Optional[int] = None
+        self.num_annotated = 0
+
+    @abstractmethod
+    def reset(self):
+        pass
+
+    @abstractmethod
+    def add(self, rows: List[int]):
+        pass
+
+    def update(self):
+        annotation_state = self.corpus.annotation_state
+        if annotation_state.version != self.version:
+            self.version = annotation_state.version
+            self.num_annotated = 0
+            self.reset()
+        annotated_ids = annotation_state.annotated_ids
+        new_ids = annotated_ids[self.num_annotated:]
+        if len(new_ids) > 0:
+            self.add(self.embedding_helper.get_embedding_indices_for_doc_ids(new_ids))
+            self.num_annotated = len(annotated_ids)
+
+
+class CentroidSimilarity(AnnotationTracker):
+    """
+    Mean cosine similarities to the annotated and to the not annotated documents of a corpus. With normalized
+    embeddings, the mean similarity of document i to a set S is ``e_i · (sum of e_s) / |S|``. The sum over the
+    annotated documents is kept up to date with the corpus: documents annotated since the last call are added in
+    O(k·d), the sum over the not annotated documents is the difference to the sum over all documents.
+    """
+
+    def __init__(self, similarities: CosineSimilarity, corpus: Corpus, embedding_helper: EmbeddingHelper):
+        super().__init__(similarities, corpus, embedding_helper)
+        self.total_sum = similarities.sum(range(self.num_documents))
+        self.annotated_sum = np.zeros_like(self.total_sum)
+
+    def reset(self):
+        self.annotated_sum = np.zeros_like(self.total_sum)
+
+    def add(self, rows: List[int]):
+        self.annotated_sum += self.similarities.sum(rows)
+
+    def mean_similarity_to_annotated(self, rows: Sequence[int]) -> np.ndarray:
+        self.update()
+        if self.num_annotated == 0:
+            raise ValueError("Cannot compute similarities to no annotated documents")
+        return self.similarities.dot(rows, self.annotated_sum / self.num_annotated)
+
+    def mean_similarity_to_not_annotated(self, rows: Sequence[int]) -> np.ndarray:
+        self.update()
+        num_not_annotated = self.num_documents - self.num_annotated
+        if num_not_annotated == 0:
+            raise ValueError("Cannot compute similarities to no not annotated documents")
+        return self.similarities.dot(rows, (self.total_sum - self.annotated_sum) / num_not_annotated)
+
+
+class MaxSimilarityTracker(AnnotationTracker):
+    """
+    Max. cosine similarity of every document to the annotated documents. Newly annotated documents only require
+    the (all documents x new documents) similarities, computed in chunks: O(N·k·d) per increment instead of
+    O(N·|annotated|·d).
+    """
+
+    def __init__(self, similarities: CosineSimilarity, corpus: Corpus, embedding_helper: EmbeddingHelper):
+        super().__init__(similarities, corpus, embedding_helper)
+        self.max_similarities = np.full(self.num_documents, -np.inf, dtype=np.float32)
+
+    def reset(self):
+        self.max_similarities.fill(-np.inf)
+
+    def add(self, rows: List[int]):
+        new_max_similarities = self.similarities.reduce(np.arange(self.num_documents), rows, "max")
+        np.maximum(self.max_similarities, new_max_similarities, out=self.max_similarities)
+
+    def max_similarity_to_annotated(self, rows: Sequence[int]) -> np.ndarray:
+        self.update()
+        if self.num_annotated == 0:
+            raise ValueError("Cannot compute similarities to no annotated documents")
+        return self.max_similarities[np.asarray(rows, dtype=np.int64)]
+
+
+def k_center_greedy(similarities: CosineSimilarity, rows: Sequence[int], max_similarities: np.ndarray,
+                    k: int) -> List[int]:
+    """
+    Greedy k-center selection with the cosine distance (1 - similarity): repeatedly selects the row document farthest
+    from its closest center and adds it to the centers. ``max_similarities`` holds the max. similarity of each row
+    document to the initial centers (-inf without centers) and is not modified. Each selection updates the copy with
+    the similarities to the selected document, O(N·d) time and O(N) memory per selection.
+    Returns positions in ``rows`` in the order of selection.
+    """
+    rows = np.asarray(rows, dtype=np.int64)
+    max_similarities = np.array(max_similarities, dtype=np.float32)
+    selected: List[int] = []
+    for _ in range(min(k, len(rows))):
+        position = int(np.argmin(max_similarities))
+        selected.append(position)
+        np.maximum(max_similarities, similarities.reduce(rows, rows[position:position + 1], "max"),
+                   out=max_similarities)
+        # Never select a document twice, even if all remaining ones are duplicates of centers
+        max_similarities[position] = np.inf
+    return selected
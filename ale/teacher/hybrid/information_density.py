@@ -1,16 +1,19 @@
+import functools
 from typing import List, Any, Dict
 import random
 import numpy as np
-from sklearn.metrics.pairwise import cosine_similarity
 from ale.config import NLPTask
 from ale.corpus.corpus import Corpus
 from ale.registry.registerable_teacher import TeacherRegistry
 from ale.teacher.base_teacher import BaseTeacher
 from ale.teacher.exploration.utils.embedding_helper import EmbeddingHelper
+from ale.teacher.exploration.utils.embedding_store import create_embedding_store
+from ale.teacher.exploration.utils.similarity import CentroidSimilarity, CosineSimilarity
 from ale.trainer.predictor import Predictor
 from ale.teacher.teacher_utils import sentence_transformer_vectorize
-from ale.trainer.prediction_result import TokenConfidence, PredictionResult
+from ale.trainer.prediction_result import PredictionResult
 from ale.teacher.exploitation.aggregation_methods import AggregationMethod
+from ale.teacher.exploitation.scoring import as_token_predictions, aggregate_token_scores, token_entropy
 
 
 @TeacherRegistry.register("information-density")
@@ -46,8 +49,14 @@ class InformationDensityTeacher(BaseTeacher):
             aggregation_method=aggregation_method
         )
         self.corpus_idx_list: List[int] = list(corpus.get_all_texts_with_ids().keys())
-        self.embedding_helper = EmbeddingHelper(corpus, sentence_transformer_vectorize)
-        self.cosine_similarities: np.ndarray = cosine_similarity(self.embedding_helper.get_embeddings())
+        model_name = "bert-base-nli-mean-tokens"
+        self.embedding_helper = EmbeddingHelper(corpus,
+                                                functools.partial(sentence_transformer_vectorize,
+                                                                  model_name=model_name),
+                                                create_embedding_store(corpus.cfg, model_name))
+        self.cosine_similarities = CosineSimilarity(self.embedding_helper.get_embeddings(),
+                                                    corpus.cfg.teacher.similarity_block_mb * 2 ** 20)
+        self.centroid_similarities = CentroidSimilarity(self.cosine_similarities, corpus, self.embedding_helper)
 
     def propose(self, potential_ids: List[int], step_size: int,  budget: int) -> List[int]:
         if budget < len(potential_ids):
@@ -55,7 +64,8 @@ class InformationDensityTeacher(BaseTeacher):
         else:
             batch: List[int] = potential_ids
 
-        similarity_scores, uncertainty_scores = self.compute_partial_scores(batch, potential_ids)
+        all_not_annotated = self.corpus.annotation_state.covers_not_annotated(potential_ids)
+        similarity_scores, uncertainty_scores = self.compute_partial_scores(batch, potential_ids, all_not_annotated)
         combined_scores = self.compute_combined_scores(batch, similarity_scores, uncertainty_scores)
 
         sorted_dict_by_combined_score = sorted(combined_scores.items(), key=lambda x: x[1], reverse=True)
@@ -69,45 +79,39 @@ class InformationDensityTeacher(BaseTeacher):
         }
         return combined_scores
 
-    def compute_partial_scores(self, batch, potential_ids):
+    def compute_partial_scores(self, batch, potential_ids, all_not_annotated: bool = False):
         # get entropy confidence for documents (inside budget)
-        idx2text = self.corpus.get_text_by_ids(batch)
-        prediction_results: Dict[int, PredictionResult] = self.predictor.predict(idx2text)
+        prediction_results: Dict[int, PredictionResult] = self.predictor.predict(batch)
         uncertainty_scores: Dict[int, float] = self.compute_entropy(prediction_results)
         # get similarity score for each document (inside budget) in comparison
         # to all unlabeled documents of the train corpus
-        similarity_scores: Dict[int, float] = self.get_similarity_scores(batch, potential_ids)
+        similarity_scores: Dict[int, float] = self.get_similarity_scores(batch, potential_ids, all_not_annotated)
         return similarity_scores, uncertainty_scores
 
     def compute_entropy(self, predictions: Dict[int, PredictionResult]) -> Dict[int, float]:
         """
         Entropy confidence is calculated on token-level and aggregated on instance-level as configured.
         """
-        scores: Dict[int, float] = {}
-        for idx, prediction in predictions.items():
-            confidence_scores: List[float] = [self.compute_token_entropy(token)
-                                              for token in prediction.ner_confidences_token]
-            instance_score = self.aggregate_function(confidence_scores)
-            scores[idx] = instance_score
-        return scores
+        token_predictions = as_token_predictions(predictions)
+        ids, scores = aggregate_token_scores(token_predictions,
+                                             token_entropy(token_predictions.probabilities),
+                                             self.aggregation_method)
+        return dict(zip(ids.tolist(), scores.tolist()))
 
-    def compute_token_entropy(self, token):
-        confidences: List[float] = [label_confidence.confidence for label_confidence in token.label_confidence]
-        return -sum([pk * np.log(pk) for pk in confidences])
-
-    def get_similarity_scores(self, batch: List[int], potential_ids: List[int]) -> Dict[int, float]:
+    def get_similarity_scores(self, batch: List[int], potential_ids: List[int],
+                              all_not_annotated: bool = False) -> Dict[int, float]:
         """ Compares bert embeddings of documents in batch with embeddings of all unannotated data points 
-        by cosine similarity
+        by cosine similarity. ``all_not_annotated`` states that potential_ids are all unannotated data points.
         """
-        scores: Dict[int, float] = {}
-        unannotated_indices: List[int] = self.embedding_helper.get_embedding_indices_for_doc_ids(potential_ids)
-        for doc_id in batch:  # get score for all docs of the batch
-            embedding_index: int = self.embedding_helper.get_embedding_index_for_doc_id(doc_id)
-            # get cosine similarity to all unannotated data points
-            similarity_scores: np.ndarray = self.cosine_similarities[embedding_index][unannotated_indices]
-            # use average similarity score
-            scores[doc_id] = np.mean(similarity_scores)
-        return scores
+        batch_indices: List[int] = self.embedding_helper.get_embedding_indices_for_doc_ids(batch)
+        # use average cosine similarity to all unannotated data points
+        if all_not_annotated:
+            similarity_scores: np.ndarray = self.centroid_similarities.mean_similarity_to_not_annotated(batch_indices)
+        else:
+            unannotated_indices: List[int] = self.embedding_helper.get_embedding_indices_for_doc_ids(potential_ids)
+            similarity_scores: np.ndarray = self.cosine_similarities.reduce(batch_indices, unannotated_indices,
+                                                                            "mean")
+        return dict(zip(batch, similarity_scores.tolist()))
 
     def compute_ner(self, predictions: Dict[int, PredictionResult], step_size: int) -> List[int]:
         """
@@ -11,7 +11,9 @@ from ale.teacher.exploitation.aggregation_methods import AggregationMethod
 from ale.teacher.exploration.utils.cluster_helper import ClusteredDocuments, ClusterDocument, ClusterHelper
 from ale.teacher.exploration.utils.silhouette_helper import silhouette_analysis
 from ale.trainer.predictor import Predictor
-from ale.trainer.prediction_result import TokenConfidence, PredictionResult
+from ale.trainer.prediction_result import PredictionResult
+from ale.teacher.exploitation.scoring import as_token_predictions, aggregate_token_scores, \
+    token_highest_confidence
 
 
 class NGramVectors:
@@ -193,8 +195,7 @@ class SequentialRepresentationLCTeacher(BaseTeacher):
         return clustered_docs
 
     def make_predictions(self, batch: List[int]) -> Dict[int, float]:
-        idx2text = self.corpus.get_text_by_ids(batch)
-        prediction_results: Dict[int, PredictionResult] = self.predictor.predict(idx2text)
+        prediction_results: Dict[int, PredictionResult] = self.predictor.predict(batch)
         confidence_per_doc: Dict[int, float] = self.compute_lc(prediction_results)
         return confidence_per_doc
 
@@ -210,14 +211,11 @@ class SequentialRepresentationLCTeacher(BaseTeacher):
         """
         LC is calculated on token-level and aggregated on instance-level as configured.
         """
-        scores: Dict[int, float] = {}
-        for idx, prediction in predictions.items():
-            token_confidences: List[TokenConfidence] = prediction.ner_confidences_token
-            highest_confidences: List[float] = [token.get_highest_confidence().confidence
-                                                for token in token_confidences]
-            instance_score = self.aggregate_function(highest_confidences)
-            scores[idx] = instance_score
-        return scores
+        token_predictions = as_token_predictions(predictions)
+        ids, scores = aggregate_token_scores(token_predictions,
+                                             token_highest_confidence(token_predictions.probabilities),
+                                             self.aggregation_method)
+        return dict(zip(ids.tolist(), scores.tolist()))
 
     def compute_ner(self, predictions: Dict[int, PredictionResult], step_size: int) -> Dict[int, float]:
         """
@@ -2,3 +2,4 @@ from ale.trainer.dummy_trainer import DummyTrainer
 from ale.trainer.lightning.pytorch_lightning_trainer import PyTorchLightningTrainer
 from ale.trainer.lightning.nn_models.trf_ffn_model import TransformerFfnLightning
 from ale.trainer.lightning.nn_models.trf_crf_model import TransformerCrfLightning
+from ale.trainer.lightning.nn_models.trf_constrained_crf_model import TransformerConstrainedCrfLightning
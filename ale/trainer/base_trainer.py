@@ -41,3 +41,8 @@ class BaseTrainer(ABC):
     def predict_with_known_gold_labels(self, data_loader: DataLoader) -> Dict[int, PredictionResult]:
         pass
 
+    def close(self):
+        """
+        Releases resources held across AL iterations (e.g. worker processes). Called when the seed run ends.
+        """
+        pass
@@ -1,7 +1,7 @@
 import logging
 from abc import ABC
 from pathlib import Path
-from typing import Dict, List
+from typing import Dict, List, Sequence, Union
 
 from mlflow import ActiveRun
 from mlflow.entities import Run
@@ -53,7 +53,7 @@ class DummyTrainer(PredictionTrainer, ABC):
     def restore_from_artifacts(self, matching_run: Run):
         logger.info(f"Dummy: Restore model")
 
-    def predict(self, docs: Dict[int, str]) -> Dict[int, PredictionResult]:
+    def predict(self, docs: Union[Dict[int, str], Sequence[int]]) -> Dict[int, PredictionResult]:
         raise NotImplemented()
 
     def delete_artifacts(self, run: Run):
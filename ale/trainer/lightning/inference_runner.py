@@ -0,0 +1,105 @@
+import contextlib
+import logging
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+import torch
+from pytorch_lightning import LightningModule
+from torch.utils.data import DataLoader
+
+logger = logging.getLogger(__name__)
+
+
+def resolve_device(accelerator: str) -> torch.device:
+    """
+    Maps the Lightning accelerator name of the trainer config to a torch device.
+    """
+    if accelerator in ["gpu", "cuda"] or (accelerator == "auto" and torch.cuda.is_available()):
+        if torch.cuda.is_available():
+            return torch.device("cuda")
+        logger.warning(f"Accelerator '{accelerator}' requested, but CUDA is not available. Fall back to CPU.")
+    if accelerator == "mps" and torch.backends.mps.is_available():
+        return torch.device("mps")
+    return torch.device("cpu")
+
+
+class InferenceRunner:
+    """
+    Runs ``predict_step`` of a LightningModule directly, without the callbacks, loggers and progress bars of
+    ``Trainer.predict``. The model returns tensor predictions (``tensor_predictions``) while a data loader is
+    iterated, the flag is restored afterwards.
+
+    Batches are evaluated under ``torch.inference_mode()`` (and fp16 autocast on CUDA if the trainer trains with
+    precision 16). ``num_threads`` sets the intra-op threads of torch during prediction. With ``compile_mode`` the
+    encoder of the model (``model.model``) is compiled with ``torch.compile`` once and swapped in for predictions
+    only, thus checkpoints keep their parameter names.
+    """
+
+    def __init__(self, model: LightningModule, device: torch.device, num_threads: Optional[int] = None,
+                 compile_mode: Optional[str] = None, precision: Optional[int] = None):
+        self.model = model
+        self.device = device
+        self.num_threads = num_threads
+        self.compile_mode = compile_mode
+        self.use_autocast = precision == 16 and device.type == "cuda"
+        self.compiled_encoder = None
+
+    def predict(self, data_loader: DataLoader) -> List[Dict[str, Any]]:
+        return list(self.iterate(data_loader))
+
+    def iterate(self, data_loader: DataLoader,
+                step: Optional[Callable[[LightningModule, Dict[str, Any]], Any]] = None) -> Iterator[Any]:
+        """
+        Yields the ``predict_step`` output batch by batch, or the output of ``step(model, batch)`` if given.
+        """
+        self.model.to(self.device)
+        was_training = self.model.training
+        tensor_predictions = getattr(self.model, "tensor_predictions", False)
+        self.model.eval()
+        self.model.tensor_predictions = True
+
+        try:
+            for batch_idx, batch in enumerate(data_loader):
+                # The contexts are entered per batch, so they do not leak into the caller between batches
+                with self.threads(), self.encoder(), torch.inference_mode(), self.autocast():
+                    batch = self.transfer_batch(batch)
+                    output = self.model.predict_step(batch, batch_idx) if step is None else step(self.model, batch)
+                yield output
+        finally:
+            self.model.train(was_training)
+            self.model.tensor_predictions = tensor_predictions
+
+    def transfer_batch(self, batch: Dict[str, Any]) -> Dict[str, Any]:
+        return {key: value.to(self.device, non_blocking=True) if isinstance(value, torch.Tensor) else value
+                for key, value in batch.items()}
+
+    @contextlib.contextmanager
+    def threads(self):
+        if self.num_threads is None:
+            yield
+            return
+        previous = torch.get_num_threads()
+        torch.set_num_threads(self.num_threads)
+        try:
+            yield
+        finally:
+            torch.set_num_threads(previous)
+
+    @contextlib.contextmanager
+    def encoder(self):
+        if self.compile_mode is None:
+            yield
+            return
+        original = self.model.model
+        if self.compiled_encoder is None:
+            logger.info(f"Compile encoder for inference (mode: {self.compile_mode})")
+            self.compiled_encoder = torch.compile(original, mode=self.compile_mode)
+        self.model.model = self.compiled_encoder
+        try:
+            yield
+        finally:
+            self.model.model = original
+
+    def autocast(self):
+        if self.use_autocast:
+            return torch.autocast(device_type="cuda", dtype=torch.float16)
+        return contextlib.nullcontext()
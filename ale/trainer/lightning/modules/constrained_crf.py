@@ -0,0 +1,134 @@
+from typing import Optional, Tuple
+
+import torch
+import torch.nn as nn
+
+from ale.trainer.lightning.modules.crf import CRF
+
+IMPOSSIBLE_SCORE = -10000.0
+
+
+class ConstrainedCRF(CRF):
+    """Conditional random field over BIO tags which only allows legal transitions.
+
+    The tags follow ``derive_labels``: ``O`` has id 0, ``B-X`` and ``I-X`` of the x-th entity type
+    have the ids ``2x + 1`` and ``2x + 2``. A sequence must not start with an ``I-X`` tag and ``I-X``
+    may only follow ``B-X`` or ``I-X``. Instead of a dense ``(num_tags, num_tags)`` matrix the
+    transitions are stored in two blocks:
+
+    - ``open_transitions`` of size ``(num_tags, num_types + 1)``: from any tag to ``O`` or ``B-X``
+    - ``inside_transitions`` of size ``(num_types, 2)``: from ``B-X`` resp. ``I-X`` to ``I-X``
+
+    The recursions only visit these ``num_tags * (num_types + 1) + 2 * num_types`` edges instead of
+    ``num_tags ** 2``. Illegal transitions have a score of ``IMPOSSIBLE_SCORE`` wherever tag pairs
+    are scored explicitly, so decoding never returns them.
+
+    Args:
+        num_types: Number of entity types.
+        batch_first: Whether the first dimension corresponds to the size of a minibatch.
+    """
+
+    def __init__(self, num_types: int, batch_first: bool = False) -> None:
+        if num_types <= 0:
+            raise ValueError(f'invalid number of entity types: {num_types}')
+        self.num_types = num_types
+        super().__init__(2 * num_types + 1, batch_first=batch_first)
+        start_constraints = torch.zeros(self.num_tags)
+        start_constraints[2::2] = IMPOSSIBLE_SCORE
+        self.register_buffer("start_constraints", start_constraints, persistent=False)
+
+    def create_transitions(self) -> None:
+        self.open_transitions = nn.Parameter(torch.empty(self.num_tags, self.num_types + 1))
+        self.inside_transitions = nn.Parameter(torch.empty(self.num_types, 2))
+
+    def reset_parameters(self) -> None:
+        nn.init.uniform_(self.start_transitions, -0.1, 0.1)
+        nn.init.uniform_(self.end_transitions, -0.1, 0.1)
+        nn.init.uniform_(self.open_transitions, -0.1, 0.1)
+        nn.init.uniform_(self.inside_transitions, -0.1, 0.1)
+
+    def __repr__(self) -> str:
+        return f'{self.__class__.__name__}(num_types={self.num_types})'
+
+    def forward(
+            self,
+            emissions: torch.Tensor,
+            tags: torch.LongTensor,
+            mask: Optional[torch.ByteTensor] = None,
+            reduction: str = 'sum',
+    ) -> torch.Tensor:
+        """Compute the conditional log likelihood, see `~CRF.forward`.
+
+        Gold sequences with illegal transitions are repaired first (see `~ConstrainedCRF.repair_tags`).
+        """
+        seq_dim = 1 if self.batch_first else 0
+        return super().forward(emissions, self.repair_tags(tags, seq_dim), mask=mask, reduction=reduction)
+
+    @staticmethod
+    def repair_tags(tags: torch.LongTensor, seq_dim: int = 1) -> torch.LongTensor:
+        """Replace every ``I-X`` which does not follow ``B-X`` or ``I-X`` by ``B-X``."""
+        previous_tags = tags.roll(1, dims=seq_dim)
+        previous_tags.select(seq_dim, 0).fill_(0)
+        is_inside = (tags > 0) & (tags % 2 == 0)
+        is_continued = (previous_tags == tags) | (previous_tags == tags - 1)
+        return torch.where(is_inside & ~is_continued, tags - 1, tags)
+
+    def full_transitions(self) -> torch.Tensor:
+        """Dense transition score tensor of size ``(num_tags, num_tags)``, illegal transitions score
+        ``IMPOSSIBLE_SCORE``."""
+        inside_columns = self.open_transitions.new_full((self.num_tags, self.num_types), IMPOSSIBLE_SCORE)
+        types = torch.arange(self.num_types, device=inside_columns.device)
+        inside_columns = inside_columns.index_put((2 * types + 1, types), self.inside_transitions[:, 0])
+        inside_columns = inside_columns.index_put((2 * types + 2, types), self.inside_transitions[:, 1])
+        return self._interleave(self.open_transitions, inside_columns)
+
+    def _interleave(self, open_scores: torch.Tensor, inside_scores: torch.Tensor) -> torch.Tensor:
+        """Combine scores of the ``O``/``B-X`` tags ``(..., num_types + 1)`` and the ``I-X`` tags
+        ``(..., num_types)`` to ``(..., num_tags)`` in tag order."""
+        pairs = torch.stack([open_scores[..., 1:], inside_scores], dim=-1).flatten(-2)
+        return torch.cat([open_scores[..., :1], pairs], dim=-1)
+
+    def _open_tags(self, score: torch.Tensor) -> torch.Tensor:
+        return torch.cat([score[..., :1], score[..., 1::2]], dim=-1)
+
+    def start_scores(self) -> torch.Tensor:
+        return self.start_transitions + self.start_constraints
+
+    def transition_scores(self, previous_tags: torch.LongTensor, tags: torch.LongTensor) -> torch.Tensor:
+        # Gathered from the blocks: O (0) and B-X (2x + 1) are column (tag + 1) // 2 of the open transitions,
+        # I-X (2x + 2) is column 0 (from B-X) or 1 (from I-X) of row x of the inside transitions
+        open_scores = self.open_transitions[previous_tags, torch.div(tags + 1, 2, rounding_mode='floor')]
+        is_inside = (tags > 0) & (tags % 2 == 0)
+        sources = previous_tags - tags + 1
+        types = torch.div(tags, 2, rounding_mode='floor').sub(1).clamp(min=0)
+        inside_scores = self.inside_transitions[types, sources.clamp(0, 1)]
+        inside_scores = inside_scores.masked_fill((sources < 0) | (sources > 1), IMPOSSIBLE_SCORE)
+        return torch.where(is_inside, inside_scores, open_scores)
+
+    def transition_logsumexp(self, score: torch.Tensor) -> torch.Tensor:
+        # To O and B-X from every tag
+        # shape: (batch_size, num_types + 1)
+        open_scores = torch.logsumexp(score.unsqueeze(2) + self.open_transitions, dim=1)
+        # To I-X from B-X and I-X
+        # shape: (batch_size, num_types)
+        inside_sources = score[:, 1:].reshape(-1, self.num_types, 2)
+        inside_scores = torch.logsumexp(inside_sources + self.inside_transitions, dim=2)
+        return self._interleave(open_scores, inside_scores)
+
+    def transition_max(self, score: torch.Tensor) -> Tuple[torch.Tensor, torch.LongTensor]:
+        open_scores, open_indices = (score.unsqueeze(2) + self.open_transitions).max(dim=1)
+        inside_sources = score[:, 1:].reshape(-1, self.num_types, 2)
+        inside_scores, inside_indices = (inside_sources + self.inside_transitions).max(dim=2)
+        # Map 0 (from B-X) and 1 (from I-X) to the tag ids
+        inside_indices = inside_indices + 2 * torch.arange(self.num_types, device=score.device) + 1
+        return self._interleave(open_scores, inside_scores), self._interleave(open_indices, inside_indices)
+
+    def backward_logsumexp(self, score: torch.Tensor) -> torch.Tensor:
+        # From every tag to O and B-X
+        # shape: (batch_size, num_tags)
+        open_scores = torch.logsumexp(self.open_transitions + self._open_tags(score).unsqueeze(1), dim=2)
+        # From B-X and I-X to I-X, O has no such transition
+        # shape: (batch_size, num_types, 2)
+        inside_scores = self.inside_transitions + score[:, 2::2].unsqueeze(2)
+        inside_scores = torch.cat([torch.full_like(score[:, :1], IMPOSSIBLE_SCORE), inside_scores.flatten(1)], dim=1)
+        return torch.logaddexp(open_scores, inside_scores)
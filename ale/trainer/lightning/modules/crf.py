@@ -1,13 +1,29 @@
-from typing import List, Optional, Tuple
+from typing import List, NamedTuple, Optional, Tuple
 
 import torch
 import torch.nn as nn
-from torch.nn.functional import softmax
 from pytorch_lightning import LightningModule
 
 DECODE_RETURN_TYPE = List[List[int]]
 
 
+class CRFInference(NamedTuple):
+    """Result of `~CRF.infer`, tensors in the layout of the emissions (``batch_first``)."""
+    # shape: (batch_size,)
+    log_partition: torch.Tensor
+    # Token marginals, zero for masked timesteps
+    # shape: (seq_length, batch_size, num_tags) or (batch_size, seq_length, num_tags)
+    marginals: torch.Tensor
+    # Viterbi path, pad tag for masked timesteps
+    # shape: (seq_length, batch_size) or (batch_size, seq_length)
+    tags: torch.LongTensor
+    # Unnormalized score of the Viterbi path
+    # shape: (batch_size,)
+    best_scores: torch.Tensor
+    # shape: (batch_size,)
+    lengths: torch.LongTensor
+
+
 class CRF(LightningModule):
     """Conditional random field. Based on AllenNLP and pytorch-crf
 
@@ -45,10 +61,14 @@ class CRF(LightningModule):
         self.batch_first = batch_first
         self.start_transitions = nn.Parameter(torch.empty(num_tags))
         self.end_transitions = nn.Parameter(torch.empty(num_tags))
-        self.transitions = nn.Parameter(torch.empty(num_tags, num_tags))
+        self.create_transitions()
 
         self.reset_parameters()
 
+    def create_transitions(self) -> None:
+        """Create the parameters of the transitions between tags."""
+        self.transitions = nn.Parameter(torch.empty(self.num_tags, self.num_tags))
+
     def reset_parameters(self) -> None:
         """Initialize the transition parameters.
 
@@ -62,6 +82,37 @@ class CRF(LightningModule):
     def __repr__(self) -> str:
         return f'{self.__class__.__name__}(num_tags={self.num_tags})'
 
+    # The recursions access the transitions only through the following methods, thus subclasses
+    # can restrict or restructure the transitions (see ConstrainedCRF).
+
+    def start_scores(self) -> torch.Tensor:
+        """Score of starting a sequence with each tag, shape: ``(num_tags,)``."""
+        return self.start_transitions
+
+    def transition_scores(self, previous_tags: torch.LongTensor, tags: torch.LongTensor) -> torch.Tensor:
+        """Transition scores of the given tag pairs."""
+        return self.transitions[previous_tags, tags]
+
+    def transition_logsumexp(self, score: torch.Tensor) -> torch.Tensor:
+        """Log-sum-exp over the previous tag i of ``score[:, i] + transitions[i, j]``.
+
+        Args:
+            score: Score per previous tag of size ``(batch_size, num_tags)``.
+
+        Returns:
+            Score per next tag j of size ``(batch_size, num_tags)``.
+        """
+        # shape: (batch_size, num_tags, num_tags)
+        return torch.logsumexp(score.unsqueeze(2) + self.transitions, dim=1)
+
+    def transition_max(self, score: torch.Tensor) -> Tuple[torch.Tensor, torch.LongTensor]:
+        """Like `~CRF.transition_logsumexp` with max, also returns the maximizing previous tags."""
+        return (score.unsqueeze(2) + self.transitions).max(dim=1)
+
+    def backward_logsumexp(self, score: torch.Tensor) -> torch.Tensor:
+        """Log-sum-exp over the next tag j of ``transitions[i, j] + score[:, j]``, both ``(batch_size, num_tags)``."""
+        return torch.logsumexp(self.transitions + score.unsqueeze(1), dim=2)
+
     def forward(
             self,
             emissions: torch.Tensor,
@@ -130,6 +181,26 @@ class CRF(LightningModule):
         Returns:
             List of list containing the best tag sequence for each batch.
         """
+        tags, lengths = self.decode_padded(emissions, mask)
+        if not self.batch_first:
+            tags = tags.transpose(0, 1)
+        return [sequence[:length].tolist() for sequence, length in zip(tags.cpu(), lengths.cpu().tolist())]
+
+    def decode_padded(self, emissions: torch.Tensor, mask: Optional[torch.ByteTensor] = None,
+                      pad_tag: int = 0) -> Tuple[torch.LongTensor, torch.LongTensor]:
+        """Like `~CRF.decode`, but keeps the best tag sequences as padded tensor on the device.
+
+        Args:
+            emissions (`~torch.Tensor`): Emission score tensor of size
+                ``(seq_length, batch_size, num_tags)`` if ``batch_first`` is ``False``,
+                ``(batch_size, seq_length, num_tags)`` otherwise.
+            mask (`~torch.ByteTensor`): Mask tensor of size ``(seq_length, batch_size)``
+                if ``batch_first`` is ``False``, ``(batch_size, seq_length)`` otherwise.
+            pad_tag: Tag for the masked timesteps.
+
+        Returns:
+            Tuple of the tag tensor, with the size of ``mask``, and the sequence lengths of size ``(batch_size,)``.
+        """
         self._validate(emissions, mask=mask)
         if mask is None:
             mask = emissions.new_ones(emissions.shape[:2], dtype=torch.uint8)
@@ -138,7 +209,10 @@ class CRF(LightningModule):
             emissions = emissions.transpose(0, 1)
             mask = mask.transpose(0, 1)
 
-        return self._viterbi_decode(emissions, mask)
+        tags, lengths = self._viterbi_decode(emissions, mask, pad_tag)
+        if self.batch_first:
+            tags = tags.transpose(0, 1)
+        return tags, lengths
 
     def _validate(
             self,
@@ -185,14 +259,14 @@ class CRF(LightningModule):
 
         # Start transition score and first emission
         # shape: (batch_size,)
-        score = self.start_transitions[tags[0]]
+        score = self.start_scores()[tags[0]]
         score += emissions[0, torch.arange(batch_size), tags[0]]
 
         for i in range(1, seq_length):
             # Transition score to next tag, only added if next timestep is valid (mask == 1)
             # shape: (batch_size,)
 
-            score += self.transitions[tags[i - 1], tags[i]] * mask[i]
+            score += self.transition_scores(tags[i - 1], tags[i]) * mask[i]
 
             # Emission score for next tag, only added if next timestep is valid (mask == 1)
             # shape: (batch_size,)
@@ -223,29 +297,15 @@ class CRF(LightningModule):
         # (batch_size, num_tags) where for each batch, the j-th column stores
         # the score that the first timestep has tag j
         # shape: (batch_size, num_tags)
-        score = self.start_transitions + emissions[0]
+        score = self.start_scores() + emissions[0]
 
         for i in range(1, seq_length):
-            # Broadcast score for every possible next tag
-            # shape: (batch_size, num_tags, 1)
-            broadcast_score = score.unsqueeze(2)
-
-            # Broadcast emission score for every possible current tag
-            # shape: (batch_size, 1, num_tags)
-            broadcast_emissions = emissions[i].unsqueeze(1)
-
-            # Compute the score tensor of size (batch_size, num_tags, num_tags) where
-            # for each sample, entry at row i and column j stores the sum of scores of all
-            # possible tag sequences so far that end with transitioning from tag i to tag j
-            # and emitting
-            # shape: (batch_size, num_tags, num_tags)
-            next_score = broadcast_score + self.transitions + broadcast_emissions
-
             # Sum over all possible current tags, but we're in score space, so a sum
-            # becomes a log-sum-exp: for each sample, entry i stores the sum of scores of
-            # all possible tag sequences so far, that end in tag i
+            # becomes a log-sum-exp: for each sample, entry j stores the sum of scores of
+            # all possible tag sequences so far, that end with transitioning to tag j
+            # and emitting
             # shape: (batch_size, num_tags)
-            next_score = torch.logsumexp(next_score, dim=1)
+            next_score = self.transition_logsumexp(score) + emissions[i]
 
             # Set score to the next score if this timestep is valid (mask == 1)
             # shape: (batch_size, num_tags)
@@ -259,8 +319,8 @@ class CRF(LightningModule):
         # shape: (batch_size,)
         return torch.logsumexp(score, dim=1)
 
-    def _viterbi_decode(self, emissions: torch.FloatTensor,
-                        mask: torch.ByteTensor) -> DECODE_RETURN_TYPE:
+    def _viterbi_decode(self, emissions: torch.FloatTensor, mask: torch.ByteTensor,
+                        pad_tag: int = 0) -> Tuple[torch.LongTensor, torch.LongTensor]:
         # emissions: (seq_length, batch_size, num_tags)
         # mask: (seq_length, batch_size)
         assert emissions.dim() == 3 and mask.dim() == 2
@@ -272,7 +332,7 @@ class CRF(LightningModule):
 
         # Start transition and first emission
         # shape: (batch_size, num_tags)
-        score = self.start_transitions + emissions[0]
+        score = self.start_scores() + emissions[0]
         history = []
 
         # score is a tensor of size (batch_size, num_tags) where for every batch,
@@ -284,23 +344,11 @@ class CRF(LightningModule):
         # Viterbi algorithm recursive case: we compute the score of the best tag sequence
         # for every possible next tag
         for i in range(1, seq_length):
-            # Broadcast viterbi score for every possible next tag
-            # shape: (batch_size, num_tags, 1)
-            broadcast_score = score.unsqueeze(2)
-
-            # Broadcast emission score for every possible current tag
-            # shape: (batch_size, 1, num_tags)
-            broadcast_emission = emissions[i].unsqueeze(1)
-
-            # Compute the score tensor of size (batch_size, num_tags, num_tags) where
-            # for each sample, entry at row i and column j stores the score of the best
-            # tag sequence so far that ends with transitioning from tag i to tag j and emitting
-            # shape: (batch_size, num_tags, num_tags)
-            next_score = broadcast_score + self.transitions + broadcast_emission
-            # Find the maximum score over all possible current tag
+            # Find the maximum score over all possible current tags of the best tag sequence
+            # so far that ends with transitioning to tag j and emitting
             # shape: (batch_size, num_tags)
-            next_score, indices = next_score.max(dim=1)
-            probs = softmax(next_score, dim=1)
+            next_score, indices = self.transition_max(score)
+            next_score = next_score + emissions[i]
 
             # Set score to the next score if this timestep is valid (mask == 1)
             # and save the index that produces the next score
@@ -312,63 +360,157 @@ class CRF(LightningModule):
         # shape: (batch_size, num_tags)
         score += self.end_transitions
 
-        # Now, compute the best path for each sample
+        # Now, compute the best path for all samples at once
 
         # shape: (batch_size,)
-        seq_ends = mask.long().sum(dim=0) - 1
-        best_tags_list = []
+        lengths = mask.long().sum(dim=0)
+        seq_ends = lengths - 1
+        # Find the tag which maximizes the score at the last timestep of each sample
+        # shape: (batch_size,)
+        _, best_last_tags = score.max(dim=1)
+        # shape: (seq_length, batch_size)
+        best_tags = torch.full((seq_length, batch_size), pad_tag, dtype=torch.long, device=emissions.device)
+        pad = torch.full_like(best_last_tags, pad_tag)
+
+        # We trace back all samples together, starting at the last timestep. A sample joins the
+        # backtrace at its last valid timestep; before, its current tag is ignored.
+        current_tags = best_last_tags
+        for i in range(seq_length - 1, -1, -1):
+            current_tags = torch.where(seq_ends == i, best_last_tags, current_tags)
+            valid = seq_ends >= i
+            best_tags[i] = torch.where(valid, current_tags, pad)
+            if i > 0:
+                # Tag at timestep i - 1 which the best sequence ending in the current tag comes from
+                # shape: (batch_size,)
+                previous_tags = history[i - 1].gather(1, current_tags.unsqueeze(1)).squeeze(1)
+                current_tags = torch.where(valid, previous_tags, current_tags)
+
+        return best_tags, lengths
+
+    def infer(self, emissions: torch.Tensor, mask: Optional[torch.ByteTensor] = None,
+              pad_tag: int = 0) -> CRFInference:
+        """Compute the log partition function, the token marginals and the Viterbi path at once.
+
+        The forward recursion (log-sum-exp and max) and the backward recursion (together with
+        the backtrace) each run in a single loop over the timesteps.
 
-        for idx in range(batch_size):
-            # Find the tag which maximizes the score at the last timestep; this is our best tag
-            # for the last timestep
+        Args:
+            emissions (`~torch.Tensor`): Emission score tensor of size
+                ``(seq_length, batch_size, num_tags)`` if ``batch_first`` is ``False``,
+                ``(batch_size, seq_length, num_tags)`` otherwise.
+            mask (`~torch.ByteTensor`): Mask tensor of size ``(seq_length, batch_size)``
+                if ``batch_first`` is ``False``, ``(batch_size, seq_length)`` otherwise.
+            pad_tag: Tag for the masked timesteps of the Viterbi path.
 
-            _, best_last_tag = score[idx].max(dim=0) # TODO Here we can return the top k and use margin?
-            best_tags = [best_last_tag.item()]
+        Returns:
+            `CRFInference` with tensors in the layout of the emissions.
+        """
+        self._validate(emissions, mask=mask)
+        if mask is None:
+            mask = emissions.new_ones(emissions.shape[:2], dtype=torch.uint8)
+
+        if self.batch_first:
+            emissions = emissions.transpose(0, 1)
+            mask = mask.transpose(0, 1)
+
+        seq_length, batch_size = mask.shape
+        mask = mask.bool()
+        # shape: (batch_size,)
+        lengths = mask.long().sum(dim=0)
+        seq_ends = lengths - 1
 
-            # We trace back where the best last tag comes from, append that to our best tag
-            # sequence, and trace it back again, and so on
-            for hist_tag in reversed(history[:seq_ends[idx]]):
-                best_last_tag = hist_tag[idx][best_tags[-1]]
-                best_tags.append(best_last_tag.item())
+        # Forward recursion: alpha (log-sum-exp) and viterbi score (max) of every timestep
+        # shape: (batch_size, num_tags)
+        alpha = self.start_scores() + emissions[0]
+        viterbi_score = alpha
+        alphas = [alpha]
+        history = []
+        for i in range(1, seq_length):
+            # shape: (batch_size, num_tags)
+            next_alpha = self.transition_logsumexp(alpha) + emissions[i]
+            next_viterbi_score, indices = self.transition_max(viterbi_score)
+            next_viterbi_score = next_viterbi_score + emissions[i]
+
+            # Masked timesteps carry the values of the last valid timestep
+            valid = mask[i].unsqueeze(1)
+            alpha = torch.where(valid, next_alpha, alpha)
+            viterbi_score = torch.where(valid, next_viterbi_score, viterbi_score)
+            alphas.append(alpha)
+            history.append(indices)
 
-            # Reverse the order because we start from the last timestep
-            best_tags.reverse()
-            best_tags_list.append(best_tags)
+        # shape: (batch_size,)
+        log_partition = torch.logsumexp(alpha + self.end_transitions, dim=1)
+        best_scores, best_last_tags = (viterbi_score + self.end_transitions).max(dim=1)
+
+        # Backward recursion: beta of every timestep and the backtrace of the best path.
+        # beta is the end transition at the last valid timestep of each sample.
+        end_beta = self.end_transitions.expand(batch_size, self.num_tags)
+        beta = end_beta
+        # shape: (seq_length, batch_size, num_tags)
+        marginals = torch.zeros_like(emissions)
+        # shape: (seq_length, batch_size)
+        best_tags = torch.full((seq_length, batch_size), pad_tag, dtype=torch.long, device=emissions.device)
+        pad = torch.full_like(best_last_tags, pad_tag)
+        current_tags = best_last_tags
+        for i in range(seq_length - 1, -1, -1):
+            if i < seq_length - 1:
+                next_beta = self.backward_logsumexp(emissions[i + 1] + beta)
+                beta = torch.where(mask[i + 1].unsqueeze(1), next_beta, end_beta)
+
+            valid = seq_ends >= i
+            marginals[i] = torch.where(valid.unsqueeze(1),
+                                       torch.exp(alphas[i] + beta - log_partition.unsqueeze(1)),
+                                       marginals[i])
+
+            current_tags = torch.where(seq_ends == i, best_last_tags, current_tags)
+            best_tags[i] = torch.where(valid, current_tags, pad)
+            if i > 0:
+                previous_tags = history[i - 1].gather(1, current_tags.unsqueeze(1)).squeeze(1)
+                current_tags = torch.where(valid, previous_tags, current_tags)
 
-        return best_tags_list
+        if self.batch_first:
+            marginals = marginals.transpose(0, 1)
+            best_tags = best_tags.transpose(0, 1)
+        return CRFInference(log_partition, marginals, best_tags, best_scores, lengths)
 
-    def forward_alg(self, emissions, mask, start_tag):
-        batch_size, seq_length, num_tags = emissions.shape
-        log_alpha = emissions.new_full((batch_size, seq_length, num_tags), fill_value=-10000.0)
-        # log_alpha[:, 0, start_tag] = 0  # Initialize the start tag at the first position
+    def sequence_log_probabilities(self, emissions: torch.Tensor,
+                                   mask: Optional[torch.ByteTensor] = None) -> torch.Tensor:
+        """Compute the log probability ``viterbi_score - log Z`` of the best tag sequence.
 
-        for i in range(1, seq_length):
-            emit_score = emissions[:, i, :]
-            trans_score = self.start_transitions + self.transitions + self.end_transitions
-            temp_alpha = torch.logsumexp(
-                log_alpha[:, i - 1, :].unsqueeze(2) + trans_score + emit_score.unsqueeze(1), dim=1)
-            log_alpha[:, i, :] = torch.where(mask.bool()[:, i].unsqueeze(-1), temp_alpha, log_alpha[:, i - 1, :])
-        return log_alpha
-
-    def backward_alg(self, emissions, mask, end_tag):
-        batch_size, seq_length, num_tags = emissions.shape
-        log_beta = emissions.new_full((batch_size, seq_length, num_tags), fill_value=-10000.0)
-        # log_beta[:, -1, :] = 0  # Initialize the end positions
-
-        for i in reversed(range(seq_length - 1)):
-            emit_score = emissions[:, i + 1, :]
-            trans_score = self.start_transitions + self.transitions + self.end_transitions
-            temp_beta = torch.logsumexp(
-                log_beta[:, i + 1, :].unsqueeze(1) + trans_score + emit_score.unsqueeze(2), dim=2)
-
-            log_beta[:, i, :] = torch.where(mask.bool()[:, i + 1].unsqueeze(-1), temp_beta, log_beta[:, i + 1, :])
-        return log_beta
-
-    def compute_marginals(self, emissions, mask, start_tag=0, end_tag=-1):
-        alpha = self.forward_alg(emissions, mask, start_tag)
-        beta = self.backward_alg(emissions, mask, end_tag)
-        marginal = alpha + beta
-        marginal -= torch.logsumexp(marginal, dim=2, keepdim=True)  # Normalize to get probabilities
-        return torch.exp(marginal)  # Convert from log probabilities to probabilities
+        Needs a single forward recursion (log-sum-exp and max), without backtrace and marginals.
 
+        Args:
+            emissions (`~torch.Tensor`): Emission score tensor of size
+                ``(seq_length, batch_size, num_tags)`` if ``batch_first`` is ``False``,
+                ``(batch_size, seq_length, num_tags)`` otherwise.
+            mask (`~torch.ByteTensor`): Mask tensor of size ``(seq_length, batch_size)``
+                if ``batch_first`` is ``False``, ``(batch_size, seq_length)`` otherwise.
+
+        Returns:
+            `~torch.Tensor`: The log probabilities of size ``(batch_size,)``.
+        """
+        self._validate(emissions, mask=mask)
+        if mask is None:
+            mask = emissions.new_ones(emissions.shape[:2], dtype=torch.uint8)
+
+        if self.batch_first:
+            emissions = emissions.transpose(0, 1)
+            mask = mask.transpose(0, 1)
+
+        mask = mask.bool()
+        # shape: (batch_size, num_tags)
+        alpha = self.start_scores() + emissions[0]
+        viterbi_score = alpha
+        for i in range(1, emissions.size(0)):
+            valid = mask[i].unsqueeze(1)
+            alpha = torch.where(valid, self.transition_logsumexp(alpha) + emissions[i], alpha)
+            viterbi_score = torch.where(valid, self.transition_max(viterbi_score)[0] + emissions[i], viterbi_score)
+
+        # shape: (batch_size,)
+        log_partition = torch.logsumexp(alpha + self.end_transitions, dim=1)
+        best_scores = (viterbi_score + self.end_transitions).max(dim=1)[0]
+        return best_scores - log_partition
 
+    def compute_marginals(self, emissions: torch.Tensor, mask: Optional[torch.ByteTensor] = None) -> torch.Tensor:
+        """Token marginals of size ``(batch_size, seq_length, num_tags)`` if ``batch_first``, see `~CRF.infer`."""
+        return self.infer(emissions, mask).marginals
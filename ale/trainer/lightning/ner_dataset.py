@@ -1,22 +1,132 @@
 from pathlib import Path
-from typing import List, Tuple, Callable
+from typing import List, Dict, Any, Optional, Sequence, Tuple
 
-import srsly
+import numpy as np
 import torch
 from pytorch_lightning import LightningDataModule
-from torch.utils.data import DataLoader
-from transformers import AutoTokenizer, BatchEncoding
+from torch.utils.data import DataLoader, Dataset, Subset
+from transformers import AutoTokenizer, BatchEncoding, PreTrainedTokenizerBase
 
+from ale.trainer.lightning.ner_preprocessing import NerPreprocessor, preprocess_file
+from ale.trainer.lightning.token_budget_sampler import TokenBudgetBatchSampler, fixed_size_batches, padded_size
+from ale.trainer.lightning.tokenization_cache import TokenizationCache, TokenizedFile
 from ale.trainer.lightning.utils import derive_labels
 
 
+def collate_entries(batch: List[Dict[str, Any]], with_labels: bool, pad_label_value: int = 0) -> Dict[str, Any]:
+    """
+    Pads the entries of a batch into fixed size NumPy buffers which are wrapped as tensors without copying. The
+    entries are not modified, thus they can be collated again in later epochs. Entries without labels get
+    ``pad_label_value`` labels.
+    """
+    lengths = [len(entry['tokens']['input_ids']) for entry in batch]
+    shape = (len(batch), max(lengths))
+    input_ids = np.zeros(shape, dtype=np.int64)
+    attention_mask = np.zeros(shape, dtype=np.int64)
+    labels = np.full(shape, pad_label_value, dtype=np.int64) if with_labels else None
+
+    for i, (entry, length) in enumerate(zip(batch, lengths)):
+        input_ids[i, :length] = entry['tokens']['input_ids']
+        attention_mask[i, :length] = entry['tokens']['attention_mask']
+        if with_labels and 'labels' in entry:
+            labels[i, :len(entry['labels'])] = entry['labels']
+
+    batch_data = {
+        'input_ids': torch.from_numpy(input_ids),
+        'attention_mask': torch.from_numpy(attention_mask),
+        'text': [entry["text"] for entry in batch],
+        'token_text': [entry["token_text"] for entry in batch],
+        'offset_mapping': [entry['tokens']['offset_mapping'] for entry in batch]
+    }
+    if with_labels:
+        batch_data['labels'] = torch.from_numpy(labels)
+
+    return batch_data
+
+
+class EncodingStore:
+    """
+    Tokenizations of the corpus documents keyed by document id, shared by the training and the prediction data module.
+    Entries are stored in prediction layout, i.e. without special tokens, so pool predictions do not have to
+    tokenize documents again which were already tokenized for training.
+
+    Documents of a cached ``TokenizedFile`` are not copied into the store, they are read from its memory-mapped
+    arrays on request.
+    """
+
+    def __init__(self):
+        self.encodings: Dict[int, Dict[str, Any]] = {}
+        self.files: List[TokenizedFile] = []
+        self.file_rows: Dict[int, Tuple[int, int]] = {}
+
+    def __contains__(self, idx: int) -> bool:
+        return idx in self.encodings or idx in self.file_rows
+
+    def __len__(self) -> int:
+        return len(self.encodings.keys() | self.file_rows.keys())
+
+    @staticmethod
+    def create_encoding(tokenized: BatchEncoding, token_text: List[str]) -> Dict[str, Any]:
+        """
+        Copy of the encoding without special tokens (offset (0, 0)) and padding.
+        """
+        offsets = tokenized["offset_mapping"]
+        keep = [i for i, (start, end) in enumerate(offsets) if not start == end == 0]
+        return {"input_ids": [tokenized["input_ids"][i] for i in keep],
+                "offset_mapping": [tuple(offsets[i]) for i in keep],
+                "token_text": [token_text[i] for i in keep]}
+
+    def add(self, idx: int, tokenized: BatchEncoding, token_text: List[str]):
+        """
+        Stores a copy of the given encoding.
+        """
+        self.encodings[idx] = self.create_encoding(tokenized, token_text)
+
+    def add_file(self, tokenized_file: TokenizedFile):
+        """
+        Serves the documents of the file with an id from the file.
+        """
+        if any(known_file.directory == tokenized_file.directory for known_file in self.files):
+            return
+        file_index = len(self.files)
+        self.files.append(tokenized_file)
+        for idx, row in tokenized_file.get_id_index().items():
+            self.encodings.pop(idx, None)
+            self.file_rows[idx] = (file_index, row)
+
+    def get(self, idx: int) -> Dict[str, Any]:
+        """
+        Returns a fresh prediction entry for the document.
+        """
+        if idx in self.encodings:
+            encoding = self.encodings[idx]
+        else:
+            file_index, row = self.file_rows[idx]
+            entry = self.files[file_index][row]
+            encoding = self.create_encoding(entry["tokens"], entry["token_text"])
+        input_ids = list(encoding["input_ids"])
+        return {"tokens": {"input_ids": input_ids,
+                           "attention_mask": [1] * len(input_ids),
+                           "offset_mapping": list(encoding["offset_mapping"])},
+                "token_text": list(encoding["token_text"])}
+
+
 class AleNerDataModule(LightningDataModule):
     def __init__(self, data_dir: str = None, model_name: str = None, labels: List[str] = None, batch_size: int = 32,
-                 num_workers: int = 1, train_filter_func: Callable = lambda x: x,
+                 num_workers: int = 1,
                  text_column: str = "text",
-                 label_column: str = "labels"
-
+                 label_column: str = "labels",
+                 encoding_store: Optional[EncodingStore] = None,
+                 tokenization_cache_dir: Optional[str] = None,
+                 preprocessing_processes: Optional[int] = None
     ):
+        """
+        With a ``tokenization_cache_dir`` the tokenized data files are stored in a ``TokenizationCache`` and loaded
+        from there by later runs with the same data, tokenizer and labels. Large data files are preprocessed by
+        ``preprocessing_processes`` processes (see ``preprocess_file``).
+
+        Training uses all training documents until ``set_train_ids`` restricts it to a subset.
+        """
         super().__init__()
         self.data_dir: Path = Path(data_dir)
         self.batch_size = batch_size
@@ -26,90 +136,89 @@ class AleNerDataModule(LightningDataModule):
         self.train = None
         self.dev = None
         self.test = None
-        self.train_filter_func = train_filter_func
+        # Row of each training document by id and the rows of the training subset (None: all documents)
+        self.train_index: Dict[int, int] = {}
+        self.train_ids: Optional[List[int]] = None
+        self.train_rows: List[int] = []
+        self.num_looked_up_train_ids = 0
         self.text_column = text_column
         self.label_column = label_column
+        self.encoding_store = encoding_store
+        self.preprocessor = NerPreprocessor(self.tokenizer, self.label2id, text_column, label_column)
+        self.preprocessing_processes = preprocessing_processes
+        self.pin_memory = torch.cuda.is_available()
+        self.tokenization_cache = TokenizationCache(tokenization_cache_dir, self.tokenizer, labels, text_column,
+                                                    label_column) if tokenization_cache_dir is not None else None
 
     def prepare_data(self):
-        self.train = self.load_dataset(self.data_dir / "train.jsonl")
+        self.train = self.load_dataset(self.data_dir / "train.jsonl", encoding_store=self.encoding_store)
+        self.train_index = self.train.get_id_index() if isinstance(self.train, TokenizedFile) \
+            else {entry["id"]: row for row, entry in enumerate(self.train) if "id" in entry}
+        self.train_rows = []
+        self.num_looked_up_train_ids = 0
         self.dev = self.load_dataset(self.data_dir / "dev.jsonl")
         self.test = self.load_dataset(self.data_dir / "test.jsonl")
 
-    def load_dataset(self, path: Path):
-        result = []
-        for entry in srsly.read_jsonl(path):
-            text = entry[self.text_column]
-            labels = entry[self.label_column]
-
-            tokenized = self.tokenizer(text, add_special_tokens=True, return_offsets_mapping=True, truncation=True)
-            token_labels, tokens_text = self.create_token_labels(labels, tokenized)
-            token_labels = [self.label2id[label] for label in token_labels]
-
-            if "id" in entry:
-                result.append({"tokens": tokenized, "labels": token_labels, "text": text,
-                               "token_text": tokens_text, "id": entry["id"]})
-            else:
-                result.append({"tokens": tokenized, "labels": token_labels, "text": text,
-                               "token_text": tokens_text})
+    def load_dataset(self, path: Path, encoding_store: Optional[EncodingStore] = None) \
+            -> Sequence[Dict[str, Any]]:
+        """
+        Cached data files are served from the memory-mapped ``TokenizedFile``, entries are only built on access.
+        """
+        if self.tokenization_cache is not None:
+            result = self.tokenization_cache.load(path, lambda: self.tokenize_file(path),
+                                                  self.preprocessor.get_token_text)
+            if encoding_store is not None:
+                encoding_store.add_file(result)
+            return result
+
+        result = self.tokenize_file(path)
+        if encoding_store is not None:
+            for entry in result:
+                if "id" in entry:
+                    encoding_store.add(entry["id"], entry["tokens"], entry["token_text"])
 
         return result
 
-    def create_token_labels(self, labels, tokenized):
-        tokens_text = self.tokenizer.convert_ids_to_tokens(tokenized['input_ids'])
-        cleaned_tokens = [token.lstrip("Ġ") for token in tokens_text]
-        token_labels = self.char_to_token_labels(tokenized, labels)
-        return token_labels, cleaned_tokens
+    def tokenize_file(self, path: Path) -> List[Dict[str, Any]]:
+        return preprocess_file(path, self.preprocessor, self.preprocessing_processes)
 
     def collate(self, batch, pad_label_value: int = 0): # TODO changed padding due to crf error
-        # Get individual elements from the batch
-        max_length = max(len(example['tokens']['input_ids']) for example in batch)  # Determine the max length
-
-        # Initialize lists to hold the batch data
-        batch_input_ids = []
-        batch_attention_mask = []
-        batch_labels = []
-        batch_offset_mapping = []
-
-        for data in batch:
-            input_ids = data['tokens']['input_ids']
-            attention_mask = data['tokens']['attention_mask']
-            labels = data['labels']
-            offsets = data['tokens']['offset_mapping']
-
-            padding_length = max_length - len(input_ids)
-
-            # Pad the 'input_ids', 'attention_mask', and 'labels'
-            input_ids.extend([0] * padding_length)
-            attention_mask.extend([0] * padding_length)
-            labels.extend([pad_label_value] * padding_length)
-
-            # Append the padded data to the batch lists
-            batch_input_ids.append(input_ids)
-            batch_attention_mask.append(attention_mask)
-            batch_labels.append(labels)
-            batch_offset_mapping.append(offsets)
-
-        # Convert lists to PyTorch tensors
-        batch_data = {
-            'input_ids': torch.tensor(batch_input_ids, dtype=torch.long),
-            'attention_mask': torch.tensor(batch_attention_mask, dtype=torch.long),
-            'labels': torch.tensor(batch_labels, dtype=torch.long),
-            'text': [entry["text"] for entry in batch],
-            'token_text': [entry["token_text"] for entry in batch],
-            'offset_mapping': batch_offset_mapping
-        }
-
-        return batch_data
+        return collate_entries(batch, with_labels=True, pad_label_value=pad_label_value)
+
+    def create_dataloader(self, dataset) -> DataLoader:
+        return DataLoader(dataset, batch_size=self.batch_size, collate_fn=self.collate, num_workers=self.num_workers,
+                          pin_memory=self.pin_memory, persistent_workers=self.num_workers > 0)
+
+    def set_train_ids(self, ids: List[int]):
+        self.train_ids = list(ids)
+        self.train_rows = []
+        self.num_looked_up_train_ids = 0
+
+    def add_train_ids(self, ids: List[int]):
+        if self.train_ids is None:
+            self.train_ids = []
+        self.train_ids.extend(ids)
+
+    def get_train_subset(self) -> Dataset:
+        """
+        Training documents restricted to the training ids, in file order. Rows are only looked up for ids added
+        since the last call, ids without a training document are skipped.
+        """
+        if self.train_ids is None:
+            return self.train
+        self.train_rows.extend(self.train_index[idx] for idx in self.train_ids[self.num_looked_up_train_ids:]
+                               if idx in self.train_index)
+        self.num_looked_up_train_ids = len(self.train_ids)
+        return Subset(self.train, sorted(self.train_rows))
 
     def train_dataloader(self):
-        filtered = self.train_filter_func(self.train)
-        return DataLoader(filtered, batch_size=self.batch_size, collate_fn=self.collate, num_workers=self.num_workers)
+        return self.create_dataloader(self.get_train_subset())
 
     def val_dataloader(self):
-        return DataLoader(self.dev, batch_size=self.batch_size, collate_fn=self.collate, num_workers=self.num_workers)
+        return self.create_dataloader(self.dev)
 
     def test_dataloader(self):
-        return DataLoader(self.test, batch_size=self.batch_size, collate_fn=self.collate, num_workers=self.num_workers)
+        return self.create_dataloader(self.test)
 
     def predict_dataloader(self):
         pass  # not used
@@ -117,100 +226,117 @@ class AleNerDataModule(LightningDataModule):
     def teardown(self, stage: str):
         pass  # Used to clean-up when the run is finished
 
-    def char_to_token_labels(self, batch_encoding: BatchEncoding, char_labels: List[Tuple[int, int, str]]):
-        token_labels = ["O"] * len(batch_encoding["offset_mapping"])
-
-        for start_char, end_char, label in char_labels:
-            # Flag to denote the first token in the span
-            first_token = True
-            for i, (start, end) in enumerate(batch_encoding["offset_mapping"]):
-                # Skip tokens that are not part of the original text (special tokens)
-                if start == end == 0:
-                    continue
-
-                # Check if the current token overlaps with the current annotation span
-                if start < end_char and end > start_char:
-                    if first_token:
-                        token_labels[i] = "B-" + label
-                        first_token = False
-                    else:
-                        token_labels[i] = "I-" + label
-
-        return token_labels
-
 
 class PredictionDataModule(LightningDataModule):
     def __init__(self, texts: List[str] = None, model_name: str = None,
-                 batch_size: int = 32, num_workers: int = 1):
+                 batch_size: int = 32, num_workers: int = 1,
+                 ids: Optional[Sequence[int]] = None, encoding_store: Optional[EncodingStore] = None,
+                 tokenizer: Optional[PreTrainedTokenizerBase] = None, token_budget: Optional[int] = None,
+                 labeled_entries: Optional[List[Dict[str, Any]]] = None):
+        """
+        If ``ids`` and an ``encoding_store`` are given, documents already tokenized (e.g. for training) are taken
+        from the store and only the remaining ones are tokenized (and added to the store). Passing the tokenizer of
+        the training data module avoids loading it again.
+
+        With a ``token_budget`` the documents are batched by length (see ``TokenBudgetBatchSampler``) instead of
+        ``batch_size`` documents in input order. Predictions then follow ``prediction_order``.
+
+        ``labeled_entries`` (entries of ``AleNerDataModule``) are predicted along with the texts and come first in the
+        prediction set. Batches then carry labels, the texts are labeled with 0 and have to be treated as unlabeled.
+        """
         super().__init__()
-        self.tokenizer = AutoTokenizer.from_pretrained(model_name)
+        self.tokenizer = tokenizer if tokenizer is not None else AutoTokenizer.from_pretrained(model_name)
         self.batch_size = batch_size
         self.num_workers = num_workers
-        self.prediction_set = self.process_texts(texts)
+        self.pin_memory = torch.cuda.is_available()
+        self.encoding_store = encoding_store
+        self.with_labels = labeled_entries is not None and len(labeled_entries) > 0
+        self.prediction_set = [self.copy_labeled_entry(entry) for entry in labeled_entries or []] + \
+                              self.process_texts(texts, ids)
+        self.lengths = [len(entry["tokens"]["input_ids"]) for entry in self.prediction_set]
+        self.batch_sampler = TokenBudgetBatchSampler(self.lengths, token_budget, max_batch_size=batch_size) \
+            if token_budget is not None else None
+
+    @property
+    def batches(self) -> List[List[int]]:
+        if self.batch_sampler is not None:
+            return self.batch_sampler.batches
+        return fixed_size_batches(len(self.prediction_set), self.batch_size)
+
+    @property
+    def prediction_order(self) -> List[int]:
+        """
+        Indices of the input texts in the order their predictions are produced.
+        """
+        return [index for batch in self.batches for index in batch]
+
+    def padding_statistics(self) -> Dict[str, int]:
+        """
+        Token counts of the prediction set: real tokens, padded slots of the used batching and padded slots of
+        plain ``batch_size`` batching in input order.
+        """
+        return {"tokens": sum(self.lengths),
+                "padded_tokens": padded_size(self.lengths, self.batches),
+                "padded_tokens_fixed_batches": padded_size(self.lengths,
+                                                           fixed_size_batches(len(self.lengths), self.batch_size))}
 
-    def process_texts(self, texts: List[str]):
+    def process_texts(self, texts: List[str], ids: Optional[Sequence[int]] = None):
         result = []
-        for text in texts:
-            tokenized = self.tokenizer(text, add_special_tokens=False, return_offsets_mapping=True, truncation=True)
-            tokens_text = self.create_token_labels(text)
+        for i, text in enumerate(texts):
+            idx = ids[i] if ids is not None else None
+            if self.encoding_store is not None and idx is not None:
+                if idx not in self.encoding_store:
+                    tokenized = self.tokenize(text)
+                    self.encoding_store.add(idx, tokenized, self.create_token_labels(tokenized))
+                entry = self.encoding_store.get(idx)
+            else:
+                tokenized = self.tokenize(text)
+                entry = {"tokens": tokenized, "token_text": self.create_token_labels(tokenized)}
 
-            result.append({"tokens": tokenized, "text": text, "token_text": tokens_text})
+            entry["text"] = text
+            result.append(entry)
 
         return result
 
-    def create_token_labels(self, text):
-        tokens_text = self.tokenizer.tokenize(text)
+    @staticmethod
+    def copy_labeled_entry(entry: Dict[str, Any]) -> Dict[str, Any]:
+        return {"tokens": {"input_ids": entry["tokens"]["input_ids"],
+                           "attention_mask": entry["tokens"]["attention_mask"],
+                           "offset_mapping": entry["tokens"]["offset_mapping"]},
+                "labels": entry["labels"],
+                "text": entry["text"],
+                "token_text": entry["token_text"]}
+
+    def tokenize(self, text: str) -> BatchEncoding:
+        return self.tokenizer(text, add_special_tokens=False, return_offsets_mapping=True, truncation=True)
+
+    def create_token_labels(self, tokenized: BatchEncoding):
+        tokens_text = self.tokenizer.convert_ids_to_tokens(tokenized['input_ids'])
         cleaned_tokens = [token.lstrip("Ġ") for token in tokens_text]
         return cleaned_tokens
 
     def collate(self, batch):
         """
-        Collates a batch of data samples for training or evaluation, performing padding.
+        Collates a batch of data samples for prediction, performing padding (see ``collate_entries``).
 
         Args:
             batch (list): A list of dictionaries containing tokenized data and labels.
 
         Returns:
             dict: A dictionary with batched tensors for 'input_ids', 'attention_mask',
-                  and 'labels'.
+                  and 'labels' (only with labeled entries).
         """
-
-        # Get individual elements from the batch
-        max_length = max(len(example['tokens']['input_ids']) for example in batch)  # Determine the max length
-
-        # Initialize lists to hold the batch data
-        batch_input_ids = []
-        batch_attention_mask = []
-        batch_offset_mapping = []
-
-        for data in batch:
-            input_ids = data['tokens']['input_ids']
-            attention_mask = data['tokens']['attention_mask']
-            offsets = data['tokens']['offset_mapping']
-
-            padding_length = max_length - len(input_ids)
-
-            # Pad the 'input_ids', 'attention_mask', and 'labels'
-            input_ids.extend([0] * padding_length)
-            attention_mask.extend([0] * padding_length)
-
-            # Append the padded data to the batch lists
-            batch_input_ids.append(input_ids)
-            batch_attention_mask.append(attention_mask)
-            batch_offset_mapping.append(offsets)
-
-        batch_data = {
-            'input_ids': torch.tensor(batch_input_ids, dtype=torch.long),
-            'attention_mask': torch.tensor(batch_attention_mask, dtype=torch.long),
-            'text': [entry["text"] for entry in batch],
-            'token_text': [entry["token_text"] for entry in batch],
-            'offset_mapping': batch_offset_mapping
-        }
-
-        return batch_data
+        return collate_entries(batch, with_labels=self.with_labels)
 
     def predict_dataloader(self):
+        if self.batch_sampler is not None:
+            return DataLoader(self.prediction_set,
+                              batch_sampler=self.batch_sampler,
+                              collate_fn=self.collate,
+                              num_workers=self.num_workers,
+                              pin_memory=self.pin_memory)
         return DataLoader(self.prediction_set,
                           batch_size=self.batch_size,
                           collate_fn=self.collate,
-                          num_workers=self.num_workers)
+                          num_workers=self.num_workers,
+                          pin_memory=self.pin_memory)
@@ -0,0 +1,122 @@
+import itertools
+import logging
+import multiprocessing
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+import srsly
+from transformers import PreTrainedTokenizerBase
+
+from ale.import_helper import import_registrable_components
+
+logger = logging.getLogger(__name__)
+
+# Number of documents passed to the tokenizer at once
+PREPROCESSING_BATCH_SIZE = 1000
+# Number of documents per task of the process pool
+PREPROCESSING_CHUNK_SIZE = 20000
+
+
+def align_char_labels(offsets: np.ndarray, char_labels: Sequence[Tuple[int, int, str]],
+                      label2id: Mapping[str, int]) -> np.ndarray:
+    """
+    Label ids of the tokens with the given character offsets ``(num_tokens, 2)``: the first token overlapping a span
+    gets ``B-X``, the following ones ``I-X``. Special tokens (offset (0, 0)) stay ``O``. Later spans overwrite earlier
+    ones.
+
+    The offsets of the remaining tokens are non-decreasing, thus the tokens overlapping a span are a contiguous range
+    found by binary search.
+    """
+    token_labels = np.zeros(len(offsets), dtype=np.int64)
+    real_tokens = np.flatnonzero((offsets[:, 0] != 0) | (offsets[:, 1] != 0))
+    starts = offsets[real_tokens, 0]
+    ends = offsets[real_tokens, 1]
+    for start_char, end_char, label in char_labels:
+        # Tokens overlap a span if start < end_char and end > start_char
+        first = np.searchsorted(ends, start_char, side="right")
+        last = np.searchsorted(starts, end_char, side="left")
+        if first < last:
+            token_labels[real_tokens[first]] = label2id["B-" + label]
+            token_labels[real_tokens[first + 1:last]] = label2id["I-" + label]
+    return token_labels
+
+
+class NerPreprocessor:
+    """
+    Turns raw NER records (text and character spans) into entries of ``AleNerDataModule``. Documents are tokenized
+    in batches by the fast tokenizer and token texts are looked up in a table over the vocabulary.
+
+    Instances are pickled to the worker processes of ``preprocess_file``.
+    """
+
+    def __init__(self, tokenizer: PreTrainedTokenizerBase, label2id: Mapping[str, int], text_column: str,
+                 label_column: str):
+        self.tokenizer = tokenizer
+        self.label2id = dict(label2id)
+        self.text_column = text_column
+        self.label_column = label_column
+        self._vocabulary_texts: Optional[np.ndarray] = None
+
+    def __getstate__(self) -> Dict[str, Any]:
+        state = self.__dict__.copy()
+        state["_vocabulary_texts"] = None
+        return state
+
+    @property
+    def vocabulary_texts(self) -> np.ndarray:
+        if self._vocabulary_texts is None:
+            tokens_text = self.tokenizer.convert_ids_to_tokens(list(range(len(self.tokenizer))))
+            self._vocabulary_texts = np.array([token.lstrip("Ġ") for token in tokens_text], dtype=object)
+        return self._vocabulary_texts
+
+    def get_token_text(self, input_ids: Sequence[int]) -> List[str]:
+        return self.vocabulary_texts[np.asarray(input_ids, dtype=np.int64)].tolist()
+
+    def __call__(self, records: Sequence[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        result = []
+        for start in range(0, len(records), PREPROCESSING_BATCH_SIZE):
+            batch = records[start:start + PREPROCESSING_BATCH_SIZE]
+            tokenized = self.tokenizer([record[self.text_column] for record in batch], add_special_tokens=True,
+                                       return_offsets_mapping=True, truncation=True)
+            for i, record in enumerate(batch):
+                input_ids = tokenized["input_ids"][i]
+                offsets = np.asarray(tokenized["offset_mapping"][i], dtype=np.int64).reshape(-1, 2)
+                token_labels = align_char_labels(offsets, record[self.label_column], self.label2id)
+                entry = {"tokens": {"input_ids": input_ids,
+                                    "attention_mask": tokenized["attention_mask"][i],
+                                    "offset_mapping": tokenized["offset_mapping"][i]},
+                         "labels": token_labels.tolist(),
+                         "text": record[self.text_column],
+                         "token_text": self.get_token_text(input_ids)}
+                if "id" in record:
+                    entry["id"] = record["id"]
+                result.append(entry)
+        return result
+
+
+def chunked(records: Iterable[Dict[str, Any]], size: int) -> Iterator[List[Dict[str, Any]]]:
+    iterator = iter(records)
+    while chunk := list(itertools.islice(iterator, size)):
+        yield chunk
+
+
+def preprocess_file(path: Path, preprocessor: NerPreprocessor, num_processes: Optional[int] = None) \
+        -> List[Dict[str, Any]]:
+    """
+    Preprocesses all records of the jsonl file. With more than one process, chunks of ``PREPROCESSING_CHUNK_SIZE``
+    records are preprocessed in parallel (order is kept).
+    """
+    chunks = chunked(srsly.read_jsonl(path), PREPROCESSING_CHUNK_SIZE)
+    if num_processes is None or num_processes <= 1:
+        return [entry for chunk in chunks for entry in preprocessor(chunk)]
+
+    first_chunk = next(chunks, [])
+    if len(first_chunk) < PREPROCESSING_CHUNK_SIZE:
+        # The file fits into a single chunk
+        return preprocessor(first_chunk)
+
+    logger.info(f"Preprocess {path} with {num_processes} processes")
+    with multiprocessing.get_context("spawn").Pool(num_processes, initializer=import_registrable_components) as pool:
+        results = pool.imap(preprocessor, itertools.chain([first_chunk], chunks))
+        return [entry for result in results for entry in result]
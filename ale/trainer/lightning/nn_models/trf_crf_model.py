@@ -9,7 +9,8 @@ from transformers import AutoModel
 
 from ale.registry.registerable_model import ModelRegistry
 from ale.trainer.lightning.modules.crf import CRF
-from ale.trainer.lightning.utils import derive_labels, create_metrics, LabelGeneralizer, is_valid_for_prog_bar
+from ale.trainer.lightning.utils import derive_labels, create_metrics, LabelGeneralizer, is_valid_for_prog_bar, \
+    tensor_prediction_output
 
 
 @ModelRegistry.register("trf_crf")
@@ -29,10 +30,14 @@ class TransformerCrfLightning(LightningModule):
         self.weight_decay = weight_decay
         self.num_labels = len(self.id2label)
         self.raw_labels = ['O'] + labels
+        # predict_step returns padded tensors instead of per token dicts, see tensor_prediction_output
+        self.tensor_predictions = False
+        # In tensor mode, predict_step only returns the log probability of the best tag sequence
+        self.sequence_predictions = False
 
         self.linear = torch.nn.Linear(self.model.config.hidden_size, len(self.label2id))
 
-        self.crf = CRF(num_tags=len(self.label2id), batch_first=True)
+        self.crf = self.create_crf(len(labels))
 
         self.train_f1_per_label_wo_bio = torchmetrics.F1Score(task="multiclass", num_classes=len(labels) + 1,
                                                               average=None)
@@ -50,6 +55,9 @@ class TransformerCrfLightning(LightningModule):
                 logger.warning(f"Freeze layer: {name}")
                 param.requires_grad = False
 
+    def create_crf(self, num_types: int) -> CRF:
+        return CRF(num_tags=len(self.label2id), batch_first=True)
+
     def generalize_labels(self, labels):
         label_generalizer = LabelGeneralizer(self.bio_id_to_coarse_label_id, self.device)
         return label_generalizer.generalize_labels(labels)
@@ -64,16 +72,19 @@ class TransformerCrfLightning(LightningModule):
         self.move_metrics_to_device(self.val_metrics)
         self.move_metrics_to_device(self.test_metrics)
 
-    def forward(self, input_ids, attention_mask, labels=None, **kwargs):
+    def compute_features(self, input_ids, attention_mask):
         embeddings = self.model(input_ids, attention_mask=attention_mask)
-        features = self.linear(embeddings.last_hidden_state)
+        return self.linear(embeddings.last_hidden_state)
+
+    def forward(self, input_ids, attention_mask, labels=None, **kwargs):
+        features = self.compute_features(input_ids, attention_mask)
 
         loss = 0.0
         if labels is not None:
             loss = - self.crf.forward(features, labels, attention_mask)
 
-        decoded_tag_list = self.crf.decode(features, attention_mask)
-        return loss, decoded_tag_list, features
+        decoded_tags, _ = self.crf.decode_padded(features, attention_mask)
+        return loss, decoded_tags, features
 
     def training_step(self, batch, batch_idx):
         loss, decoded, _ = self(**batch)
@@ -94,9 +105,18 @@ class TransformerCrfLightning(LightningModule):
     def predict_step(self, batch, batch_idx, dataloader_idx=0):
         mask = batch['attention_mask']
 
-        loss, decoded, emissions = self(**batch)
-        raw_confidences = self.crf.compute_marginals(emissions, mask=mask)
+        # Path and marginals come from one forward-backward pass, the loss is not needed
+        emissions = self.compute_features(batch['input_ids'], mask)
+        if self.tensor_predictions and self.sequence_predictions:
+            return {'sequence_log_probabilities': self.crf.sequence_log_probabilities(emissions, mask)}
+
+        inference = self.crf.infer(emissions, mask)
+        decoded, raw_confidences = inference.tags, inference.marginals
+        if self.tensor_predictions:
+            return tensor_prediction_output(batch, raw_confidences, decoded)
+
         confidences = self.masked_label_confidences(raw_confidences, mask)
+        decoded = self.apply_mask(mask, decoded.tolist())
 
         token_labels = []
         confidences_per_token = []
@@ -160,7 +180,7 @@ class TransformerCrfLightning(LightningModule):
 
         mask_flat = mask.view(-1)
         gold_labels_flat = gold_labels.view(-1)
-        prediction_labels_flat = self.pad_and_flatten(predictions, gold_labels.size()[1], -1)
+        prediction_labels_flat = predictions.reshape(-1)
 
         prediction_labels_flat = torch.where(mask_flat == 1, prediction_labels_flat,
                                              torch.tensor(-1, device=self.device))
@@ -187,18 +207,6 @@ class TransformerCrfLightning(LightningModule):
                 metric.update(valid_prediction_labels, valid_gold_labels)
         f1_per_label.update(t1, t2)
 
-    def pad_and_flatten(self, labels, max_length, pad_token):
-        padded_labels = []
-        for sublist in labels:
-            # Pad if the sublist is shorter than max_length
-            padded = sublist + [pad_token] * (max_length - len(sublist)) \
-                if len(sublist) < max_length else sublist[:max_length]
-            padded_labels.append(padded)
-
-        # Flatten the list of lists
-        flattened_labels = [item for sublist in padded_labels for item in sublist]
-        return torch.tensor(flattened_labels, device=self.device)
-
     def masked_label_confidences(self, predictions, mask):
         batch_size, sequence_length, num_labels = predictions.shape
         output = []
@@ -9,7 +9,8 @@ from torchmetrics import Metric
 from transformers import AutoModel
 
 from ale.registry.registerable_model import ModelRegistry
-from ale.trainer.lightning.utils import derive_labels, create_metrics, LabelGeneralizer, is_valid_for_prog_bar
+from ale.trainer.lightning.utils import derive_labels, create_metrics, LabelGeneralizer, is_valid_for_prog_bar, \
+    tensor_prediction_output
 
 logger = logging.getLogger(__name__)
 
@@ -31,6 +32,8 @@ class TransformerFfnLightning(LightningModule):
         self.weight_decay = weight_decay
         self.num_labels = len(self.id2label)
         self.raw_labels = ['O'] + labels
+        # predict_step returns padded tensors instead of per token dicts, see tensor_prediction_output
+        self.tensor_predictions = False
 
         self.linear = torch.nn.Linear(self.model.config.hidden_size, self.num_labels, device=self.device)
         self.loss_function = torch.nn.CrossEntropyLoss(ignore_index=-100, label_smoothing=label_smoothing)
@@ -98,6 +101,9 @@ class TransformerFfnLightning(LightningModule):
         mask = batch['attention_mask']
         softmax_logits = softmax(logits, dim=-1)
         class_predictions = torch.argmax(softmax_logits, dim=-1)
+        if self.tensor_predictions:
+            return tensor_prediction_output(batch, softmax_logits, class_predictions)
+
         class_predictions_numpy = class_predictions.cpu().numpy() if class_predictions.is_cuda else class_predictions.numpy()
         class_predictions_numpy = self.apply_mask(mask, class_predictions_numpy)
 
@@ -8,7 +8,8 @@ from torchmetrics import Metric
 from transformers import AutoModelForTokenClassification
 
 from ale.registry.registerable_model import ModelRegistry
-from ale.trainer.lightning.utils import derive_labels, create_metrics, LabelGeneralizer, is_valid_for_prog_bar
+from ale.trainer.lightning.utils import derive_labels, create_metrics, LabelGeneralizer, is_valid_for_prog_bar, \
+    tensor_prediction_output
 
 
 @ModelRegistry.register("trf")
@@ -28,6 +29,8 @@ class TransformerLightning(LightningModule):
         self.weight_decay = weight_decay
         self.num_labels = len(self.id2label)
         self.raw_labels = ['O'] + labels
+        # predict_step returns padded tensors instead of per token dicts, see tensor_prediction_output
+        self.tensor_predictions = False
 
         self.train_f1_per_label_wo_bio = torchmetrics.F1Score(task="multiclass", num_classes=len(labels) + 1,
                                                               average=None)
@@ -88,6 +91,9 @@ class TransformerLightning(LightningModule):
         mask = batch['attention_mask']
         softmax_logits = softmax(logits, dim=-1)
         class_predictions = torch.argmax(softmax_logits, dim=-1)
+        if self.tensor_predictions:
+            return tensor_prediction_output(batch, softmax_logits, class_predictions)
+
         class_predictions_numpy = class_predictions.cpu().numpy() if class_predictions.is_cuda else class_predictions.numpy()
         class_predictions_numpy = self.apply_mask(mask, class_predictions_numpy)
 
@@ -1,10 +1,11 @@
 import logging
 import os
 from pathlib import Path
-from typing import Dict, List
+from typing import Dict, List, Any, Sequence, Union, Optional, Iterator, Tuple, Callable
 
+import numpy as np
 import torch
-from pytorch_lightning import seed_everything
+from pytorch_lightning import LightningModule, seed_everything
 from pytorch_lightning import Trainer
 from pytorch_lightning.callbacks.early_stopping import EarlyStopping
 from pytorch_lightning.callbacks.model_checkpoint import ModelCheckpoint
@@ -19,9 +20,15 @@ from ale.corpus.corpus import Corpus
 from ale.mlflowutils import mlflow_utils
 from ale.registry import TrainerRegistry
 from ale.registry.registerable_model import ModelRegistry
-from ale.trainer.base_trainer import BaseTrainer, MetricsType
+from ale.trainer.base_trainer import MetricsType
+from ale.trainer.lightning.inference_runner import InferenceRunner, resolve_device
 from ale.trainer.lightning.ner_dataset import PredictionDataModule
-from ale.trainer.prediction_result import PredictionResult, TokenConfidence, LabelConfidence
+from ale.trainer.lightning.quantization import quantize_for_inference, score_rank_correlation
+from ale.trainer.lightning.sharded_inference import ShardedInference, split_batches
+from ale.trainer.lightning.token_budget_sampler import padded_size
+from ale.trainer.lightning.utils import collect_token_predictions, mean_pooled_embeddings
+from ale.trainer.prediction_result import TokenPredictions
+from ale.trainer.prediction_trainer import PredictionTrainer
 
 os.environ["TOKENIZERS_PARALLELISM"] = "false"
 torch.set_float32_matmul_precision('medium')
@@ -31,9 +38,10 @@ logging.getLogger("pytorch_lightning").setLevel(logging.INFO)
 
 
 @TrainerRegistry.register("pytorch-lightning-trainer")
-class PyTorchLightningTrainer(BaseTrainer):
+class PyTorchLightningTrainer(PredictionTrainer):
     def __init__(self, cfg: AppConfig, corpus: Corpus, seed: int, labels: List[str]):
         seed_everything(seed, workers=True)
+        self.corpus = corpus
         self.dataset = corpus.data_module
         self.model_class = ModelRegistry.get_instance(cfg.trainer.model)
         self.model = self.model_class(cfg.trainer.huggingface_model,
@@ -44,8 +52,30 @@ class PyTorchLightningTrainer(BaseTrainer):
                                       label_smoothing=cfg.trainer.label_smoothing,
                                       freeze_layers=cfg.trainer.freeze_layers)
         self.cfg = cfg
+        self.prediction_padding: Dict[str, int] = {}
+        self.inference_runner: Optional[InferenceRunner] = None
+        self.quantized_runner: Optional[InferenceRunner] = None
+        self.sharded_inference: Optional[ShardedInference] = None
+        self.quantization_correlations: List[float] = []
+        self.quantization_diagnostic_done = False
+
+    def on_model_changed(self):
+        """
+        Drops everything derived from the current weights: the prediction session, the quantized model and the
+        inference processes.
+        """
+        self.close_prediction_session()
+        self.quantized_runner = None
+        if self.sharded_inference is not None:
+            self.sharded_inference.close()
+            self.sharded_inference = None
+        self.quantization_diagnostic_done = False
+
+    def close(self):
+        self.on_model_changed()
 
     def train(self, train_corpus: Corpus, active_run: ActiveRun) -> MetricsType:
+        self.on_model_changed()
         self.create_trainer(active_run)
         self.trainer.fit(self.model, self.dataset)
         return self.trainer.validate(ckpt_path='best', dataloaders=self.dataset.val_dataloader())[0]
@@ -86,73 +116,264 @@ class PyTorchLightningTrainer(BaseTrainer):
         logger.info(f"Restore model from: {matching_run.info.run_id}/{artifact_path}")
         model_path = mlflow_utils.load_artifact(matching_run, artifact_path)
         self.model = self.model_class.load_from_checkpoint(model_path)
+        self.on_model_changed()
 
     def delete_artifacts(self, run: Run):
         repository = get_artifact_repository(run.info.artifact_uri)
         repository.delete_artifacts("best")
 
-    def predict(self, docs: Dict[int, str]) -> Dict[int, PredictionResult]:
-        results: Dict[int, PredictionResult] = dict()
+    def predict(self, docs: Union[Dict[int, str], Sequence[int]]) -> TokenPredictions:
+        session_predictions = self.get_session_predictions(docs)
+        if session_predictions is not None:
+            return session_predictions
 
-        texts = list(docs.values())
-        data = PredictionDataModule(texts,
-                                    self.cfg.trainer.huggingface_model,
-                                    num_workers=self.cfg.trainer.num_workers)
-        if hasattr(self, 'trainer'):
-            logging.info("Reuse trainer from training for predictions")
-            trainer = self.trainer
+        return self.predict_pool(docs, quantized=self.use_quantized_scoring(), sharded=self.use_sharded_inference())
+
+    def predict_pool(self, docs: Union[Dict[int, str], Sequence[int]], quantized: bool = False,
+                     sharded: bool = False, track_padding: bool = True) -> TokenPredictions:
+        ids, data = self.create_prediction_data(docs, track_padding=track_padding)
+        if quantized:
+            self.run_quantization_diagnostic(ids)
+        prediction_order = data.prediction_order
+        if sharded and len(ids) > 0:
+            predictions = TokenPredictions.concatenate(list(self.predict_shards(ids, data, quantized)))
         else:
-            logger.warning("No trainer is defined. Might be after resume. Let's try a fresh trainer.")
-            trainer = Trainer(max_epochs=self.cfg.trainer.max_epochs, devices=1, accelerator=self.cfg.trainer.device,
-                              deterministic=True)
-
-        prediction_batches = trainer.predict(self.model, data.predict_dataloader())
-        predictions_per_doc = []
-        for single_batch in prediction_batches:
-            first_key = list(single_batch.keys())[0]
-            for i in range(len(single_batch[first_key])):
-                infos_per_doc = {}
-                for key in single_batch:
-                    infos_per_doc[key] = single_batch[key][i]
-                predictions_per_doc.append(infos_per_doc)
-
-        for idx, pred in zip(docs.keys(), predictions_per_doc):
-            prediction_result = PredictionResult()
-            for single_token, single_conf_array, pred_label in zip(pred['tokens'], pred['confidences'],
-                                                                   pred['token_labels']):
-                label_confidences = [LabelConfidence(label=l, confidence=c) for l, c in single_conf_array.items()]
-                prediction_result.ner_confidences_token.append(
-                    TokenConfidence(text=single_token, predicted_label=pred_label,
-                                    label_confidence=label_confidences))
-            results[idx] = prediction_result
-
-        return results
-
-    def predict_with_known_gold_labels(self, data_loader: DataLoader) -> Dict[int, PredictionResult]:
+            prediction_batches = list(self.iterate_inference(data.predict_dataloader(), quantized=quantized))
+            predictions = self.collect_token_predictions([ids[i] for i in prediction_order], prediction_batches)
+        if prediction_order != sorted(prediction_order):
+            predictions = predictions.select(ids)
+        return predictions
+
+    def predict_batches(self, docs: Union[Dict[int, str], Sequence[int]]) -> Iterator[TokenPredictions]:
+        session_predictions = self.get_session_predictions(docs)
+        if session_predictions is not None:
+            yield session_predictions
+            return
+
+        ids, data = self.create_prediction_data(docs)
+        quantized = self.use_quantized_scoring()
+        if quantized:
+            self.run_quantization_diagnostic(ids)
+        if self.use_sharded_inference():
+            yield from self.predict_shards(ids, data, quantized)
+            return
+
+        prediction_batches = self.iterate_inference(data.predict_dataloader(), quantized=quantized)
+        for batch, prediction_batch in zip(data.batches, prediction_batches):
+            yield self.collect_token_predictions([ids[i] for i in batch], [prediction_batch])
+
+    def predict_sequence_log_probabilities(self, docs: Union[Dict[int, str], Sequence[int]]) \
+            -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+        """
+        CRF models compute log P(y*|x) from the Viterbi score and the partition function in one forward recursion,
+        without token marginals. Runs in the inference processes or the main process (quantized if configured) like
+        ``predict_batches``.
+        """
+        if not hasattr(self.model, "sequence_predictions"):
+            yield from super().predict_sequence_log_probabilities(docs)
+            return
+
+        ids, data = self.create_prediction_data(docs)
+        quantized = self.use_quantized_scoring()
+        if quantized:
+            self.run_quantization_diagnostic(ids)
+        if self.use_sharded_inference():
+            yield from self.predict_shards(ids, data, quantized, sequences=True)
+            return
+
+        prediction_batches = self.iterate_inference(data.predict_dataloader(), quantized=quantized)
+        model = self.quantized_runner.model if quantized else self.model
+        model.sequence_predictions = True
+        try:
+            for batch, prediction_batch in zip(data.batches, prediction_batches):
+                yield (np.asarray([ids[i] for i in batch], dtype=np.int64),
+                       prediction_batch['sequence_log_probabilities'].float().cpu().numpy())
+        finally:
+            model.sequence_predictions = False
+
+    def predict_embeddings(self, docs: Union[Dict[int, str], Sequence[int]]) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+        """
+        Yields (ids, embeddings) batch by batch: the mean pooled last hidden states of the encoder of the trained
+        model. Runs in the main process, not quantized. The batches are not added to the padding statistics.
+        """
+        ids, data = self.create_prediction_data(docs, track_padding=False)
+        embedding_batches = self.iterate_inference(data.predict_dataloader(), step=mean_pooled_embeddings)
+        for batch, embeddings in zip(data.batches, embedding_batches):
+            yield np.asarray([ids[i] for i in batch], dtype=np.int64), embeddings.float().cpu().numpy()
+
+    def predict_shards(self, ids: List[int], data: PredictionDataModule, quantized: bool = False,
+                       sequences: bool = False) -> Iterator[Union[TokenPredictions, Tuple[np.ndarray, np.ndarray]]]:
+        """
+        Predicts the batches of the data module in the inference processes. Consecutive batches are grouped into
+        shards of similar padded size, a few per process so that idle processes pick up the remaining ones.
+        Yields one container per shard in prediction order, with ``sequences`` (ids, sequence log probabilities).
+        """
+        if self.sharded_inference is None or self.sharded_inference.quantized != quantized:
+            if self.sharded_inference is not None:
+                self.sharded_inference.close()
+            self.sharded_inference = ShardedInference(self.model,
+                                                      self.cfg.trainer.inference_processes,
+                                                      num_threads=self.cfg.trainer.inference_threads,
+                                                      quantized=quantized)
+
+        batches = data.batches
+        shards = split_batches([padded_size(data.lengths, [batch]) for batch in batches],
+                               4 * self.sharded_inference.num_processes)
+
+        def create_shards():
+            for shard in shards:
+                shard_batches = [batches[index] for index in shard]
+                yield ([ids[i] for batch in shard_batches for i in batch],
+                       [data.collate([data.prediction_set[i] for i in batch]) for batch in shard_batches])
+
+        yield from self.sharded_inference.predict(create_shards(), sequences=sequences)
+
+    def get_session_predictions(self, docs: Union[Dict[int, str], Sequence[int]]) -> Optional[TokenPredictions]:
+        if self.prediction_session is None:
+            return None
+        return self.prediction_session.get_pool_predictions(list(docs.keys()) if isinstance(docs, dict) else docs)
+
+    def predict_shared(self, labeled: Dict[str, DataLoader], pool_ids: Sequence[int]) \
+            -> Tuple[Dict[str, TokenPredictions], Optional[TokenPredictions]]:
+        """
+        Predicts the labeled splits and the pool documents in one pass, batched together.
+        """
+        labeled_entries, split_ranges = [], {}
+        for split, data_loader in labeled.items():
+            start = len(labeled_entries)
+            labeled_entries.extend(data_loader.dataset)
+            split_ranges[split] = (start, len(labeled_entries))
+
+        pool_ids, data = self.create_prediction_data(pool_ids, labeled_entries=labeled_entries)
+        keys = [entry["id"] for entry in labeled_entries] + pool_ids
+        prediction_order = data.prediction_order
+        predictions = self.collect_token_predictions([keys[i] for i in prediction_order],
+                                                     self.run_inference(data.predict_dataloader()),
+                                                     with_gold_labels=len(labeled_entries) > 0)
+
+        # Row of every entry of the prediction set in the collected predictions
+        rows = np.empty(len(prediction_order), dtype=np.int64)
+        rows[prediction_order] = np.arange(len(prediction_order))
+        labeled_predictions = {split: predictions.select_rows(rows[start:end])
+                               for split, (start, end) in split_ranges.items()}
+
+        pool_predictions = None
+        if len(pool_ids) > 0:
+            pool_predictions = predictions.select_rows(rows[len(labeled_entries):])
+            pool_predictions.gold_label_ids = None
+        return labeled_predictions, pool_predictions
+
+    def create_prediction_data(self, docs: Union[Dict[int, str], Sequence[int]],
+                               labeled_entries: Optional[List[Dict[str, Any]]] = None,
+                               track_padding: bool = True) -> Tuple[List[int], PredictionDataModule]:
+        """
+        With ``track_padding`` the token counts of the batches are added to the padding statistics, diagnostic
+        predictions pass False.
+        """
+        if not isinstance(docs, dict):
+            docs = self.corpus.get_text_by_ids(list(docs))
+        ids = list(docs.keys())
+        data = PredictionDataModule(list(docs.values()),
+                                    self.cfg.trainer.huggingface_model,
+                                    num_workers=self.cfg.trainer.num_workers,
+                                    ids=ids,
+                                    encoding_store=getattr(self.corpus, "encoding_store", None),
+                                    tokenizer=self.dataset.tokenizer,
+                                    token_budget=self.cfg.trainer.prediction_token_budget,
+                                    labeled_entries=labeled_entries)
+        if track_padding:
+            self.track_prediction_padding(data.padding_statistics())
+        return ids, data
+
+    def track_prediction_padding(self, statistics: Dict[str, int]):
+        for key, value in statistics.items():
+            self.prediction_padding[key] = self.prediction_padding.get(key, 0) + value
+
+    def pop_prediction_padding_statistics(self) -> Dict[str, int]:
+        """
+        Returns the token counts (see ``PredictionDataModule.padding_statistics``) summed over all ``predict`` calls
+        since the last call and resets them.
+        """
+        statistics, self.prediction_padding = self.prediction_padding, {}
+        return statistics
+
+    def predict_with_known_gold_labels(self, data_loader: DataLoader) -> TokenPredictions:
         keys = [entry["id"] for entry in data_loader.dataset]
-        prediction_batches = self.trainer.predict(self.model, data_loader)
-
-        results: Dict[int, PredictionResult] = dict()
-        predictions_per_doc = []
-
-        for single_batch in prediction_batches:
-            first_key = list(single_batch.keys())[0]
-            for i in range(len(single_batch[first_key])):
-                infos_per_doc = {}
-                for key in single_batch:
-                    infos_per_doc[key] = single_batch[key][i]
-                predictions_per_doc.append(infos_per_doc)
-
-        for idx, pred in zip(keys, predictions_per_doc):
-            prediction_result = PredictionResult()
-            for single_token, single_conf_array, gold_label, pred_label in zip(pred['tokens'], pred['confidences'],
-                                                                               pred['gold_labels'],
-                                                                               pred['token_labels']):
-                label_confidences = [LabelConfidence(label=l, confidence=c) for l, c in single_conf_array.items()]
-                prediction_result.ner_confidences_token.append(
-                    TokenConfidence(text=single_token, label_confidence=label_confidences,
-                                    gold_label=gold_label, predicted_label=pred_label))
-
-            results[idx] = prediction_result
-
-        return results
+        prediction_batches = self.run_inference(data_loader)
+        return self.collect_token_predictions(keys, prediction_batches, with_gold_labels=True)
+
+    def run_inference(self, data_loader: DataLoader) -> List[Dict[str, Any]]:
+        """
+        Runs ``predict_step`` in tensor mode over the data loader, bypassing ``Trainer.predict``.
+        """
+        return list(self.iterate_inference(data_loader))
+
+    def iterate_inference(self, data_loader: DataLoader, quantized: bool = False,
+                          step: Optional[Callable[[LightningModule, Dict[str, Any]], Any]] = None) -> Iterator[Any]:
+        if quantized:
+            if self.quantized_runner is None:
+                logger.info("Quantize Linear layers (dynamic int8) for pool predictions")
+                self.quantized_runner = InferenceRunner(quantize_for_inference(self.model),
+                                                        torch.device("cpu"),
+                                                        num_threads=self.cfg.trainer.inference_threads)
+            return self.quantized_runner.iterate(data_loader, step)
+
+        if self.inference_runner is None or self.inference_runner.model is not self.model:
+            # The model is replaced after restoring it from the artifacts
+            self.inference_runner = InferenceRunner(self.model,
+                                                    resolve_device(self.cfg.trainer.device),
+                                                    num_threads=self.cfg.trainer.inference_threads,
+                                                    compile_mode=self.cfg.trainer.inference_compile_mode,
+                                                    precision=self.cfg.trainer.precision)
+        return self.inference_runner.iterate(data_loader, step)
+
+    def use_quantized_scoring(self) -> bool:
+        """
+        Quantized models only run on CPU, on other devices the option is ignored.
+        """
+        if not self.cfg.trainer.inference_quantization:
+            return False
+        if resolve_device(self.cfg.trainer.device).type != "cpu":
+            logger.warning("Quantized scoring is only supported on CPU, predict with the fp32 model.")
+            return False
+        return True
+
+    def use_sharded_inference(self) -> bool:
+        """
+        Inference processes are only used for CPU predictions, on other devices the option is ignored.
+        """
+        processes = self.cfg.trainer.inference_processes
+        if processes is None or processes < 2:
+            return False
+        if resolve_device(self.cfg.trainer.device).type != "cpu":
+            logger.warning("Inference processes are only supported on CPU, predict in the main process.")
+            return False
+        return True
+
+    def run_quantization_diagnostic(self, ids: List[int]):
+        """
+        Once per model version: predicts a sample of the pool with the fp32 and the quantized model and records the
+        rank correlation of their uncertainty scores.
+        """
+        sample_size = self.cfg.trainer.quantization_diagnostic_sample
+        if sample_size is None or self.quantization_diagnostic_done:
+            return
+        self.quantization_diagnostic_done = True
+        sample_ids = ids[:sample_size]
+        if len(sample_ids) < 2:
+            return
+        reference = self.predict_pool(sample_ids, track_padding=False)
+        quantized = self.predict_pool(sample_ids, quantized=True, track_padding=False)
+        correlation = score_rank_correlation(reference, quantized)
+        logger.info(f"Rank correlation of uncertainty scores (fp32 vs. int8, {len(sample_ids)} docs): "
+                    f"{correlation:.4f}")
+        self.quantization_correlations.append(correlation)
+
+    def pop_quantization_correlations(self) -> List[float]:
+        correlations, self.quantization_correlations = self.quantization_correlations, []
+        return correlations
+
+    def collect_token_predictions(self, keys: List[int], prediction_batches: List[Dict[str, Any]],
+                                  with_gold_labels: bool = False) -> TokenPredictions:
+        return collect_token_predictions(keys, prediction_batches, self.model.id2label,
+                                         with_gold_labels=with_gold_labels)
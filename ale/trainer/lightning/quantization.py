@@ -0,0 +1,40 @@
+import copy
+import logging
+
+import numpy as np
+import torch
+from pytorch_lightning import LightningModule
+from scipy.stats import spearmanr
+
+from ale.config import AggregationMethod
+from ale.teacher.exploitation.scoring import aggregate_segments, token_highest_confidence
+from ale.trainer.prediction_result import TokenPredictions
+
+logger = logging.getLogger(__name__)
+
+
+def quantize_for_inference(model: LightningModule) -> LightningModule:
+    """
+    Returns a CPU copy of the model with int8 dynamically quantized Linear layers. The given model is not modified,
+    thus training and evaluation keep using fp32 weights.
+    """
+    model_copy = copy.deepcopy(model).to("cpu")
+    model_copy.eval()
+    return torch.ao.quantization.quantize_dynamic(model_copy, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+def least_confidence_scores(predictions: TokenPredictions) -> np.ndarray:
+    """
+    Average token level least confidence (1 - highest probability) per document in container order.
+    """
+    return aggregate_segments(1 - token_highest_confidence(predictions.probabilities), predictions.offsets,
+                              AggregationMethod.AVERAGE)
+
+
+def score_rank_correlation(reference: TokenPredictions, quantized: TokenPredictions) -> float:
+    """
+    Spearman rank correlation of the least confidence scores of two predictions of the same documents.
+    """
+    quantized = quantized.select(reference.ids.tolist())
+    correlation = spearmanr(least_confidence_scores(reference), least_confidence_scores(quantized)).correlation
+    return float(correlation)
@@ -0,0 +1,130 @@
+import collections
+import functools
+import logging
+import os
+import shutil
+import tempfile
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Type, Union
+
+import numpy as np
+import pytorch_lightning
+import torch
+from pytorch_lightning import LightningModule
+
+from ale.import_helper import import_registrable_components
+from ale.trainer.lightning.inference_runner import InferenceRunner
+from ale.trainer.lightning.quantization import quantize_for_inference
+from ale.trainer.lightning.utils import collect_token_predictions
+from ale.trainer.prediction_result import TokenPredictions
+
+logger = logging.getLogger(__name__)
+
+# Model of a worker process, loaded with its first shard
+worker_runners: Dict[str, InferenceRunner] = {}
+
+
+def write_inference_checkpoint(model: LightningModule, path: str):
+    """
+    Stores the current weights in the Lightning checkpoint layout, thus the model class can load them with
+    ``load_from_checkpoint``.
+    """
+    torch.save({"state_dict": model.state_dict(),
+                "hyper_parameters": dict(model.hparams),
+                "pytorch-lightning_version": pytorch_lightning.__version__}, path)
+
+
+def split_batches(costs: Sequence[int], num_shards: int) -> List[List[int]]:
+    """
+    Groups consecutive batch indices into at most ``num_shards`` non-empty shards of roughly equal cost (e.g. padded
+    tokens per batch).
+    """
+    if len(costs) == 0:
+        return []
+    costs = np.asarray(costs, dtype=np.float64)
+    cumulative = np.cumsum(costs)
+    # A batch belongs to the shard its center falls into
+    shard_ids = np.minimum(((cumulative - costs / 2) / max(cumulative[-1], 1) * num_shards).astype(np.int64),
+                           num_shards - 1)
+    boundaries = np.flatnonzero(np.diff(shard_ids)) + 1
+    return [list(range(start, end)) for start, end in zip(np.r_[0, boundaries], np.r_[boundaries, len(costs)])]
+
+
+def load_worker_runner(model_class: Type[LightningModule], checkpoint_path: str, num_threads: int,
+                       quantized: bool) -> InferenceRunner:
+    if checkpoint_path not in worker_runners:
+        worker_runners.clear()
+        torch.set_num_threads(num_threads)
+        model = model_class.load_from_checkpoint(checkpoint_path, map_location="cpu")
+        if quantized:
+            model = quantize_for_inference(model)
+        worker_runners[checkpoint_path] = InferenceRunner(model, torch.device("cpu"))
+    return worker_runners[checkpoint_path]
+
+
+def predict_shard(model_class: Type[LightningModule], checkpoint_path: str, num_threads: int, quantized: bool,
+                  shard: Tuple[List[int], List[Dict[str, Any]]], sequences: bool = False) \
+        -> Union[TokenPredictions, Tuple[np.ndarray, np.ndarray]]:
+    """
+    Runs in a worker process: predicts the collated batches of one shard, ``keys`` are the ids of all documents of
+    the shard in batch order. With ``sequences`` (CRF models only) the shard is scored with the log probabilities
+    of the most likely label sequences, returned as (ids, log probabilities).
+    """
+    keys, batches = shard
+    runner = load_worker_runner(model_class, checkpoint_path, num_threads, quantized)
+    if not sequences:
+        return collect_token_predictions(keys, list(runner.iterate(batches)), runner.model.id2label)
+
+    runner.model.sequence_predictions = True
+    try:
+        outputs = list(runner.iterate(batches))
+    finally:
+        runner.model.sequence_predictions = False
+    log_probabilities = [output['sequence_log_probabilities'].float().cpu().numpy() for output in outputs]
+    return np.asarray(keys, dtype=np.int64), np.concatenate(log_probabilities) if log_probabilities \
+        else np.zeros(0, dtype=np.float32)
+
+
+class ShardedInference:
+    """
+    Predicts on CPU with a pool of worker processes.
+
+    The current weights are written to a temporary checkpoint once, every worker loads its own read-only copy of the
+    model from it with its first shard and predicts with a fixed number of torch threads. Shards (groups of collated
+    batches) are handed out to the idle workers and the predictions are returned in shard order. At most
+    ``max_in_flight`` shards (default: two per process) are submitted and not yet returned at once, thus the shards
+    are created lazily and only a bounded number of them is held in memory.
+    """
+
+    def __init__(self, model: LightningModule, num_processes: int, num_threads: Optional[int] = None,
+                 quantized: bool = False, max_in_flight: Optional[int] = None):
+        self.num_processes = num_processes
+        self.max_in_flight = max_in_flight if max_in_flight is not None else 2 * num_processes
+        self.num_threads = num_threads if num_threads is not None else max(1, (os.cpu_count() or 1) // num_processes)
+        self.quantized = quantized
+        self.directory = tempfile.mkdtemp(prefix="ale_inference_")
+        self.checkpoint_path = os.path.join(self.directory, "model.ckpt")
+        write_inference_checkpoint(model, self.checkpoint_path)
+        self.predict_function = functools.partial(predict_shard, type(model), self.checkpoint_path, self.num_threads,
+                                                  quantized)
+        logger.info(f"Start {num_processes} inference processes with {self.num_threads} threads each")
+        # Spawned workers import the registrable components first, like the main entrypoint
+        self.pool = torch.multiprocessing.get_context("spawn").Pool(num_processes,
+                                                                     initializer=import_registrable_components)
+
+    def predict(self, shards: Iterable[Tuple[List[int], List[Dict[str, Any]]]], sequences: bool = False) \
+            -> Iterator[Union[TokenPredictions, Tuple[np.ndarray, np.ndarray]]]:
+        """
+        Yields the predictions of the shards in shard order (see ``predict_shard``).
+        """
+        pending = collections.deque()
+        for shard in shards:
+            pending.append(self.pool.apply_async(self.predict_function, (shard,), {"sequences": sequences}))
+            if len(pending) >= self.max_in_flight:
+                yield pending.popleft().get()
+        while pending:
+            yield pending.popleft().get()
+
+    def close(self):
+        self.pool.terminate()
+        self.pool.join()
+        shutil.rmtree(self.directory, ignore_errors=True)
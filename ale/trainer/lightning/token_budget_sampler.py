@@ -0,0 +1,60 @@
+from typing import List, Optional, Sequence
+
+import numpy as np
+from torch.utils.data import Sampler
+
+
+class TokenBudgetBatchSampler(Sampler[List[int]]):
+    """
+    Batches dataset indices by length for inference.
+
+    Indices are sorted by length (longest first, ties keep the dataset order) and a batch is closed as soon as padding
+    it to its longest member would exceed ``token_budget`` tokens. Documents longer than the budget form a batch on
+    their own. ``max_batch_size`` optionally bounds the number of documents per batch.
+    """
+
+    def __init__(self, lengths: Sequence[int], token_budget: int, max_batch_size: Optional[int] = None):
+        super().__init__()
+        if token_budget < 1:
+            raise ValueError(f"Token budget must be positive, got: {token_budget}")
+        self.lengths = np.asarray(lengths, dtype=np.int64)
+        self.token_budget = token_budget
+        self.max_batch_size = max_batch_size
+        self.batches = self.create_batches()
+
+    def create_batches(self) -> List[List[int]]:
+        batches: List[List[int]] = []
+        batch: List[int] = []
+        batch_max_length = 0
+        for index in np.argsort(-self.lengths, kind="stable").tolist():
+            max_length = max(batch_max_length, int(self.lengths[index]))
+            is_full = self.max_batch_size is not None and len(batch) >= self.max_batch_size
+            if batch and (is_full or max_length * (len(batch) + 1) > self.token_budget):
+                batches.append(batch)
+                batch, max_length = [], int(self.lengths[index])
+            batch.append(index)
+            batch_max_length = max_length
+        if batch:
+            batches.append(batch)
+        return batches
+
+    def __iter__(self):
+        return iter(self.batches)
+
+    def __len__(self) -> int:
+        return len(self.batches)
+
+
+def fixed_size_batches(num_entries: int, batch_size: int) -> List[List[int]]:
+    """
+    Batches of the plain ``DataLoader``: consecutive indices in dataset order.
+    """
+    return [list(range(start, min(start + batch_size, num_entries))) for start in range(0, num_entries, batch_size)]
+
+
+def padded_size(lengths: Sequence[int], batches: Sequence[Sequence[int]]) -> int:
+    """
+    Number of token slots after padding every batch to its longest member.
+    """
+    lengths = np.asarray(lengths, dtype=np.int64)
+    return int(sum(lengths[batch].max() * len(batch) for batch in batches if len(batch) > 0))
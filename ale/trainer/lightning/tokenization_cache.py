@@ -0,0 +1,161 @@
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Sequence, Union
+
+import numpy as np
+from transformers import PreTrainedTokenizerBase
+
+logger = logging.getLogger(__name__)
+
+CACHE_FORMAT_VERSION = 1
+
+
+def file_digest(path: Union[str, Path]) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def tokenizer_fingerprint(tokenizer: PreTrainedTokenizerBase) -> str:
+    """
+    Identifies the tokenizer by its full serialization (vocabulary, normalizer, ...) if it is a fast tokenizer,
+    otherwise by name and vocabulary size.
+    """
+    backend = getattr(tokenizer, "backend_tokenizer", None)
+    description = backend.to_str() if backend is not None else f"{tokenizer.name_or_path}:{len(tokenizer)}"
+    return hashlib.sha256(description.encode("utf-8")).hexdigest()
+
+
+class TokenizedFile(Sequence[Dict[str, Any]]):
+    """
+    Tokenized documents of one data file, backed by memory-mapped arrays. Entries are built on access in the layout
+    of ``AleNerDataModule.load_dataset``.
+
+    The tokens, offsets and labels of all documents are stored in flat arrays; the tokens of the i-th document are
+    ``document_offsets[i]:document_offsets[i + 1]``. Texts are kept as one UTF-8 blob. The attention mask of an
+    unpadded document is all ones and the token texts are looked up from the input ids, so neither is stored.
+    """
+
+    def __init__(self, directory: Path, token_text_function: Callable[[List[int]], List[str]]):
+        self.directory = directory
+        self.token_text_function = token_text_function
+        self.input_ids = self.load("input_ids")
+        self.offset_mapping = self.load("offset_mapping")
+        self.labels = self.load("labels")
+        self.document_offsets = self.load("document_offsets")
+        self.ids = self.load("ids")
+        self.has_id = self.load("has_id")
+        self.text_offsets = self.load("text_offsets")
+        self.texts = np.memmap(directory / "texts.bin", dtype=np.uint8, mode="r") \
+            if self.text_offsets[-1] > 0 else np.zeros(0, dtype=np.uint8)
+
+    def load(self, name: str) -> np.ndarray:
+        return np.load(self.directory / f"{name}.npy", mmap_mode="r")
+
+    def __len__(self) -> int:
+        return len(self.document_offsets) - 1
+
+    def get_id_index(self) -> Dict[int, int]:
+        """
+        Position of every document with an id, read from the id arrays without building the entries.
+        """
+        return dict(zip(self.ids[self.has_id].tolist(), np.flatnonzero(self.has_id).tolist()))
+
+    def __getitem__(self, index: int) -> Dict[str, Any]:
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        start, end = int(self.document_offsets[index]), int(self.document_offsets[index + 1])
+        input_ids = self.input_ids[start:end].tolist()
+        text = bytes(self.texts[self.text_offsets[index]:self.text_offsets[index + 1]]).decode("utf-8")
+        entry = {"tokens": {"input_ids": input_ids,
+                            "attention_mask": [1] * len(input_ids),
+                            "offset_mapping": [tuple(offset) for offset in self.offset_mapping[start:end].tolist()]},
+                 "labels": self.labels[start:end].tolist(),
+                 "text": text,
+                 "token_text": self.token_text_function(input_ids)}
+        if self.has_id[index]:
+            entry["id"] = int(self.ids[index])
+        return entry
+
+    @staticmethod
+    def write(directory: Path, entries: List[Dict[str, Any]]):
+        lengths = [len(entry["tokens"]["input_ids"]) for entry in entries]
+        document_offsets = np.zeros(len(entries) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=document_offsets[1:])
+        texts = [entry["text"].encode("utf-8") for entry in entries]
+        text_offsets = np.zeros(len(entries) + 1, dtype=np.int64)
+        np.cumsum([len(text) for text in texts], out=text_offsets[1:])
+
+        def flat(key: Callable[[Dict[str, Any]], Sequence], dtype, shape) -> np.ndarray:
+            arrays = [np.asarray(key(entry), dtype=dtype).reshape(shape) for entry in entries]
+            return np.concatenate(arrays) if arrays else np.zeros((0,) + shape[1:], dtype=dtype)
+
+        np.save(directory / "input_ids.npy", flat(lambda e: e["tokens"]["input_ids"], np.int32, (-1,)))
+        np.save(directory / "offset_mapping.npy", flat(lambda e: e["tokens"]["offset_mapping"], np.int32, (-1, 2)))
+        np.save(directory / "labels.npy", flat(lambda e: e["labels"], np.int32, (-1,)))
+        np.save(directory / "document_offsets.npy", document_offsets)
+        np.save(directory / "ids.npy", np.asarray([entry.get("id", -1) for entry in entries], dtype=np.int64))
+        np.save(directory / "has_id.npy", np.asarray(["id" in entry for entry in entries], dtype=bool))
+        np.save(directory / "text_offsets.npy", text_offsets)
+        with open(directory / "texts.bin", "wb") as f:
+            for text in texts:
+                f.write(text)
+
+
+class TokenizationCache:
+    """
+    Content addressed on-disk cache of tokenized data files.
+
+    The key covers the file content, the tokenizer (serialization and max. length), the label set and the columns,
+    thus all seeds, parallel runs and resumed runs with the same settings share one entry. Entries are written to a
+    temporary directory and renamed, so concurrent writers never expose partial entries.
+    """
+
+    def __init__(self, cache_dir: Union[str, Path], tokenizer: PreTrainedTokenizerBase, labels: List[str],
+                 text_column: str, label_column: str):
+        self.cache_dir = Path(cache_dir)
+        self.settings = {"version": CACHE_FORMAT_VERSION,
+                         "tokenizer": tokenizer_fingerprint(tokenizer),
+                         "max_length": tokenizer.model_max_length,
+                         "labels": list(labels),
+                         "text_column": text_column,
+                         "label_column": label_column}
+
+    def get_key(self, path: Union[str, Path]) -> str:
+        description = json.dumps({**self.settings, "file": file_digest(path)}, sort_keys=True)
+        return hashlib.sha256(description.encode("utf-8")).hexdigest()
+
+    def load(self, path: Union[str, Path], tokenize: Callable[[], List[Dict[str, Any]]],
+             token_text_function: Callable[[List[int]], List[str]]) -> TokenizedFile:
+        """
+        Returns the cached tokenization of the file. On a miss, ``tokenize`` is called and its entries are stored.
+        """
+        directory = self.cache_dir / self.get_key(path)
+        if directory.exists():
+            logger.info(f"Load tokenization of {path} from cache: {directory}")
+        else:
+            logger.info(f"Tokenize {path} and store it in cache: {directory}")
+            self.store(directory, tokenize())
+        return TokenizedFile(directory, token_text_function)
+
+    def store(self, directory: Path, entries: List[Dict[str, Any]]):
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        temp_dir = Path(tempfile.mkdtemp(prefix=f"{directory.name}.", dir=self.cache_dir))
+        try:
+            TokenizedFile.write(temp_dir, entries)
+            os.rename(temp_dir, directory)
+        except OSError:
+            if not directory.exists():
+                raise
+            # Another run stored the same entry in the meantime
+        finally:
+            shutil.rmtree(temp_dir, ignore_errors=True)
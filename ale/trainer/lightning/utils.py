@@ -1,6 +1,11 @@
+from typing import Any, Dict, List
+
+import numpy as np
 import torch
 import torchmetrics
 
+from ale.trainer.prediction_result import TokenPredictions
+
 
 def derive_labels(labels):
     def enumerate_v2(xs, start=0, step=1):
@@ -67,3 +72,73 @@ class LabelGeneralizer:
 
     def generalize_labels(self, labels):
         return self.mapping_tensor[labels]
+
+
+def sequence_mask(lengths: torch.Tensor, max_length: int) -> torch.Tensor:
+    """
+    Boolean (batch x max_length) mask which is True for the first ``lengths[i]`` positions of every row.
+    """
+    return torch.arange(max_length, device=lengths.device).unsqueeze(0) < lengths.unsqueeze(1)
+
+
+def tensor_prediction_output(batch, probabilities: torch.Tensor, predicted_label_ids: torch.Tensor) -> Dict[str, Any]:
+    """
+    Output of ``predict_step`` in tensor mode: everything stays padded and on the device of the model.
+
+    - probabilities: (batch x sequence x labels)
+    - predicted_label_ids: (batch x sequence)
+    - lengths: number of valid tokens per sequence
+    - gold_label_ids: (batch x sequence), only if the batch is labeled
+    """
+    result = {'tokens': batch['token_text'],
+              'probabilities': probabilities,
+              'predicted_label_ids': predicted_label_ids,
+              'lengths': batch['attention_mask'].sum(dim=1)}
+    if "labels" in batch:
+        result["gold_label_ids"] = batch["labels"]
+    return result
+
+
+def collect_token_predictions(keys: List[int], prediction_batches: List[Dict[str, Any]], id2label: Dict[int, str],
+                              with_gold_labels: bool = False) -> TokenPredictions:
+    """
+    Flattens the padded tensor outputs of ``predict_step`` into one columnar ``TokenPredictions`` container.
+    Padding is dropped on the device of the model, so there is a single host transfer per batch and tensor.
+    """
+    probabilities, predicted_label_ids, gold_label_ids, lengths, tokens = [], [], [], [], []
+
+    for single_batch in prediction_batches:
+        batch_probabilities = single_batch['probabilities']
+        mask = sequence_mask(single_batch['lengths'], batch_probabilities.size(1))
+        probabilities.append(batch_probabilities[mask].float().cpu().numpy())
+        predicted_label_ids.append(single_batch['predicted_label_ids'][mask].cpu().numpy())
+        lengths.append(single_batch['lengths'].cpu().numpy())
+        tokens.extend(single_batch['tokens'])
+        if with_gold_labels:
+            gold_label_ids.append(single_batch['gold_label_ids'][mask].cpu().numpy())
+
+    lengths = np.concatenate(lengths) if lengths else np.zeros(0, dtype=np.int64)
+    offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+
+    def concat(arrays, dtype, shape):
+        return np.concatenate(arrays).astype(dtype, copy=False) if arrays else np.zeros(shape, dtype=dtype)
+
+    return TokenPredictions(keys,
+                            concat(probabilities, np.float32, (0, len(id2label))),
+                            offsets,
+                            concat(predicted_label_ids, np.int64, (0,)),
+                            id2label,
+                            tokens=tokens,
+                            gold_label_ids=concat(gold_label_ids, np.int64, (0,)) if with_gold_labels else None)
+
+
+def mean_pooled_embeddings(model: torch.nn.Module, batch: Dict[str, Any]) -> torch.Tensor:
+    """
+    Mean of the last hidden states of the encoder (``model.model``) over the tokens of each document, shape
+    (documents, hidden size).
+    """
+    encoder = model.model.base_model
+    hidden_states = encoder(batch["input_ids"], attention_mask=batch["attention_mask"]).last_hidden_state
+    mask = batch["attention_mask"].unsqueeze(-1).to(hidden_states.dtype)
+    return (hidden_states * mask).sum(dim=1) / mask.sum(dim=1).clamp(min=1)
@@ -1,7 +1,50 @@
-from typing import Dict, Optional, Union, List
+from typing import Dict, Optional, Union, List, Mapping, Iterator, Sequence
+
+import numpy as np
+from ale.config import AggregationMethod
 from ale.teacher.teacher_utils import is_named_entity
 from pydantic import BaseModel
 
+GOLD_LABEL_PADDING_ID = -100
+GOLD_LABEL_PADDING = "<PAD>"
+
+
+def aggregate_segments(values: np.ndarray, offsets: np.ndarray, aggregation_method: AggregationMethod) -> np.ndarray:
+    """
+    Reduces the rows ``offsets[i]:offsets[i + 1]`` of ``values`` to one value per segment.
+    Works on 1d token scores as well as on 2d (tokens x labels) matrices. Empty segments are scored with 0.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    offsets = np.asarray(offsets, dtype=np.int64)
+    lengths = np.diff(offsets)
+    result = np.zeros((len(lengths),) + values.shape[1:], dtype=np.float64)
+
+    non_empty = lengths > 0
+    if not non_empty.any():
+        return result
+
+    # Empty segments are skipped, thus every start is followed by the start of the next non-empty segment.
+    starts = offsets[:-1][non_empty]
+    segment_lengths = lengths[non_empty].reshape((-1,) + (1,) * (values.ndim - 1))
+
+    if aggregation_method == AggregationMethod.MAXIMUM:
+        reduced = np.maximum.reduceat(values, starts, axis=0)
+    elif aggregation_method == AggregationMethod.MINIMUM:
+        reduced = np.minimum.reduceat(values, starts, axis=0)
+    elif aggregation_method == AggregationMethod.SUM:
+        reduced = np.add.reduceat(values, starts, axis=0)
+    elif aggregation_method == AggregationMethod.AVERAGE:
+        reduced = np.add.reduceat(values, starts, axis=0) / segment_lengths
+    elif aggregation_method == AggregationMethod.STD:
+        means = np.add.reduceat(values, starts, axis=0) / segment_lengths
+        deviations = values - np.repeat(means, lengths[non_empty], axis=0)
+        reduced = np.sqrt(np.add.reduceat(deviations * deviations, starts, axis=0) / segment_lengths)
+    else:
+        raise ValueError(f"Unknown aggregation method: {aggregation_method}")
+
+    result[non_empty] = reduced
+    return result
+
 
 class Span(BaseModel):
     start: int
@@ -91,3 +134,227 @@ class PredictionResult(BaseModel):
             label_confidences: List[LabelConfidence] = token_confidence.label_confidence
 
             return [conf.label for conf in label_confidences if is_named_entity(conf.label)]
+
+
+class TokenPredictions(Mapping[int, PredictionResult]):
+    """
+    Columnar container for the token level predictions of many documents.
+
+    The confidences of all tokens are stored in one flat float32 matrix of shape (tokens x labels). The tokens of the
+    i-th document are the rows ``offsets[i]:offsets[i + 1]``, the columns follow the order of ``id2label``.
+    Indexing the container by document id lazily builds a ``PredictionResult``, so teachers and hooks written against
+    ``Dict[int, PredictionResult]`` keep working without materializing the objects for the whole pool.
+    """
+
+    def __init__(self,
+                 ids: Sequence[int],
+                 probabilities: np.ndarray,
+                 offsets: np.ndarray,
+                 predicted_label_ids: np.ndarray,
+                 id2label: Dict[int, str],
+                 tokens: Optional[List[List[str]]] = None,
+                 gold_label_ids: Optional[np.ndarray] = None):
+        self.ids = np.asarray(ids, dtype=np.int64)
+        self.probabilities = np.asarray(probabilities, dtype=np.float32).reshape(-1, len(id2label))
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.predicted_label_ids = np.asarray(predicted_label_ids, dtype=np.int64)
+        self.id2label: Dict[int, str] = {int(idx): label for idx, label in id2label.items()}
+        self.tokens = tokens
+        self.gold_label_ids = None if gold_label_ids is None else np.asarray(gold_label_ids, dtype=np.int64)
+
+        if sorted(self.id2label.keys()) != list(range(len(self.id2label))):
+            raise ValueError(f"Label ids must be consecutive and start at 0, got: {sorted(self.id2label.keys())}")
+        if len(self.offsets) != len(self.ids) + 1:
+            raise ValueError(f"Expected {len(self.ids) + 1} offsets for {len(self.ids)} documents, "
+                             f"got {len(self.offsets)}")
+        if self.offsets[-1] != len(self.probabilities) or len(self.predicted_label_ids) != len(self.probabilities):
+            raise ValueError("Offsets, probabilities and predicted labels must cover the same number of tokens")
+
+        self.row_by_id: Dict[int, int] = {int(idx): row for row, idx in enumerate(self.ids)}
+
+    @classmethod
+    def from_sequences(cls,
+                       ids: Sequence[int],
+                       probabilities: Sequence[np.ndarray],
+                       predicted_label_ids: Sequence[np.ndarray],
+                       id2label: Dict[int, str],
+                       tokens: Optional[List[List[str]]] = None,
+                       gold_label_ids: Optional[Sequence[np.ndarray]] = None) -> "TokenPredictions":
+        """
+        Builds the container from one (tokens x labels) probability array per document.
+        """
+        lengths = [len(p) for p in predicted_label_ids]
+        offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        num_labels = len(id2label)
+
+        def concat(arrays, dtype, shape):
+            if len(arrays) == 0:
+                return np.zeros(shape, dtype=dtype)
+            return np.concatenate([np.asarray(a, dtype=dtype).reshape((-1,) + shape[1:]) for a in arrays])
+
+        return cls(ids,
+                   concat(probabilities, np.float32, (0, num_labels)),
+                   offsets,
+                   concat(predicted_label_ids, np.int64, (0,)),
+                   id2label,
+                   tokens=tokens,
+                   gold_label_ids=None if gold_label_ids is None else concat(gold_label_ids, np.int64, (0,)))
+
+    @classmethod
+    def concatenate(cls, parts: Sequence["TokenPredictions"]) -> "TokenPredictions":
+        """
+        Joins containers with the same labels, e.g. predictions of several batches or shards, in the given order.
+        Tokens and gold labels are kept if all parts provide them.
+        """
+        if len(parts) == 0:
+            raise ValueError("At least one prediction container is required")
+        id2label = parts[0].id2label
+        if any(part.id2label != id2label for part in parts):
+            raise ValueError("Only predictions with the same labels can be concatenated")
+
+        lengths = np.concatenate([part.get_lengths() for part in parts])
+        offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        with_tokens = all(part.tokens is not None for part in parts)
+        with_gold = all(part.gold_label_ids is not None for part in parts)
+
+        return cls(np.concatenate([part.ids for part in parts]),
+                   np.concatenate([part.probabilities for part in parts]),
+                   offsets,
+                   np.concatenate([part.predicted_label_ids for part in parts]),
+                   id2label,
+                   tokens=[tokens for part in parts for tokens in part.tokens] if with_tokens else None,
+                   gold_label_ids=np.concatenate([part.gold_label_ids for part in parts]) if with_gold else None)
+
+    @classmethod
+    def from_prediction_results(cls, predictions: Mapping[int, PredictionResult]) -> "TokenPredictions":
+        """
+        Converts token level prediction results into the columnar layout. The label order is taken from the first
+        token; every token has to provide a confidence for each of these labels.
+        """
+        if isinstance(predictions, TokenPredictions):
+            return predictions
+
+        id2label: Dict[int, str] = {}
+        for prediction in predictions.values():
+            if prediction.ner_confidences_token:
+                first_token = prediction.ner_confidences_token[0]
+                id2label = {idx: conf.label for idx, conf in enumerate(first_token.label_confidence)}
+                break
+        label2id = {label: idx for idx, label in id2label.items()}
+
+        probabilities, predicted, gold, tokens = [], [], [], []
+        has_gold = True
+        for prediction in predictions.values():
+            token_confidences = prediction.ner_confidences_token
+            doc_probabilities = np.zeros((len(token_confidences), len(id2label)), dtype=np.float32)
+            for row, token in enumerate(token_confidences):
+                for label_confidence in token.label_confidence:
+                    doc_probabilities[row, label2id[label_confidence.label]] = label_confidence.confidence
+            doc_predicted = doc_probabilities.argmax(axis=1) if len(token_confidences) else np.zeros(0, np.int64)
+            for row, token in enumerate(token_confidences):
+                if token.predicted_label:
+                    doc_predicted[row] = label2id[token.predicted_label]
+            has_gold = has_gold and all(token.gold_label is not None for token in token_confidences)
+            gold.append([label2id.get(token.gold_label, GOLD_LABEL_PADDING_ID) for token in token_confidences])
+            probabilities.append(doc_probabilities)
+            predicted.append(doc_predicted)
+            tokens.append([token.text for token in token_confidences])
+
+        return cls.from_sequences(list(predictions.keys()), probabilities, predicted, id2label,
+                                  tokens=tokens, gold_label_ids=gold if has_gold else None)
+
+    @property
+    def labels(self) -> List[str]:
+        """
+        Label names in column order of the probability matrix.
+        """
+        return [self.id2label[idx] for idx in range(len(self.id2label))]
+
+    def get_lengths(self) -> np.ndarray:
+        return np.diff(self.offsets)
+
+    def get_row(self, idx: int) -> int:
+        if idx not in self.row_by_id:
+            raise KeyError(idx)
+        return self.row_by_id[idx]
+
+    def get_token_slice(self, idx: int) -> slice:
+        row = self.get_row(idx)
+        return slice(int(self.offsets[row]), int(self.offsets[row + 1]))
+
+    def get_probabilities(self, idx: int) -> np.ndarray:
+        return self.probabilities[self.get_token_slice(idx)]
+
+    def get_predicted_label_ids(self, idx: int) -> np.ndarray:
+        return self.predicted_label_ids[self.get_token_slice(idx)]
+
+    def get_sequence_log_probabilities(self) -> np.ndarray:
+        """
+        Log probability of the predicted label sequence per document, taken as the product of the highest token
+        confidences. This is exact for models with independent token predictions (softmax), for a CRF it is only an
+        approximation of P(y*|x).
+        """
+        log_confidences = np.log(np.maximum(self.probabilities.max(axis=1, initial=0), np.finfo(np.float32).tiny))
+        return aggregate_segments(log_confidences, self.offsets, AggregationMethod.SUM)
+
+    def select(self, ids: Sequence[int]) -> "TokenPredictions":
+        """
+        Returns a new container holding the given documents in the given order.
+        """
+        return self.select_rows([self.get_row(int(idx)) for idx in ids])
+
+    def select_rows(self, rows: Sequence[int]) -> "TokenPredictions":
+        """
+        Like ``select``, but by document position. Also works for containers with duplicate ids.
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        lengths = self.get_lengths()[rows]
+        offsets = np.zeros(len(rows) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        # Position of every selected token in the current token matrix
+        token_rows = np.repeat(self.offsets[:-1][rows] - offsets[:-1], lengths) + np.arange(offsets[-1])
+
+        return TokenPredictions(self.ids[rows],
+                                self.probabilities[token_rows],
+                                offsets,
+                                self.predicted_label_ids[token_rows],
+                                self.id2label,
+                                tokens=[self.tokens[row] for row in rows] if self.tokens is not None else None,
+                                gold_label_ids=self.gold_label_ids[token_rows]
+                                if self.gold_label_ids is not None else None)
+
+    def get_prediction_result(self, idx: int) -> PredictionResult:
+        token_slice = self.get_token_slice(idx)
+        row = self.get_row(idx)
+        labels = self.labels
+        probabilities = self.probabilities[token_slice].tolist()
+        predicted = self.predicted_label_ids[token_slice].tolist()
+        gold = self.gold_label_ids[token_slice].tolist() if self.gold_label_ids is not None else None
+        token_texts = self.tokens[row] if self.tokens is not None else [""] * len(predicted)
+
+        prediction_result = PredictionResult()
+        for position, (text, confidences, predicted_id) in enumerate(zip(token_texts, probabilities, predicted)):
+            gold_label = None
+            if gold is not None:
+                gold_label = self.id2label.get(gold[position], GOLD_LABEL_PADDING)
+            prediction_result.ner_confidences_token.append(
+                TokenConfidence(text=text,
+                                label_confidence=[LabelConfidence(label=label, confidence=conf)
+                                                  for label, conf in zip(labels, confidences)],
+                                gold_label=gold_label,
+                                predicted_label=self.id2label[predicted_id]))
+        return prediction_result
+
+    def __getitem__(self, idx: int) -> PredictionResult:
+        return self.get_prediction_result(idx)
+
+    def __contains__(self, idx) -> bool:
+        return idx in self.row_by_id
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(self.row_by_id)
+
+    def __len__(self) -> int:
+        return len(self.ids)
@@ -0,0 +1,57 @@
+import logging
+from typing import Dict, List, Mapping, Optional, Sequence
+
+from torch.utils.data import DataLoader
+
+from ale.trainer.prediction_result import PredictionResult, TokenPredictions
+
+logger = logging.getLogger(__name__)
+
+
+class PredictionSession:
+    """
+    Predictions of one model version, shared by the hooks and the teacher of an AL cycle.
+
+    Labeled splits (predicted with gold labels) and pool ids are requested first, ``run`` serves all requests with a
+    single call of ``PredictionTrainer.predict_shared``. Until the model changes, the trainer answers predictions for
+    the requested pool ids from the session.
+    """
+
+    def __init__(self, trainer):
+        self.trainer = trainer
+        self.labeled_requests: Dict[str, DataLoader] = {}
+        self.pool_ids: List[int] = []
+        self.labeled_predictions: Dict[str, Mapping[int, PredictionResult]] = {}
+        self.pool_predictions: Optional[Mapping[int, PredictionResult]] = None
+
+    def request_labeled(self, split: str, data_loader: DataLoader):
+        self.labeled_requests[split] = data_loader
+
+    def request_pool(self, ids: Sequence[int]):
+        requested = set(self.pool_ids)
+        self.pool_ids.extend(idx for idx in ids if idx not in requested)
+
+    def has_requests(self) -> bool:
+        return len(self.labeled_requests) > 0 or len(self.pool_ids) > 0
+
+    def run(self):
+        if not self.has_requests():
+            return
+        logger.info(f"Predict {', '.join(self.labeled_requests.keys()) or 'no'} labeled splits "
+                    f"and {len(self.pool_ids)} pool documents in one pass")
+        self.labeled_predictions, self.pool_predictions = self.trainer.predict_shared(self.labeled_requests,
+                                                                                      self.pool_ids)
+
+    def get_labeled_predictions(self, split: str) -> Optional[Mapping[int, PredictionResult]]:
+        return self.labeled_predictions.get(split)
+
+    def get_pool_predictions(self, ids: Sequence[int]) -> Optional[Mapping[int, PredictionResult]]:
+        """
+        Returns the predictions of the given pool ids in the given order, or None if not all of them were predicted
+        in this session.
+        """
+        if self.pool_predictions is None or not all(idx in self.pool_predictions for idx in ids):
+            return None
+        if isinstance(self.pool_predictions, TokenPredictions):
+            return self.pool_predictions.select(ids)
+        return {idx: self.pool_predictions[idx] for idx in ids}
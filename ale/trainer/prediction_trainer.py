@@ -1,4 +1,10 @@
+from typing import Dict, Mapping, Optional, Sequence, Tuple
+
+from torch.utils.data import DataLoader
+
 from ale.trainer.base_trainer import BaseTrainer
+from ale.trainer.prediction_result import PredictionResult
+from ale.trainer.prediction_session import PredictionSession
 from ale.trainer.predictor import Predictor
 
 
@@ -6,3 +12,25 @@ class PredictionTrainer(BaseTrainer, Predictor):
     """
     Trainer for prediction tasks.
     """
+    prediction_session: Optional[PredictionSession] = None
+
+    def open_prediction_session(self) -> PredictionSession:
+        """
+        Starts a prediction session for the current model. It stays active until the model changes.
+        """
+        self.prediction_session = PredictionSession(self)
+        return self.prediction_session
+
+    def close_prediction_session(self):
+        self.prediction_session = None
+
+    def predict_shared(self, labeled: Dict[str, DataLoader], pool_ids: Sequence[int]) \
+            -> Tuple[Dict[str, Mapping[int, PredictionResult]], Optional[Mapping[int, PredictionResult]]]:
+        """
+        Predicts labeled splits (with gold labels) and pool documents with the current model.
+        The default implementation runs one prediction per request.
+        """
+        labeled_predictions = {split: self.predict_with_known_gold_labels(data_loader)
+                               for split, data_loader in labeled.items()}
+        pool_predictions = self.predict(pool_ids) if len(pool_ids) > 0 else None
+        return labeled_predictions, pool_predictions
@@ -1,7 +1,9 @@
 from abc import ABC, abstractmethod
-from typing import Dict
+from typing import Dict, Iterator, Mapping, Sequence, Tuple, Union
 
-from ale.trainer.prediction_result import PredictionResult
+import numpy as np
+
+from ale.trainer.prediction_result import PredictionResult, TokenPredictions
 
 
 class Predictor(ABC):
@@ -10,5 +12,28 @@ class Predictor(ABC):
     """
 
     @abstractmethod
-    def predict(self, docs: Dict[int, str]) -> Dict[int, PredictionResult]:
+    def predict(self, docs: Union[Dict[int, str], Sequence[int]]) -> Mapping[int, PredictionResult]:
+        """
+        Predicts the given documents, passed either as id to text mapping or as ids of corpus documents.
+        NER trainers may return a columnar ``TokenPredictions`` container, which behaves like a read-only dict of
+        prediction results.
+        """
         ...
+
+    def predict_batches(self, docs: Union[Dict[int, str], Sequence[int]]) -> Iterator[Mapping[int, PredictionResult]]:
+        """
+        Predicts the given documents and yields the predictions batch by batch, so callers only hold one batch at
+        once. The default implementation yields all predictions as a single batch.
+        """
+        yield self.predict(docs)
+
+    def predict_sequence_log_probabilities(self, docs: Union[Dict[int, str], Sequence[int]]) \
+            -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+        """
+        Yields (ids, log probabilities) batch by batch: log P(y*|x) of the most likely label sequence per document.
+        The default implementation derives it from the token predictions (see
+        ``TokenPredictions.get_sequence_log_probabilities``); CRF trainers compute it exactly.
+        """
+        for predictions in self.predict_batches(docs):
+            token_predictions = TokenPredictions.from_prediction_results(predictions)
+            yield token_predictions.ids, token_predictions.get_sequence_log_probabilities()
@@ -0,0 +1,69 @@
+from ale.import_helper import import_registrable_components
+
+import_registrable_components()
+
+import pytest
+
+from ale.corpus.annotation_state import AnnotationState
+
+
+def test_increments_update_membership_and_counts():
+    state = AnnotationState([5, 3, 9, 7])
+
+    state.add([9, 5])
+
+    assert 9 in state and 5 in state
+    assert 3 not in state and 42 not in state
+    assert len(state) == 2
+    assert state.num_not_annotated == 2
+    assert state.annotated_ids == [9, 5]
+    assert state.get_not_annotated_ids() == [3, 7]
+
+
+def test_duplicates_and_unknown_ids_are_rejected():
+    state = AnnotationState([1, 2, 3])
+    state.add([1])
+
+    with pytest.raises(ValueError):
+        state.add([2, 1])
+    with pytest.raises(ValueError):
+        state.add([2, 2])
+    with pytest.raises(ValueError):
+        state.add([4])
+    assert state.annotated_ids == [1]
+
+
+def test_reset():
+    state = AnnotationState([1, 2, 3])
+    state.add([1, 2])
+
+    state.reset([3])
+
+    assert state.annotated_ids == [3]
+    assert state.get_not_annotated_ids() == [1, 2]
+
+
+def test_invalid_reset_keeps_the_annotations():
+    state = AnnotationState([1, 2, 3])
+    state.add([1, 2])
+
+    with pytest.raises(ValueError):
+        state.reset([3, 4])
+    with pytest.raises(ValueError):
+        state.reset([3, 3])
+
+    assert state.annotated_ids == [1, 2]
+    assert 1 in state and 3 not in state
+
+
+def test_version_and_not_annotated_cover():
+    state = AnnotationState([1, 2, 3, 4])
+    state.add([2])
+    assert state.version == 0
+    assert state.covers_not_annotated([4, 1, 3])
+    assert not state.covers_not_annotated([1, 3])
+    assert not state.covers_not_annotated([1, 2, 3])
+    assert not state.covers_not_annotated([1, 1, 3])
+
+    state.reset([2])
+    assert state.version == 1
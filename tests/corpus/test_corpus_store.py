@@ -0,0 +1,44 @@
+from ale.import_helper import import_registrable_components
+
+import_registrable_components()
+
+import pytest
+import srsly
+
+from ale.corpus.corpus_store import CorpusStore, open_store
+
+
+def write_corpus(path):
+    entries = [{"id": 7, "text": "Hällo Berlin", "tokens": ["Hällo", "Berlin"], "labels": [[6, 12, "LOC"]]},
+               {"id": 2, "text": "Paris", "tokens": ["Paris"], "labels": [[0, 5, "LOC"]]},
+               {"id": 5, "text": "nothing", "tokens": ["nothing"], "labels": []}]
+    srsly.write_jsonl(path, entries)
+    with open(path, "a") as f:
+        f.write("\n")
+    return entries
+
+
+def test_random_access_by_id(tmp_path):
+    entries = write_corpus(tmp_path / "train.jsonl")
+    store = CorpusStore(tmp_path / "train.jsonl")
+
+    assert len(store) == 3
+    assert store.get_ids() == [7, 2, 5]
+    assert store[2] == entries[1]
+    assert store.get_column(7, "text") == "Hällo Berlin"
+    assert 5 in store and 3 not in store
+    with pytest.raises(KeyError):
+        store[3]
+
+
+def test_views(tmp_path):
+    write_corpus(tmp_path / "train.jsonl")
+    store = open_store(tmp_path / "train.jsonl")
+
+    assert open_store(tmp_path / "train.jsonl") is store
+    assert dict(store.view("tokens")) == {7: ["Hällo", "Berlin"], 2: ["Paris"], 5: ["nothing"]}
+    restricted = store.view("text", ids=[5, 2])
+    assert list(restricted.items()) == [(5, "nothing"), (2, "Paris")]
+    assert 7 not in restricted
+    with pytest.raises(KeyError):
+        restricted[7]
@@ -0,0 +1,40 @@
+from ale.import_helper import import_registrable_components
+
+import_registrable_components()
+
+from typing import Dict, List
+
+import pytest
+
+from ale.config import AppConfig
+from ale.corpus.corpus import Corpus
+
+
+class SimpleCorpus(Corpus):
+    """
+    In-memory corpus of the given texts by id.
+    """
+
+    def __init__(self, texts: Dict[int, str], cfg: AppConfig = None):
+        super().__init__(cfg, ".")
+        self.texts = texts
+
+    def get_trainable_corpus(self):
+        pass
+
+    def get_all_texts_with_ids(self) -> Dict[int, str]:
+        return self.texts
+
+    def get_text_by_ids(self, idxs: List[int]) -> Dict[int, str]:
+        return {idx: self.texts[idx] for idx in idxs}
+
+    def get_all_tokens(self):
+        pass
+
+
+@pytest.fixture
+def simple_corpus():
+    """
+    Factory of in-memory corpora: ``simple_corpus(texts, cfg=None)``.
+    """
+    return SimpleCorpus
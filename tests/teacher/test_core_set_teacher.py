@@ -0,0 +1,50 @@
+from ale.import_helper import import_registrable_components
+
+import_registrable_components()
+
+from types import SimpleNamespace
+
+from ale.config import NLPTask, TeacherConfig
+from ale.corpus.corpus import Corpus
+from ale.teacher.exploration.core_set import CoreSetTeacher
+
+TEXTS = {
+    10: "apple banana",
+    11: "apple banana cherry",
+    12: "car engine",
+    13: "car engine wheel",
+    14: "river lake",
+    15: "river lake boat sail",
+}
+
+
+def create_corpus(simple_corpus) -> Corpus:
+    return simple_corpus(TEXTS, SimpleNamespace(teacher=TeacherConfig(strategy="core-set", sampling_budget=100)))
+
+
+def create_teacher(corpus: Corpus) -> CoreSetTeacher:
+    return CoreSetTeacher(corpus=corpus, predictor=None, seed=42, labels=["O"], nlp_task=NLPTask.NER)
+
+
+def test_initial_proposal_covers_the_topics(simple_corpus):
+    corpus = create_corpus(simple_corpus)
+    teacher = create_teacher(corpus)
+
+    proposed = teacher.propose(corpus.get_not_annotated_data_points_ids(), 3, 100)
+
+    # The first candidate starts, then one document of each unrelated topic
+    assert proposed == [10, 12, 14]
+
+
+def test_proposal_after_increment_takes_the_farthest_document(simple_corpus):
+    corpus = create_corpus(simple_corpus)
+    teacher = create_teacher(corpus)
+    corpus.add_increment(teacher.propose(corpus.get_not_annotated_data_points_ids(), 3, 100))
+
+    proposed = teacher.propose(corpus.get_not_annotated_data_points_ids(), 1, 100)
+
+    # "river lake boat sail" shares the smallest part of its words with its closest annotated document
+    assert proposed == [15]
+    # A step size beyond the pool proposes every remaining document once
+    proposed = teacher.propose(corpus.get_not_annotated_data_points_ids(), 5, 100)
+    assert proposed[0] == 15 and sorted(proposed) == [11, 13, 15]
@@ -0,0 +1,56 @@
+from ale.import_helper import import_registrable_components
+
+import_registrable_components()
+
+import numpy as np
+
+from ale.teacher.exploration.utils.embedding_store import EmbeddingStore
+
+
+class CountingEncoder:
+    def __init__(self):
+        self.encoded = []
+
+    def __call__(self, texts):
+        self.encoded.extend(texts)
+        return np.array([[len(text), text.count("a"), 1.0] for text in texts], dtype=np.float32)
+
+
+def test_texts_are_encoded_once(tmp_path):
+    encoder = CountingEncoder()
+    store = EmbeddingStore(tmp_path, "model")
+
+    first = store.encode(["banana", "apple", "banana"], encoder)
+    second = EmbeddingStore(tmp_path, "model").encode(["cherry", "apple", "banana"], encoder)
+
+    assert sorted(encoder.encoded) == ["apple", "banana", "cherry"]
+    np.testing.assert_array_equal(first, encoder(["banana", "apple", "banana"]))
+    np.testing.assert_array_equal(second, encoder(["cherry", "apple", "banana"]))
+
+
+def test_settings_are_part_of_the_key(tmp_path):
+    encoder = CountingEncoder()
+    EmbeddingStore(tmp_path, "model").encode(["apple"], encoder)
+
+    normalized = EmbeddingStore(tmp_path, "model", normalize=True).encode(["apple"], encoder)
+    EmbeddingStore(tmp_path, "other-model").encode(["apple"], encoder)
+
+    assert encoder.encoded == ["apple"] * 3
+    np.testing.assert_allclose(np.linalg.norm(normalized, axis=1), 1.0, rtol=1e-6)
+
+
+def test_least_recently_used_shards_are_evicted(tmp_path):
+    encoder = CountingEncoder()
+    store = EmbeddingStore(tmp_path, "model", dtype="float16", max_size_bytes=400)
+
+    store.encode(["apple"], encoder)
+    store.encode(["banana"], encoder)
+    store.encode(["cherry"], encoder)
+    assert len(store.get_shards()) < 3
+
+    encoder.encoded.clear()
+    result = store.encode(["apple", "cherry"], encoder)
+
+    assert encoder.encoded == ["apple"]
+    assert result.dtype == np.float32
+    np.testing.assert_array_equal(result, encoder(["apple", "cherry"]))
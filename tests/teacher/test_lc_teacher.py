@@ -5,6 +5,7 @@ from ale.import_helper import import_registrable_components
 from ale.teacher.exploitation.aggregation_methods import AggregationMethod
 from ale.teacher.exploitation.least_confidence import LeastConfidenceTeacher
 from ale.trainer.prediction_result import PredictionResult, TokenConfidence, LabelConfidence
+from ale.trainer.predictor import Predictor
 
 import_registrable_components()
 
@@ -88,3 +89,35 @@ def test_lc_for_ner_sum(prediction_results: Dict[int, PredictionResult]):
 
     out_ids: List[int] = lc_teacher.compute_function(prediction_results, 2)
     assert out_ids == [1, 2]
+
+
+class BatchPredictor(Predictor):
+    def __init__(self, predictions: Dict[int, PredictionResult], batch_size: int):
+        self.predictions = predictions
+        self.batch_size = batch_size
+
+    def predict(self, docs):
+        return {idx: self.predictions[idx] for idx in docs}
+
+    def predict_batches(self, docs):
+        docs = list(docs)
+        for start in range(0, len(docs), self.batch_size):
+            yield self.predict(docs[start:start + self.batch_size])
+
+
+def test_lc_propose_streaming(prediction_results: Dict[int, PredictionResult]):
+    lc_teacher: LeastConfidenceTeacher = LeastConfidenceTeacher(None, BatchPredictor(prediction_results, 1), 0,
+                                                                LABELS, NLPTask.NER, AggregationMethod.MINIMUM)
+
+    out_ids: List[int] = lc_teacher.propose_top_k([0, 1, 2], 2, lc_teacher.score_ner)
+    assert out_ids == lc_teacher.compute_function(prediction_results, 2)
+
+
+def test_lc_candidates_are_drawn_once():
+    lc_teacher: LeastConfidenceTeacher = LeastConfidenceTeacher(None, None, 0, LABELS, NLPTask.NER,
+                                                                AggregationMethod.MINIMUM)
+    potential_ids = list(range(100))
+
+    candidates = lc_teacher.prediction_candidates(potential_ids, 2, 10)
+    assert lc_teacher.prediction_candidates(potential_ids, 2, 10) == candidates
+    assert len(lc_teacher.prediction_candidates(potential_ids[1:], 2, 10)) == 10
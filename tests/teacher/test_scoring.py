@@ -0,0 +1,54 @@
+import numpy as np
+import pytest
+
+from ale.import_helper import import_registrable_components
+from ale.teacher.exploitation.aggregation_methods import AggregationMethod
+from ale.teacher.exploitation.scoring import aggregate_segments, token_entropy, token_margin, select_top_k, \
+    TopKCollector
+
+import_registrable_components()
+
+
+def test_aggregate_segments():
+    values = np.array([0.5, 0.5, 0.8, 0.4, 0.2])
+    offsets = np.array([0, 3, 3, 5])
+
+    np.testing.assert_allclose(aggregate_segments(values, offsets, AggregationMethod.MINIMUM), [0.5, 0.0, 0.2])
+    np.testing.assert_allclose(aggregate_segments(values, offsets, AggregationMethod.MAXIMUM), [0.8, 0.0, 0.4])
+    np.testing.assert_allclose(aggregate_segments(values, offsets, AggregationMethod.SUM), [1.8, 0.0, 0.6])
+    np.testing.assert_allclose(aggregate_segments(values, offsets, AggregationMethod.AVERAGE), [0.6, 0.0, 0.3])
+    np.testing.assert_allclose(aggregate_segments(values, offsets, AggregationMethod.STD),
+                               [np.std([0.5, 0.5, 0.8]), 0.0, np.std([0.4, 0.2])])
+
+
+def test_token_kernels():
+    probabilities = np.array([[0.2, 0.3, 0.5], [1.0, 0.0, 0.0]])
+
+    np.testing.assert_allclose(token_margin(probabilities), [0.2, 1.0])
+    np.testing.assert_allclose(token_entropy(probabilities), [-sum(p * np.log(p) for p in [0.2, 0.3, 0.5]), 0.0])
+
+    with pytest.raises(ValueError):
+        token_margin(probabilities[:, :1])
+
+
+def test_select_top_k():
+    ids = [10, 11, 12, 13]
+    scores = [0.3, 0.1, 0.3, np.nan]
+
+    assert select_top_k(ids, scores, 2) == [11, 10]
+    assert select_top_k(ids, scores, 3, largest=True) == [10, 12, 11]
+    assert select_top_k(ids, scores, 10) == [11, 10, 12, 13]
+    assert select_top_k(ids, scores, 0) == []
+
+
+def test_top_k_collector_matches_select_top_k():
+    rng = np.random.default_rng(0)
+    ids = rng.permutation(100).tolist()
+    scores = rng.integers(0, 10, size=100).astype(float)
+
+    for largest in [False, True]:
+        collector = TopKCollector(7, ids, largest=largest)
+        for start in range(0, 100, 13):
+            collector.add(ids[start:start + 13], scores[start:start + 13])
+
+        assert collector.get_top_k() == select_top_k(ids, scores, 7, largest=largest)
@@ -0,0 +1,47 @@
+from ale.import_helper import import_registrable_components
+
+import_registrable_components()
+
+from typing import Dict, List
+
+import numpy as np
+
+from ale.config import NLPTask
+from ale.teacher.exploitation.sequence_least_confidence import SequenceLeastConfidenceTeacher
+from ale.trainer.prediction_result import PredictionResult, TokenPredictions
+from ale.trainer.predictor import Predictor
+
+ID2LABEL = {0: "O", 1: "B-PER", 2: "I-PER"}
+
+
+class TokenPredictor(Predictor):
+    def __init__(self, highest_confidences: Dict[int, List[float]]):
+        self.highest_confidences = highest_confidences
+
+    def predict(self, docs):
+        ids = list(docs)
+        probabilities = [np.array([[c, 1 - c, 0.0] for c in self.highest_confidences[idx]]) for idx in ids]
+        return TokenPredictions.from_sequences(ids, probabilities, [np.zeros(len(p)) for p in probabilities],
+                                               ID2LABEL)
+
+
+class SequencePredictor(TokenPredictor):
+    def predict_sequence_log_probabilities(self, docs):
+        docs = list(docs)
+        yield np.array(docs), np.log([0.1 * (idx + 1) for idx in docs])
+
+
+def test_sequence_lc_from_token_predictions():
+    predictor = TokenPredictor({0: [0.5, 0.5, 0.8], 1: [0.9, 0.9, 0.9], 2: [0.6], 3: [0.9]})
+    teacher = SequenceLeastConfidenceTeacher(None, predictor, 0, ["PER"], NLPTask.NER)
+
+    np.testing.assert_allclose(predictor.predict([0, 2]).get_sequence_log_probabilities(), np.log([0.2, 0.6]))
+    assert teacher.propose([0, 1, 2, 3], 2, 4) == [0, 2]
+    assert teacher.compute_function(predictor.predict([0, 1, 2, 3]), 2) == [0, 2]
+    assert teacher.prediction_candidates([0, 1, 2, 3], 2, 4) is None
+
+
+def test_sequence_lc_uses_sequence_probabilities():
+    teacher = SequenceLeastConfidenceTeacher(None, SequencePredictor({}), 0, ["PER"], NLPTask.NER)
+
+    assert teacher.propose([3, 1, 2, 0], 3, 4) == [0, 1, 2]
@@ -0,0 +1,99 @@
+from ale.import_helper import import_registrable_components
+
+import_registrable_components()
+
+import numpy as np
+import pytest
+import scipy.sparse as sp
+from sklearn.metrics.pairwise import cosine_similarity
+
+from ale.teacher.exploration.utils.embedding_helper import EmbeddingHelper
+from ale.teacher.exploration.utils.similarity import CentroidSimilarity, CosineSimilarity, MaxSimilarityTracker, \
+    k_center_greedy
+
+
+@pytest.mark.parametrize("sparse", [False, True])
+def test_reductions_match_dense_matrix(sparse):
+    rng = np.random.default_rng(0)
+    embeddings = rng.random((30, 8)) * (rng.random((30, 8)) > 0.5)
+    embeddings[:, 0] += 0.1
+    dense_similarities = cosine_similarity(embeddings)
+    rows, columns = [3, 7, 0, 29, 12], list(range(5, 30, 2))
+    # Blocks of a few similarities to force chunking
+    similarities = CosineSimilarity(sp.csr_matrix(embeddings) if sparse else embeddings, max_block_bytes=24)
+
+    np.testing.assert_allclose(similarities.block(rows, columns), dense_similarities[np.ix_(rows, columns)],
+                               rtol=1e-5, atol=1e-6)
+    np.testing.assert_allclose(similarities.reduce(rows, columns, "max"),
+                               dense_similarities[np.ix_(rows, columns)].max(axis=1), rtol=1e-5)
+    np.testing.assert_allclose(similarities.reduce(rows, columns, "mean"),
+                               dense_similarities[np.ix_(rows, columns)].mean(axis=1), rtol=1e-5)
+    assert sp.issparse(similarities.embeddings) == sparse
+
+
+def test_centroids_follow_annotations(simple_corpus):
+    rng = np.random.default_rng(1)
+    embeddings = rng.normal(size=(12, 4))
+    corpus = simple_corpus({idx: str(idx) for idx in range(100, 112)})
+    embedding_helper = EmbeddingHelper(corpus, lambda texts: embeddings)
+    similarities = CosineSimilarity(embeddings)
+    centroids = CentroidSimilarity(similarities, corpus, embedding_helper)
+    rows = [0, 5, 11]
+
+    for increment in [[103, 107], [100], [111, 104, 105]]:
+        corpus.add_increment(increment)
+        annotated = embedding_helper.get_embedding_indices_for_doc_ids(corpus.get_annotated_data_points_ids())
+        not_annotated = embedding_helper.get_embedding_indices_for_doc_ids(
+            corpus.get_not_annotated_data_points_ids())
+
+        np.testing.assert_allclose(centroids.mean_similarity_to_annotated(rows),
+                                   similarities.reduce(rows, annotated, "mean"), rtol=1e-5, atol=1e-6)
+        np.testing.assert_allclose(centroids.mean_similarity_to_not_annotated(rows),
+                                   similarities.reduce(rows, not_annotated, "mean"), rtol=1e-5, atol=1e-6)
+
+    corpus.relevant_ids = [101]
+    np.testing.assert_allclose(centroids.mean_similarity_to_annotated(rows), similarities.block(rows, [1])[:, 0],
+                               rtol=1e-5, atol=1e-6)
+
+
+def test_max_similarities_follow_annotations(simple_corpus):
+    rng = np.random.default_rng(2)
+    embeddings = sp.csr_matrix(rng.random((15, 6)) * (rng.random((15, 6)) > 0.4) + np.eye(15, 6))
+    corpus = simple_corpus({idx: str(idx) for idx in range(15)})
+    embedding_helper = EmbeddingHelper(corpus, lambda texts: embeddings)
+    similarities = CosineSimilarity(embeddings, max_block_bytes=16)
+    tracker = MaxSimilarityTracker(similarities, corpus, embedding_helper)
+    rows = list(range(15))
+
+    for increment in [[4], [0, 9], [14, 2, 7]]:
+        corpus.add_increment(increment)
+
+        np.testing.assert_allclose(tracker.max_similarity_to_annotated(rows),
+                                   similarities.reduce(rows, corpus.get_annotated_data_points_ids(), "max"),
+                                   rtol=1e-6)
+
+    corpus.relevant_ids = [3]
+    np.testing.assert_allclose(tracker.max_similarity_to_annotated(rows), similarities.block(rows, [3])[:, 0],
+                               rtol=1e-6)
+
+
+@pytest.mark.parametrize("num_centers", [0, 3])
+def test_k_center_greedy_matches_distance_matrix(num_centers):
+    rng = np.random.default_rng(3)
+    embeddings = rng.normal(size=(40, 5))
+    distances = 1 - cosine_similarity(embeddings)
+    centers, rows = list(range(num_centers)), list(range(num_centers, 40))
+    similarities = CosineSimilarity(embeddings, max_block_bytes=32)
+    max_similarities = similarities.reduce(rows, centers, "max") if centers \
+        else np.full(len(rows), -np.inf, dtype=np.float32)
+
+    selected = k_center_greedy(similarities, rows, max_similarities, 6)
+
+    expected = []
+    min_distances = distances[np.ix_(rows, centers)].min(axis=1) if centers else np.full(len(rows), np.inf)
+    for _ in range(6):
+        position = int(np.argmax(min_distances))
+        expected.append(position)
+        min_distances = np.minimum(min_distances, distances[rows, rows[position]])
+    assert selected == expected
+    assert len(k_center_greedy(similarities, rows[:4], max_similarities[:4], 6)) == 4
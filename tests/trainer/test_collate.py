@@ -0,0 +1,38 @@
+from ale.import_helper import import_registrable_components
+
+import_registrable_components()
+
+import copy
+
+from ale.trainer.lightning.ner_dataset import collate_entries
+
+
+def create_entry(input_ids, labels=None):
+    entry = {"tokens": {"input_ids": list(input_ids),
+                        "attention_mask": [1] * len(input_ids),
+                        "offset_mapping": [(i, i + 1) for i in range(len(input_ids))]},
+             "text": "text",
+             "token_text": ["t"] * len(input_ids)}
+    if labels is not None:
+        entry["labels"] = list(labels)
+    return entry
+
+
+def test_collate_pads_without_modifying_entries():
+    batch = [create_entry([5, 6, 7], [1, 2, 0]), create_entry([8], [3])]
+    original = copy.deepcopy(batch)
+
+    collated = collate_entries(batch, with_labels=True, pad_label_value=-1)
+
+    assert batch == original
+    assert collated["input_ids"].tolist() == [[5, 6, 7], [8, 0, 0]]
+    assert collated["attention_mask"].tolist() == [[1, 1, 1], [1, 0, 0]]
+    assert collated["labels"].tolist() == [[1, 2, 0], [3, -1, -1]]
+    assert collated["offset_mapping"][1] == [(0, 1)]
+
+
+def test_collate_unlabeled_entries():
+    batch = [create_entry([5, 6], [1, 2]), create_entry([8, 9, 4])]
+
+    assert "labels" not in collate_entries(batch, with_labels=False)
+    assert collate_entries(batch, with_labels=True)["labels"].tolist() == [[1, 2, 0], [0, 0, 0]]
@@ -0,0 +1,70 @@
+from ale.import_helper import import_registrable_components
+
+import_registrable_components()
+
+import torch
+
+from ale.trainer.lightning.modules.constrained_crf import ConstrainedCRF
+from ale.trainer.lightning.modules.crf import CRF
+
+
+def create_dense_crf(constrained: ConstrainedCRF) -> CRF:
+    crf = CRF(constrained.num_tags, batch_first=constrained.batch_first)
+    with torch.no_grad():
+        crf.start_transitions.copy_(constrained.start_scores())
+        crf.end_transitions.copy_(constrained.end_transitions)
+        crf.transitions.copy_(constrained.full_transitions())
+    return crf
+
+
+def is_legal(tags):
+    previous = 0
+    for tag in tags:
+        if tag > 0 and tag % 2 == 0 and previous not in [tag - 1, tag]:
+            return False
+        previous = tag
+    return True
+
+
+def test_matches_dense_crf_with_forbidden_transitions():
+    torch.manual_seed(0)
+    constrained = ConstrainedCRF(num_types=3, batch_first=True)
+    with torch.no_grad():
+        for parameter in constrained.parameters():
+            parameter.normal_()
+    dense = create_dense_crf(constrained)
+    # Strong I-X emissions favor illegal paths in an unconstrained CRF
+    emissions = torch.randn(4, 6, 7) * 3
+    lengths = [6, 3, 1, 5]
+    mask = torch.tensor([[1] * length + [0] * (6 - length) for length in lengths], dtype=torch.uint8)
+    tags = torch.randint(0, 7, (4, 6))
+
+    constrained_inference = constrained.infer(emissions, mask)
+    dense_inference = dense.infer(emissions, mask)
+
+    torch.testing.assert_close(constrained_inference.log_partition, dense_inference.log_partition)
+    torch.testing.assert_close(constrained_inference.marginals, dense_inference.marginals)
+    torch.testing.assert_close(constrained_inference.tags, dense_inference.tags)
+    torch.testing.assert_close(constrained.decode_padded(emissions, mask)[0], dense_inference.tags)
+    repaired = ConstrainedCRF.repair_tags(tags)
+    torch.testing.assert_close(constrained(emissions, tags, mask, reduction='none'),
+                               dense(emissions, repaired, mask, reduction='none'))
+    for sequence in constrained.decode(emissions, mask):
+        assert is_legal(sequence)
+
+
+def test_repair_tags():
+    tags = torch.tensor([[2, 2, 0, 3, 4, 4, 2], [1, 2, 4, 3, 3, 6, 0]])
+
+    assert ConstrainedCRF.repair_tags(tags).tolist() == [[1, 2, 0, 3, 4, 4, 1], [1, 2, 3, 3, 3, 5, 0]]
+    assert ConstrainedCRF.repair_tags(tags.T, seq_dim=0).T.tolist() == ConstrainedCRF.repair_tags(tags).tolist()
+
+
+def test_transition_scores_match_full_transitions():
+    torch.manual_seed(2)
+    crf = ConstrainedCRF(3)
+    previous_tags, tags = torch.meshgrid(torch.arange(crf.num_tags), torch.arange(crf.num_tags), indexing="ij")
+
+    scores = crf.transition_scores(previous_tags.flatten(), tags.flatten())
+
+    assert torch.equal(scores, crf.full_transitions()[previous_tags.flatten(), tags.flatten()])
@@ -0,0 +1,87 @@
+from ale.import_helper import import_registrable_components
+
+import_registrable_components()
+
+import itertools
+
+import torch
+
+from ale.trainer.lightning.modules.crf import CRF
+
+
+def brute_force_decode(crf: CRF, emissions: torch.Tensor, length: int):
+    """
+    Best tag sequence of a single (batch first) sample by scoring every possible sequence.
+    """
+    candidates = torch.tensor(list(itertools.product(range(crf.num_tags), repeat=length)))
+    sample_emissions = emissions[:length].unsqueeze(0).expand(len(candidates), -1, -1)
+    scores = crf(sample_emissions, candidates, reduction='none')
+    return candidates[scores.argmax()].tolist()
+
+
+def test_decode_padded_matches_brute_force():
+    torch.manual_seed(0)
+    crf = CRF(num_tags=3, batch_first=True)
+    emissions = torch.randn(4, 5, 3)
+    lengths = [5, 1, 3, 4]
+    mask = torch.tensor([[1] * length + [0] * (5 - length) for length in lengths], dtype=torch.uint8)
+
+    tags, decoded_lengths = crf.decode_padded(emissions, mask, pad_tag=-1)
+
+    assert tags.shape == (4, 5)
+    assert decoded_lengths.tolist() == lengths
+    for i, length in enumerate(lengths):
+        assert tags[i, :length].tolist() == brute_force_decode(crf, emissions[i], length)
+        assert (tags[i, length:] == -1).all()
+    assert crf.decode(emissions, mask) == [tags[i, :length].tolist() for i, length in enumerate(lengths)]
+
+
+def test_decode_sequence_first():
+    torch.manual_seed(1)
+    crf = CRF(num_tags=4)
+    emissions = torch.randn(6, 2, 4)
+    mask = torch.tensor([[1, 1]] * 4 + [[1, 0]] * 2, dtype=torch.uint8)
+
+    tags, lengths = crf.decode_padded(emissions, mask)
+
+    assert tags.shape == (6, 2)
+    assert lengths.tolist() == [6, 4]
+    assert crf.decode(emissions, mask) == [tags[:, 0].tolist(), tags[:4, 1].tolist()]
+
+
+def test_infer_matches_brute_force():
+    torch.manual_seed(2)
+    crf = CRF(num_tags=3, batch_first=True)
+    emissions = torch.randn(3, 4, 3)
+    lengths = [4, 2, 1]
+    mask = torch.tensor([[1] * length + [0] * (4 - length) for length in lengths], dtype=torch.uint8)
+
+    inference = crf.infer(emissions, mask)
+
+    torch.testing.assert_close(inference.log_partition,
+                               crf._compute_normalizer(emissions.transpose(0, 1), mask.transpose(0, 1)))
+    assert inference.lengths.tolist() == lengths
+    for i, length in enumerate(lengths):
+        candidates = torch.tensor(list(itertools.product(range(3), repeat=length)))
+        log_probabilities = crf(emissions[i, :length].unsqueeze(0).expand(len(candidates), -1, -1), candidates,
+                                reduction='none')
+        probabilities = log_probabilities.exp()
+        expected_marginals = torch.stack([torch.stack([probabilities[candidates[:, t] == tag].sum()
+                                                       for tag in range(3)]) for t in range(length)])
+
+        torch.testing.assert_close(inference.marginals[i, :length], expected_marginals)
+        assert (inference.marginals[i, length:] == 0).all()
+        assert inference.tags[i, :length].tolist() == candidates[log_probabilities.argmax()].tolist()
+        torch.testing.assert_close(inference.best_scores[i] - inference.log_partition[i], log_probabilities.max())
+
+
+def test_sequence_log_probabilities():
+    torch.manual_seed(3)
+    crf = CRF(num_tags=4, batch_first=True)
+    emissions = torch.randn(3, 5, 4)
+    mask = torch.tensor([[1] * length + [0] * (5 - length) for length in [5, 2, 4]], dtype=torch.uint8)
+
+    inference = crf.infer(emissions, mask)
+
+    torch.testing.assert_close(crf.sequence_log_probabilities(emissions, mask),
+                               inference.best_scores - inference.log_partition)
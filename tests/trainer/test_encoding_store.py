@@ -0,0 +1,30 @@
+from ale.import_helper import import_registrable_components
+
+import_registrable_components()
+
+from ale.trainer.lightning.ner_dataset import EncodingStore
+
+
+def test_special_tokens_are_dropped():
+    store = EncodingStore()
+    tokenized = {"input_ids": [0, 11, 12, 2],
+                 "attention_mask": [1, 1, 1, 1],
+                 "offset_mapping": [(0, 0), (0, 5), (6, 9), (0, 0)]}
+    store.add(7, tokenized, ["<s>", "Hello", "you", "</s>"])
+
+    assert 7 in store
+    entry = store.get(7)
+    assert entry["tokens"]["input_ids"] == [11, 12]
+    assert entry["tokens"]["attention_mask"] == [1, 1]
+    assert entry["tokens"]["offset_mapping"] == [(0, 5), (6, 9)]
+    assert entry["token_text"] == ["Hello", "you"]
+
+
+def test_entries_are_not_shared():
+    store = EncodingStore()
+    store.add(1, {"input_ids": [11], "offset_mapping": [(0, 5)]}, ["Hello"])
+
+    # collate pads in place
+    store.get(1)["tokens"]["input_ids"].extend([0, 0])
+
+    assert store.get(1)["tokens"]["input_ids"] == [11]
@@ -0,0 +1,41 @@
+from ale.import_helper import import_registrable_components
+
+import_registrable_components()
+
+import torch
+from pytorch_lightning import LightningModule
+from torch.utils.data import DataLoader
+
+from ale.trainer.lightning.inference_runner import InferenceRunner, resolve_device
+
+
+class TinyModel(LightningModule):
+    def __init__(self):
+        super().__init__()
+        self.model = torch.nn.Linear(2, 3)
+        self.tensor_predictions = False
+
+    def predict_step(self, batch, batch_idx, dataloader_idx=0):
+        assert torch.is_inference_mode_enabled()
+        assert self.tensor_predictions
+        return {"probabilities": torch.softmax(self.model(batch["features"]), dim=-1), "text": batch["text"]}
+
+
+def collate(batch):
+    return {"features": torch.stack([entry[0] for entry in batch]), "text": [entry[1] for entry in batch]}
+
+
+def test_predict_runs_all_batches():
+    model = TinyModel()
+    model.train()
+    data = [(torch.rand(2), f"doc {i}") for i in range(5)]
+    threads = torch.get_num_threads()
+
+    runner = InferenceRunner(model, resolve_device("cpu"), num_threads=1)
+    outputs = runner.predict(DataLoader(data, batch_size=2, collate_fn=collate))
+
+    assert [len(output["text"]) for output in outputs] == [2, 2, 1]
+    assert outputs[0]["probabilities"].shape == (2, 3)
+    assert model.training
+    assert not model.tensor_predictions
+    assert torch.get_num_threads() == threads
@@ -0,0 +1,23 @@
+import torch
+
+from ale.import_helper import import_registrable_components
+
+import_registrable_components()
+
+from ale.trainer.lightning.utils import sequence_mask, tensor_prediction_output
+
+
+def test_tensor_prediction_output_masks_padding():
+    batch = {'token_text': [["a", "b", "c"], ["d"]],
+             'attention_mask': torch.tensor([[1, 1, 1], [1, 0, 0]]),
+             'labels': torch.tensor([[0, 1, 2], [1, -100, -100]])}
+    probabilities = torch.rand(2, 3, 4)
+    predicted_label_ids = probabilities.argmax(dim=-1)
+
+    output = tensor_prediction_output(batch, probabilities, predicted_label_ids)
+    mask = sequence_mask(output['lengths'], probabilities.size(1))
+
+    assert output['lengths'].tolist() == [3, 1]
+    assert torch.equal(mask, batch['attention_mask'].bool())
+    assert torch.equal(output['probabilities'][mask], torch.cat([probabilities[0], probabilities[1, :1]]))
+    assert output['gold_label_ids'][mask].tolist() == [0, 1, 2, 1]
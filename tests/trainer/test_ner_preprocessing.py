@@ -0,0 +1,76 @@
+from ale.import_helper import import_registrable_components
+
+import_registrable_components()
+
+import random
+
+import numpy as np
+import srsly
+from tokenizers import Tokenizer
+from tokenizers.models import WordLevel
+from tokenizers.pre_tokenizers import Whitespace
+from transformers import PreTrainedTokenizerFast
+
+from ale.trainer.lightning import ner_preprocessing
+from ale.trainer.lightning.ner_preprocessing import NerPreprocessor, align_char_labels, preprocess_file
+from ale.trainer.lightning.utils import derive_labels
+
+
+def create_tokenizer() -> PreTrainedTokenizerFast:
+    vocab = {token: i for i, token in enumerate(["[UNK]", "[CLS]", "[SEP]", "Hello", "Berlin", "New", "York"])}
+    tokenizer = Tokenizer(WordLevel(vocab, unk_token="[UNK]"))
+    tokenizer.pre_tokenizer = Whitespace()
+    return PreTrainedTokenizerFast(tokenizer_object=tokenizer, unk_token="[UNK]")
+
+
+def loop_char_to_token_labels(offsets, char_labels, label2id):
+    token_labels = ["O"] * len(offsets)
+    for start_char, end_char, label in char_labels:
+        first_token = True
+        for i, (start, end) in enumerate(offsets):
+            if start == end == 0:
+                continue
+            if start < end_char and end > start_char:
+                token_labels[i] = ("B-" if first_token else "I-") + label
+                first_token = False
+    return [label2id[label] for label in token_labels]
+
+
+def test_alignment_matches_token_loop():
+    _, label2id, _ = derive_labels(["PER", "LOC"])
+    rng = random.Random(0)
+    for _ in range(200):
+        offsets, position = [(0, 0)], 0
+        for _ in range(rng.randint(0, 8)):
+            position += rng.randint(0, 2)
+            length = rng.randint(1, 4)
+            offsets.append((position, position + length))
+            position += length
+        offsets.append((0, 0))
+        spans = []
+        for _ in range(rng.randint(0, 3)):
+            start = rng.randint(0, position + 1)
+            spans.append((start, start + rng.randint(1, 6), rng.choice(["PER", "LOC"])))
+
+        aligned = align_char_labels(np.array(offsets), spans, label2id)
+
+        assert aligned.tolist() == loop_char_to_token_labels(offsets, spans, label2id)
+
+
+def test_preprocess_file_with_processes(tmp_path, monkeypatch):
+    _, label2id, _ = derive_labels(["LOC"])
+    records = [{"id": i, "text": "Hello New York" if i % 2 else "Berlin", "labels": [[6, 14, "LOC"]] if i % 2 else []}
+               for i in range(5)]
+    path = tmp_path / "train.jsonl"
+    srsly.write_jsonl(path, records)
+    preprocessor = NerPreprocessor(create_tokenizer(), label2id, "text", "labels")
+
+    single = preprocess_file(path, preprocessor)
+    monkeypatch.setattr(ner_preprocessing, "PREPROCESSING_CHUNK_SIZE", 2)
+    parallel = preprocess_file(path, preprocessor, num_processes=2)
+
+    assert parallel == single
+    assert [entry["id"] for entry in single] == list(range(5))
+    assert single[1]["token_text"] == ["Hello", "New", "York"]
+    assert single[1]["labels"] == [0, label2id["B-LOC"], label2id["I-LOC"]]
+    assert single[0]["tokens"]["input_ids"] == [4]
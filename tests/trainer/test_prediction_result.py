@@ -0,0 +1,94 @@
+from ale.import_helper import import_registrable_components
+
+import_registrable_components()
+
+from typing import Dict, List
+
+import numpy as np
+import pytest
+
+from ale.trainer.prediction_result import PredictionResult, TokenConfidence, LabelConfidence, TokenPredictions
+
+LABELS = ["O", "B-PER", "B-ORG"]
+ID2LABEL = {idx: label for idx, label in enumerate(LABELS)}
+
+
+def create_prediction_result(data: Dict[str, List[float]]) -> PredictionResult:
+    token_confidences = []
+    for token, confidence_per_label in data.items():
+        label_confidence = [LabelConfidence(label=LABELS[idx], confidence=conf)
+                            for idx, conf in enumerate(confidence_per_label)]
+        token_confidences.append(TokenConfidence(text=token, label_confidence=label_confidence))
+
+    return PredictionResult(ner_confidences_token=token_confidences)
+
+
+@pytest.fixture
+def token_predictions() -> TokenPredictions:
+    return TokenPredictions.from_sequences(
+        [7, 3],
+        [np.array([[0.7, 0.2, 0.1], [0.1, 0.8, 0.1]]), np.array([[0.2, 0.2, 0.6]])],
+        [np.array([0, 1]), np.array([2])],
+        ID2LABEL,
+        tokens=[["Peter", "Pan"], ["ACME"]],
+        gold_label_ids=[np.array([1, 1]), np.array([2])])
+
+
+def test_layout(token_predictions: TokenPredictions):
+    assert token_predictions.probabilities.shape == (3, 3)
+    assert token_predictions.probabilities.dtype == np.float32
+    assert token_predictions.offsets.tolist() == [0, 2, 3]
+    assert token_predictions.get_lengths().tolist() == [2, 1]
+    np.testing.assert_allclose(token_predictions.get_probabilities(3), [[0.2, 0.2, 0.6]])
+
+
+def test_mapping_view(token_predictions: TokenPredictions):
+    assert list(token_predictions.keys()) == [7, 3]
+    assert 3 in token_predictions and 4 not in token_predictions
+
+    result = token_predictions[7]
+    tokens = result.ner_confidences_token
+    assert [t.text for t in tokens] == ["Peter", "Pan"]
+    assert [t.predicted_label for t in tokens] == ["O", "B-PER"]
+    assert [t.gold_label for t in tokens] == ["B-PER", "B-PER"]
+    assert tokens[1].get_highest_confidence().label == "B-PER"
+    assert result.get_all_label_classes() == ["B-PER", "B-ORG"]
+
+
+def test_from_prediction_results_round_trip():
+    results = {
+        0: create_prediction_result({"Token 1": [0.3, 0.2, 0.5], "Token 2": [0.6, 0.3, 0.1]}),
+        1: create_prediction_result({"Token 1": [0.1, 0.8, 0.1]}),
+    }
+    converted = TokenPredictions.from_prediction_results(results)
+
+    assert converted.labels == LABELS
+    assert converted.predicted_label_ids.tolist() == [2, 0, 1]
+    assert converted.gold_label_ids is None
+    assert converted[1].ner_confidences_token[0].get_confidence_for_label("B-PER") == pytest.approx(0.8)
+
+
+def test_select(token_predictions: TokenPredictions):
+    selected = token_predictions.select([3, 7])
+
+    assert list(selected.keys()) == [3, 7]
+    assert selected.offsets.tolist() == [0, 1, 3]
+    assert selected.predicted_label_ids.tolist() == [2, 0, 1]
+    assert selected.gold_label_ids.tolist() == [2, 1, 1]
+    assert selected.tokens == [["ACME"], ["Peter", "Pan"]]
+    np.testing.assert_allclose(selected.get_probabilities(7), token_predictions.get_probabilities(7))
+
+
+def test_concatenate(token_predictions: TokenPredictions):
+    parts = [token_predictions.select([3]), token_predictions.select([7])]
+    joined = TokenPredictions.concatenate(parts)
+
+    assert list(joined.keys()) == [3, 7]
+    assert joined.offsets.tolist() == [0, 1, 3]
+    assert joined.tokens == [["ACME"], ["Peter", "Pan"]]
+    assert joined.gold_label_ids.tolist() == [2, 1, 1]
+
+    parts[0].gold_label_ids = None
+    assert TokenPredictions.concatenate(parts).gold_label_ids is None
+    with pytest.raises(ValueError):
+        TokenPredictions.concatenate([])
@@ -0,0 +1,47 @@
+from ale.import_helper import import_registrable_components
+
+import_registrable_components()
+
+import numpy as np
+
+from ale.trainer.prediction_result import TokenPredictions
+from ale.trainer.prediction_session import PredictionSession
+
+ID2LABEL = {0: "O", 1: "B-PER"}
+
+
+class SharedPredictor:
+    def __init__(self):
+        self.calls = []
+
+    def predict_shared(self, labeled, pool_ids):
+        self.calls.append((list(labeled.keys()), list(pool_ids)))
+        pool = TokenPredictions.from_sequences(pool_ids,
+                                               [np.array([[0.9, 0.1]]) for _ in pool_ids],
+                                               [np.array([0]) for _ in pool_ids],
+                                               ID2LABEL)
+        return {split: {} for split in labeled}, pool
+
+
+def test_requests_are_served_in_one_pass():
+    trainer = SharedPredictor()
+    session = PredictionSession(trainer)
+    session.request_labeled("dev", None)
+    session.request_pool([3, 1])
+    session.request_pool([1, 2])
+    session.run()
+
+    assert trainer.calls == [(["dev"], [3, 1, 2])]
+    assert session.get_labeled_predictions("dev") == {}
+    assert session.get_labeled_predictions("train") is None
+    assert list(session.get_pool_predictions([2, 3]).keys()) == [2, 3]
+    assert session.get_pool_predictions([2, 4]) is None
+
+
+def test_empty_session_does_not_predict():
+    trainer = SharedPredictor()
+    session = PredictionSession(trainer)
+    session.run()
+
+    assert trainer.calls == []
+    assert session.get_pool_predictions([1]) is None
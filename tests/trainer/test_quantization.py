@@ -0,0 +1,51 @@
+from ale.import_helper import import_registrable_components
+
+import_registrable_components()
+
+import numpy as np
+import torch
+from pytorch_lightning import LightningModule
+
+from ale.trainer.lightning.quantization import quantize_for_inference, least_confidence_scores, \
+    score_rank_correlation
+from ale.trainer.prediction_result import TokenPredictions
+
+ID2LABEL = {0: "O", 1: "B-PER", 2: "I-PER"}
+
+
+class TinyModel(LightningModule):
+    def __init__(self):
+        super().__init__()
+        self.linear = torch.nn.Linear(4, 3)
+
+    def forward(self, x):
+        return self.linear(x)
+
+
+def create_predictions(ids, probabilities):
+    return TokenPredictions.from_sequences(ids, [np.array(p) for p in probabilities],
+                                           [np.array(p).argmax(axis=1) for p in probabilities], ID2LABEL)
+
+
+def test_quantize_keeps_original_model():
+    model = TinyModel()
+    quantized = quantize_for_inference(model)
+
+    assert isinstance(model.linear, torch.nn.Linear)
+    assert not isinstance(quantized.linear, torch.nn.Linear)
+    x = torch.rand(2, 4)
+    np.testing.assert_allclose(quantized(x).detach().numpy(), model(x).detach().numpy(), atol=0.1)
+
+
+def test_least_confidence_scores():
+    predictions = create_predictions([1, 2], [[[0.8, 0.1, 0.1], [0.4, 0.3, 0.3]], [[0.5, 0.5, 0.0]]])
+
+    np.testing.assert_allclose(least_confidence_scores(predictions), [0.4, 0.5], rtol=1e-6)
+
+
+def test_score_rank_correlation_aligns_ids():
+    probabilities = [[[0.9, 0.1, 0.0]], [[0.6, 0.4, 0.0]], [[0.4, 0.3, 0.3]]]
+    reference = create_predictions([1, 2, 3], probabilities)
+    reordered = create_predictions([3, 1, 2], [probabilities[2], probabilities[0], probabilities[1]])
+
+    assert score_rank_correlation(reference, reordered) == 1.0
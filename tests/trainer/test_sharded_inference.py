@@ -0,0 +1,122 @@
+from ale.import_helper import import_registrable_components
+
+import_registrable_components()
+
+import numpy as np
+import torch
+from pytorch_lightning import LightningModule
+
+from ale.trainer.lightning.inference_runner import InferenceRunner
+from ale.trainer.lightning.sharded_inference import ShardedInference, split_batches
+from ale.trainer.lightning.utils import collect_token_predictions, tensor_prediction_output
+from ale.trainer.prediction_result import TokenPredictions
+
+
+class TinyTaggingModel(LightningModule):
+    def __init__(self, vocabulary_size: int = 20, num_labels: int = 3):
+        super().__init__()
+        self.save_hyperparameters()
+        self.id2label = {idx: f"L{idx}" for idx in range(num_labels)}
+        self.model = torch.nn.Embedding(vocabulary_size, num_labels)
+        self.tensor_predictions = True
+
+    def predict_step(self, batch, batch_idx, dataloader_idx=0):
+        probabilities = torch.softmax(self.model(batch["input_ids"]), dim=-1)
+        return tensor_prediction_output(batch, probabilities, probabilities.argmax(dim=-1))
+
+
+def create_batch(sequences):
+    max_length = max(len(sequence) for sequence in sequences)
+    return {"input_ids": torch.tensor([sequence + [0] * (max_length - len(sequence)) for sequence in sequences]),
+            "attention_mask": torch.tensor([[1] * len(sequence) + [0] * (max_length - len(sequence))
+                                            for sequence in sequences]),
+            "token_text": [[str(token) for token in sequence] for sequence in sequences]}
+
+
+def test_split_batches():
+    assert split_batches([4, 4, 4, 4], 2) == [[0, 1], [2, 3]]
+    assert split_batches([10, 1, 1], 3) == [[0], [1, 2]]
+    assert split_batches([1, 1], 4) == [[0], [1]]
+    assert split_batches([1, 1, 1, 10], 2) == [[0, 1, 2], [3]]
+    assert split_batches([], 2) == []
+
+    shards = split_batches(np.random.default_rng(0).integers(1, 50, size=40), 6)
+    assert [index for shard in shards for index in shard] == list(range(40))
+    assert len(shards) <= 6
+
+
+def test_sharded_predictions_match_main_process():
+    torch.manual_seed(0)
+    model = TinyTaggingModel()
+    shards = [([1, 2], [create_batch([[1, 2, 3], [4]])]),
+              ([3, 4, 5], [create_batch([[5, 6]]), create_batch([[7], [8, 9, 10, 11]])])]
+
+    runner = InferenceRunner(model, torch.device("cpu"))
+    expected = TokenPredictions.concatenate([collect_token_predictions(keys, runner.predict(batches), model.id2label)
+                                             for keys, batches in shards])
+
+    sharded_inference = ShardedInference(model, 1, num_threads=1)
+    try:
+        predictions = TokenPredictions.concatenate(list(sharded_inference.predict(shards)))
+    finally:
+        sharded_inference.close()
+
+    assert list(predictions.keys()) == [1, 2, 3, 4, 5]
+    assert predictions.offsets.tolist() == expected.offsets.tolist()
+    assert predictions.tokens == expected.tokens
+    np.testing.assert_allclose(predictions.probabilities, expected.probabilities, rtol=1e-6)
+    np.testing.assert_array_equal(predictions.predicted_label_ids, expected.predicted_label_ids)
+
+
+def test_shards_are_submitted_lazily():
+    model = TinyTaggingModel()
+    created = []
+
+    def create_shards():
+        for idx in range(6):
+            created.append(idx)
+            yield [idx], [create_batch([[idx + 1]])]
+
+    sharded_inference = ShardedInference(model, 1, num_threads=1, max_in_flight=2)
+    try:
+        predictions = sharded_inference.predict(create_shards())
+        first = next(predictions)
+        assert len(created) == 2
+        remaining = list(predictions)
+    finally:
+        sharded_inference.close()
+
+    assert [list(prediction.keys()) for prediction in [first] + remaining] == [[idx] for idx in range(6)]
+
+
+class TinySequenceModel(TinyTaggingModel):
+    def __init__(self, vocabulary_size: int = 20, num_labels: int = 3):
+        super().__init__(vocabulary_size, num_labels)
+        self.sequence_predictions = False
+
+    def predict_step(self, batch, batch_idx, dataloader_idx=0):
+        if not self.sequence_predictions:
+            return super().predict_step(batch, batch_idx, dataloader_idx)
+        log_probabilities = torch.log_softmax(self.model(batch["input_ids"]), dim=-1).max(dim=-1).values
+        return {"sequence_log_probabilities": (log_probabilities * batch["attention_mask"]).sum(dim=1)}
+
+
+def test_sharded_sequence_log_probabilities():
+    torch.manual_seed(1)
+    model = TinySequenceModel()
+    shards = [([1, 2], [create_batch([[1, 2, 3], [4]])]), ([3], [create_batch([[5, 6]])])]
+
+    model.sequence_predictions = True
+    runner = InferenceRunner(model, torch.device("cpu"))
+    expected = torch.cat([output["sequence_log_probabilities"] for _, batches in shards
+                          for output in runner.predict(batches)]).numpy()
+    model.sequence_predictions = False
+
+    sharded_inference = ShardedInference(model, 1, num_threads=1)
+    try:
+        results = list(sharded_inference.predict(shards, sequences=True))
+    finally:
+        sharded_inference.close()
+
+    assert np.concatenate([ids for ids, _ in results]).tolist() == [1, 2, 3]
+    np.testing.assert_allclose(np.concatenate([scores for _, scores in results]), expected, rtol=1e-6)
@@ -0,0 +1,34 @@
+from ale.import_helper import import_registrable_components
+
+import_registrable_components()
+
+import pytest
+
+from ale.trainer.lightning.token_budget_sampler import TokenBudgetBatchSampler, fixed_size_batches, padded_size
+
+
+def test_batches_respect_token_budget():
+    lengths = [3, 10, 2, 9, 3, 12]
+    sampler = TokenBudgetBatchSampler(lengths, token_budget=20)
+
+    assert list(sampler) == [[5], [1, 3], [0, 4, 2]]
+    assert sorted(index for batch in sampler for index in batch) == list(range(len(lengths)))
+    assert all(max(lengths[i] for i in batch) * len(batch) <= 20 for batch in sampler)
+
+
+def test_documents_longer_than_budget_form_own_batch():
+    sampler = TokenBudgetBatchSampler([30, 1, 1], token_budget=10, max_batch_size=1)
+
+    assert list(sampler) == [[0], [1], [2]]
+
+
+def test_padded_size():
+    lengths = [3, 10, 2, 9, 3, 12]
+
+    assert padded_size(lengths, fixed_size_batches(len(lengths), 2)) == 2 * 10 + 2 * 9 + 2 * 12
+    assert padded_size(lengths, TokenBudgetBatchSampler(lengths, token_budget=20).batches) == 12 + 2 * 10 + 3 * 3
+
+
+def test_invalid_budget():
+    with pytest.raises(ValueError):
+        TokenBudgetBatchSampler([1, 2], token_budget=0)
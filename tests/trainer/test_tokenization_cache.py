@@ -0,0 +1,82 @@
+from ale.import_helper import import_registrable_components
+
+import_registrable_components()
+
+import srsly
+from tokenizers import Tokenizer
+from tokenizers.models import WordLevel
+from tokenizers.pre_tokenizers import Whitespace
+from transformers import PreTrainedTokenizerFast
+
+from ale.trainer.lightning import ner_dataset
+from ale.trainer.lightning.ner_dataset import AleNerDataModule, EncodingStore
+from ale.trainer.lightning.tokenization_cache import TokenizationCache, TokenizedFile
+
+
+def create_tokenizer(vocab=("[UNK]", "Hello", "Berlin", "you")) -> PreTrainedTokenizerFast:
+    tokenizer = Tokenizer(WordLevel({token: i for i, token in enumerate(vocab)}, unk_token="[UNK]"))
+    tokenizer.pre_tokenizer = Whitespace()
+    return PreTrainedTokenizerFast(tokenizer_object=tokenizer, unk_token="[UNK]")
+
+
+def create_entries():
+    return [{"tokens": {"input_ids": [1, 2], "attention_mask": [1, 1], "offset_mapping": [(0, 5), (6, 12)]},
+             "labels": [0, 1], "text": "Hello Berlin", "token_text": ["Hello", "Berlin"], "id": 3},
+            {"tokens": {"input_ids": [3], "attention_mask": [1], "offset_mapping": [(0, 3)]},
+             "labels": [0], "text": "you", "token_text": ["you"]}]
+
+
+def test_cached_entries_match_tokenized_entries(tmp_path):
+    data_file = tmp_path / "train.jsonl"
+    data_file.write_text('{"text": "Hello Berlin"}\n')
+    tokenizer = create_tokenizer()
+    cache = TokenizationCache(tmp_path / "cache", tokenizer, ["LOC"], "text", "labels")
+    calls = []
+
+    def tokenize():
+        calls.append(1)
+        return create_entries()
+
+    def token_text(input_ids):
+        return tokenizer.convert_ids_to_tokens(input_ids)
+
+    first = list(cache.load(data_file, tokenize, token_text))
+    second = list(cache.load(data_file, tokenize, token_text))
+
+    assert len(calls) == 1
+    assert first == second == create_entries()
+    # Entries are fresh copies
+    first[0]["tokens"]["input_ids"].append(0)
+    assert cache.load(data_file, tokenize, token_text)[0]["tokens"]["input_ids"] == [1, 2]
+
+
+def test_key_depends_on_file_tokenizer_and_labels(tmp_path):
+    data_file = tmp_path / "train.jsonl"
+    data_file.write_text('{"text": "Hello Berlin"}\n')
+    key = TokenizationCache(tmp_path, create_tokenizer(), ["LOC"], "text", "labels").get_key(data_file)
+
+    assert TokenizationCache(tmp_path, create_tokenizer(), ["LOC"], "text", "labels").get_key(data_file) == key
+    assert TokenizationCache(tmp_path, create_tokenizer(), ["PER"], "text", "labels").get_key(data_file) != key
+    assert TokenizationCache(tmp_path, create_tokenizer(("[UNK]", "Hello")), ["LOC"], "text",
+                             "labels").get_key(data_file) != key
+    data_file.write_text('{"text": "Hello you"}\n')
+    assert TokenizationCache(tmp_path, create_tokenizer(), ["LOC"], "text", "labels").get_key(data_file) != key
+
+
+def test_data_module_serves_the_cached_file(tmp_path, monkeypatch):
+    monkeypatch.setattr(ner_dataset.AutoTokenizer, "from_pretrained", lambda name: create_tokenizer())
+    for split in ["train", "dev", "test"]:
+        srsly.write_jsonl(tmp_path / f"{split}.jsonl",
+                          [{"id": i, "text": "Hello Berlin", "labels": [[6, 12, "LOC"]]} for i in range(5, 8)])
+    encoding_store = EncodingStore()
+    data_module = AleNerDataModule(str(tmp_path), model_name="tokenizer", labels=["LOC"], num_workers=0,
+                                   encoding_store=encoding_store, tokenization_cache_dir=str(tmp_path / "cache"))
+    data_module.prepare_data()
+
+    assert isinstance(data_module.train, TokenizedFile)
+    assert data_module.train_index == {5: 0, 6: 1, 7: 2}
+    assert 6 in encoding_store and len(encoding_store) == 3
+    assert encoding_store.get(6)["tokens"]["input_ids"] == [1, 2]
+
+    data_module.set_train_ids([7])
+    assert [entry["id"] for entry in data_module.train_dataloader().dataset] == [7]
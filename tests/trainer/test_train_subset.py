@@ -0,0 +1,60 @@
+from ale.import_helper import import_registrable_components
+
+import_registrable_components()
+
+import srsly
+from tokenizers import Tokenizer
+from tokenizers.models import WordLevel
+from tokenizers.pre_tokenizers import Whitespace
+from transformers import PreTrainedTokenizerFast
+
+from ale.trainer.lightning import ner_dataset
+from ale.trainer.lightning.ner_dataset import AleNerDataModule
+
+
+def create_tokenizer() -> PreTrainedTokenizerFast:
+    tokenizer = Tokenizer(WordLevel({"[UNK]": 0, "Hello": 1, "Berlin": 2}, unk_token="[UNK]"))
+    tokenizer.pre_tokenizer = Whitespace()
+    return PreTrainedTokenizerFast(tokenizer_object=tokenizer, unk_token="[UNK]")
+
+
+def create_data_module(tmp_path, monkeypatch) -> AleNerDataModule:
+    monkeypatch.setattr(ner_dataset.AutoTokenizer, "from_pretrained", lambda name: create_tokenizer())
+    for split in ["train", "dev", "test"]:
+        srsly.write_jsonl(tmp_path / f"{split}.jsonl",
+                          [{"id": i, "text": "Hello Berlin", "labels": [[6, 12, "LOC"]]} for i in range(10, 16)])
+    data_module = AleNerDataModule(str(tmp_path), model_name="tokenizer", labels=["LOC"], batch_size=2,
+                                   num_workers=0)
+    data_module.prepare_data()
+    return data_module
+
+
+def train_ids(data_module: AleNerDataModule):
+    return [entry["id"] for entry in data_module.train_dataloader().dataset]
+
+
+def test_train_subset_follows_train_ids(tmp_path, monkeypatch):
+    data_module = create_data_module(tmp_path, monkeypatch)
+    assert train_ids(data_module) == list(range(10, 16))
+
+    data_module.set_train_ids([14, 11])
+    assert train_ids(data_module) == [11, 14]
+
+    data_module.add_train_ids([10])
+    assert train_ids(data_module) == [10, 11, 14]
+
+    # Loading the data again keeps the training ids
+    data_module.prepare_data()
+    assert train_ids(data_module) == [10, 11, 14]
+    batch = next(iter(data_module.train_dataloader()))
+    assert batch["labels"].tolist() == [[0, 1], [0, 1]]
+
+
+def test_unknown_train_ids_are_skipped(tmp_path, monkeypatch):
+    data_module = create_data_module(tmp_path, monkeypatch)
+
+    data_module.set_train_ids([12, 99])
+    assert train_ids(data_module) == [12]
+
+    data_module.add_train_ids([98, 15])
+    assert train_ids(data_module) == [12, 15]